@@ -20,7 +20,12 @@ from urllib.parse import urlencode
 from itertools import cycle
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
-import uuid
+
+# Shared helpers live in scripts/nearby_sync
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from nearby_sync.discovery import ListingSeenSet, listing_links
+from nearby_sync.gazetteer import city_names, gazetteer
+from nearby_sync.stable_ids import jitter_coords, stable_int, stable_listing_id
 
 try:
     from supabase import create_client
@@ -60,99 +65,12 @@ current_key = next(key_cycle)
 key_index = 0
 call_count = 0
 
-# Philippine cities (180+)
-CITIES = [
-    "Abuyog", "Alaminos", "Alcala", "Angeles", "Antipolo", "Aroroy", "Bacolod", "Bacoor", "Bago", "Bais",
-    "Balanga", "Baliuag", "Bangued", "Bansalan", "Bantayan", "Bataan", "Batac", "Batangas City", "Bayambang", "Bayawan",
-    "Baybay", "Bayugan", "Biñan", "Bislig", "Bocaue", "Bogo", "Boracay", "Borongan", "Butuan", "Cabadbaran",
-    "Cabanatuan", "Cabuyao", "Cadiz", "Cagayan de Oro", "Calamba", "Calapan", "Calbayog", "Caloocan", "Camiling", "Canlaon",
-    "Caoayan", "Capiz", "Caraga", "Carmona", "Catbalogan", "Cauayan", "Cavite City", "Cebu City", "Cotabato City", "Dagupan",
-    "Danao", "Dapitan", "Daraga", "Dasmariñas", "Davao City", "Davao del Norte", "Davao del Sur", "Davao Oriental", "Dipolog", "Dumaguete",
-    "General Santos", "General Trias", "Gingoog", "Guihulngan", "Himamaylan", "Ilagan", "Iligan", "Iloilo City", "Imus", "Isabela",
-    "Isulan", "Kabankalan", "Kidapawan", "Koronadal", "La Carlota", "Laoag", "Lapu-Lapu", "Las Piñas", "Laoang", "Legazpi",
-    "Ligao", "Limay", "Lucena", "Maasin", "Mabalacat", "Malabon", "Malaybalay", "Malolos", "Mandaluyong", "Mandaue",
-    "Manila", "Marawi", "Marilao", "Masbate City", "Mati", "Meycauayan", "Muntinlupa", "Naga (Camarines Sur)", "Navotas", "Olongapo",
-    "Ormoc", "Oroquieta", "Ozamiz", "Pagadian", "Palo", "Parañaque", "Pasay", "Pasig", "Passi", "Puerto Princesa",
-    "Quezon City", "Roxas", "Sagay", "Samal", "San Carlos (Negros Occidental)", "San Carlos (Pangasinan)", "San Fernando (La Union)", "San Fernando (Pampanga)",
-    "San Jose (Antique)", "San Jose del Monte", "San Juan", "San Pablo", "San Pedro", "Santiago", "Silay", "Sipalay",
-    "Sorsogon City", "Surigao City", "Tabaco", "Tabuk", "Tacurong", "Tagaytay", "Tagbilaran", "Taguig", "Tacloban", "Talisay (Cebu)",
-    "Talisay (Negros Occidental)", "Tanjay", "Tarlac City", "Tayabas", "Toledo", "Trece Martires", "Tuguegarao", "Urdaneta", "Valencia", "Valenzuela",
-    "Victorias", "Vigan", "Virac", "Zamboanga City", "Baguio", "Bohol", "Coron", "El Nido", "Makati", "Palawan", "Siargao"
-]
+# Philippine cities, in crawl order
+CITIES = city_names()
+GAZETTEER = gazetteer()
 
 CATEGORIES = ["Attractions", "Hotels", "Restaurants"]
 
-# City to region mapping
-CITY_REGION_MAP = {
-    "Abuyog": "Eastern Visayas", "Alaminos": "Calabarzon", "Alcala": "Northern Luzon",
-    "Angeles": "Central Luzon", "Antipolo": "Calabarzon", "Aroroy": "Bicol",
-    "Bacolod": "Western Visayas", "Bacoor": "Calabarzon", "Bago": "Western Visayas",
-    "Bais": "Central Visayas", "Balanga": "Central Luzon", "Baliuag": "Central Luzon",
-    "Bangued": "Cordillera", "Bansalan": "Mindanao", "Bantayan": "Central Visayas",
-    "Bataan": "Central Luzon", "Batac": "Northern Luzon", "Batangas City": "Calabarzon",
-    "Bayambang": "Northern Luzon", "Bayawan": "Negros Oriental", "Baybay": "Eastern Visayas",
-    "Bayugan": "Mindanao", "Biñan": "Calabarzon", "Bislig": "Mindanao",
-    "Bocaue": "Central Luzon", "Bogo": "Central Visayas", "Boracay": "Western Visayas",
-    "Borongan": "Eastern Visayas", "Butuan": "Caraga", "Cabadbaran": "Caraga",
-    "Cabanatuan": "Central Luzon", "Cabuyao": "Calabarzon", "Cadiz": "Western Visayas",
-    "Cagayan de Oro": "Northern Mindanao", "Calamba": "Calabarzon", "Calapan": "Mimaropa",
-    "Calbayog": "Western Visayas", "Caloocan": "Metro Manila", "Camiling": "Northern Luzon",
-    "Canlaon": "Negros Oriental", "Caoayan": "Northern Luzon", "Capiz": "Western Visayas",
-    "Caraga": "Caraga", "Carmona": "Calabarzon", "Catbalogan": "Eastern Visayas",
-    "Cauayan": "Northern Luzon", "Cavite City": "Calabarzon", "Cebu City": "Central Visayas",
-    "Cotabato City": "Soccsksargen", "Dagupan": "Northern Luzon", "Danao": "Central Visayas",
-    "Dapitan": "Northern Mindanao", "Daraga": "Bicol", "Dasmariñas": "Calabarzon",
-    "Davao City": "Davao Region", "Davao del Norte": "Davao Region", "Davao del Sur": "Davao Region",
-    "Davao Oriental": "Davao Region", "Dipolog": "Zamboanga", "Dumaguete": "Negros Oriental",
-    "General Santos": "Soccsksargen", "General Trias": "Calabarzon", "Gingoog": "Northern Mindanao",
-    "Guihulngan": "Negros Oriental", "Himamaylan": "Negros Occidental", "Ilagan": "Northern Luzon",
-    "Iligan": "Northern Mindanao", "Iloilo City": "Western Visayas", "Imus": "Calabarzon",
-    "Isabela": "Northern Luzon", "Isulan": "Soccsksargen", "Kabankalan": "Negros Occidental",
-    "Kidapawan": "Soccsksargen", "Koronadal": "Soccsksargen", "La Carlota": "Negros Occidental",
-    "Laoag": "Ilocos Region", "Lapu-Lapu": "Central Visayas", "Las Piñas": "Metro Manila",
-    "Laoang": "Bicol", "Legazpi": "Bicol", "Ligao": "Bicol", "Limay": "Central Luzon",
-    "Lucena": "Calabarzon", "Maasin": "Eastern Visayas", "Mabalacat": "Central Luzon",
-    "Malabon": "Metro Manila", "Malaybalay": "Northern Mindanao", "Malolos": "Central Luzon",
-    "Mandaluyong": "Metro Manila", "Mandaue": "Central Visayas", "Manila": "Metro Manila",
-    "Marawi": "Bangsamoro", "Marilao": "Central Luzon", "Masbate City": "Bicol",
-    "Mati": "Davao Region", "Meycauayan": "Central Luzon", "Muntinlupa": "Metro Manila",
-    "Naga (Camarines Sur)": "Bicol", "Navotas": "Metro Manila", "Olongapo": "Central Luzon",
-    "Ormoc": "Eastern Visayas", "Oroquieta": "Northern Mindanao", "Ozamiz": "Northern Mindanao",
-    "Pagadian": "Zamboanga", "Palo": "Eastern Visayas", "Parañaque": "Metro Manila",
-    "Pasay": "Metro Manila", "Pasig": "Metro Manila", "Passi": "Western Visayas",
-    "Puerto Princesa": "Mimaropa", "Quezon City": "Metro Manila", "Roxas": "Western Visayas",
-    "Sagay": "Negros Occidental", "Samal": "Davao Region", "San Carlos (Negros Occidental)": "Negros Occidental",
-    "San Carlos (Pangasinan)": "Northern Luzon", "San Fernando (La Union)": "Ilocos Region",
-    "San Fernando (Pampanga)": "Central Luzon", "San Jose (Antique)": "Western Visayas",
-    "San Jose del Monte": "Central Luzon", "San Juan": "Metro Manila", "San Pablo": "Calabarzon",
-    "San Pedro": "Calabarzon", "Santiago": "Northern Luzon", "Silay": "Negros Occidental",
-    "Sipalay": "Negros Occidental", "Sorsogon City": "Bicol", "Surigao City": "Caraga",
-    "Tabaco": "Bicol", "Tabuk": "Cordillera", "Tacurong": "Soccsksargen", "Tagaytay": "Calabarzon",
-    "Tagbilaran": "Central Visayas", "Taguig": "Metro Manila", "Tacloban": "Eastern Visayas",
-    "Talisay (Cebu)": "Central Visayas", "Talisay (Negros Occidental)": "Negros Occidental",
-    "Tanjay": "Negros Oriental", "Tarlac City": "Central Luzon", "Tayabas": "Calabarzon",
-    "Toledo": "Central Visayas", "Trece Martires": "Calabarzon", "Tuguegarao": "Cagayan Valley",
-    "Urdaneta": "Northern Luzon", "Valencia": "Negros Oriental", "Valenzuela": "Central Luzon",
-    "Victorias": "Negros Occidental", "Vigan": "Ilocos Region", "Virac": "Bicol",
-    "Zamboanga City": "Zamboanga", "Baguio": "Cordillera", "Bohol": "Central Visayas",
-    "Coron": "Mimaropa", "El Nido": "Mimaropa", "Makati": "Metro Manila",
-    "Palawan": "Mimaropa", "Siargao": "Caraga"
-}
-
-# City coordinates
-CITY_COORDS = {
-    'Manila': (14.5995, 120.9842),
-    'Cebu City': (10.3157, 123.8854),
-    'Davao City': (7.0731, 125.6121),
-    'Quezon City': (14.6349, 121.0388),
-    'Makati': (14.5547, 121.0244),
-    'Boracay': (11.9674, 121.9248),
-    'Baguio': (16.4023, 120.5960),
-    'El Nido': (10.5898, 119.3933),
-    'Coron': (11.9905, 120.1967),
-    'Siargao': (9.1096, 126.0393),
-}
-
 def rotate_key():
     """Rotate to next ScrapingBee key"""
     global current_key, key_index, call_count
@@ -196,31 +114,13 @@ def fetch_html(url: str, max_retries: int = 2) -> Optional[str]:
     return None
 
 def extract_listings(html: str, city: str, category: str) -> List[Dict]:
-    """Extract listing URLs and basic info from search results"""
+    """Extract listing URLs and basic info from search results (one canonical URL per place)"""
     if not html:
         return []
     
     try:
         soup = BeautifulSoup(html, 'html.parser')
-        listings = []
-        
-        # Find all listing links
-        for link in soup.find_all('a', href=re.compile(r'-d\d+-')):
-            href = link.get('href', '')
-            if href:
-                name = link.get_text(strip=True)
-                if name and len(name) > 2:
-                    if not href.startswith('http'):
-                        href = f"https://www.tripadvisor.com.ph{href}"
-                    
-                    listings.append({
-                        'url': href,
-                        'name': name,
-                        'city': city,
-                        'category': category
-                    })
-        
-        return listings[:10]  # Limit to 10 per city/category
+        return listing_links(soup.find_all('a', href=re.compile(r'-d\d+-')), city, category, city_key='city')
         
     except Exception as e:
         print(f"    ⚠️  Parse error: {str(e)[:50]}", file=sys.stderr)
@@ -292,11 +192,12 @@ def extract_listing_data(html: str, listing: Dict) -> Optional[Dict]:
                 if len(text) < 50:
                     amenities.append({'name': text[:40], 'available': True})
 
-        # Get coordinates
-        coords = CITY_COORDS.get(listing['city'], (12.8797, 121.7740))
+        # Get coordinates, spread deterministically around the city point
+        coords = GAZETTEER.coords(listing['city'])
+        lat, lng = jitter_coords(coords[0], coords[1], tripadvisor_id or listing['url'], listing['name'], listing['city'])
 
         # Get region
-        region = CITY_REGION_MAP.get(listing['city'], 'Philippines')
+        region = GAZETTEER.region(listing['city'])
         
         # Determine price range based on category and rating
         price_range = None
@@ -319,7 +220,7 @@ def extract_listing_data(html: str, listing: Dict) -> Optional[Dict]:
             price_level = 1
 
         return {
-            'tripadvisor_id': tripadvisor_id or f"d{int(time.time())}",
+            'tripadvisor_id': tripadvisor_id or stable_listing_id(listing['name'], listing['city'], listing['url']),
             'name': listing['name'],
             'slug': re.sub(r'[^a-z0-9]+', '-', listing['name'].lower()).strip('-')[:80],
             'city': listing['city'],
@@ -328,10 +229,10 @@ def extract_listing_data(html: str, listing: Dict) -> Optional[Dict]:
             'category': listing['category'],
             'address': address or f"{listing['city']}, Philippines",
             'description': f"{listing['name']} is a {listing['category'].lower().rstrip('s')} in {listing['city']}, Philippines, verified on TripAdvisor with {review_count or 'various'} reviews.",
-            'latitude': coords[0] + (0.01 * (hash(listing['name']) % 10 - 5) / 100),
-            'longitude': coords[1] + (0.01 * (hash(listing['city']) % 10 - 5) / 100),
-            'lat': coords[0] + (0.01 * (hash(listing['name']) % 10 - 5) / 100),
-            'lng': coords[1] + (0.01 * (hash(listing['city']) % 10 - 5) / 100),
+            'latitude': lat,
+            'longitude': lng,
+            'lat': lat,
+            'lng': lng,
             'rating': rating,
             'review_count': review_count,
             'review_details': [{'rating': rating, 'verified': True, 'date': now}] if rating else None,
@@ -361,12 +262,11 @@ def extract_listing_data(html: str, listing: Dict) -> Optional[Dict]:
             'fetch_status': 'success',
             'fetch_error_message': None,
             'last_verified_at': now,
-            'created_at': now,
             'updated_at': now,
             'currency': 'PHP',
             'timezone': 'Asia/Manila',
             'region_name': region,
-            'city_id': str(uuid.uuid4()),
+            'city_id': stable_int('city', listing['city'], modulo=10000),
             'raw': {'url': listing['url'], 'city': listing['city'], 'category': listing['category'], 'region': region}
         }
         
@@ -375,12 +275,12 @@ def extract_listing_data(html: str, listing: Dict) -> Optional[Dict]:
         return None
 
 def insert_batch(listings: List[Dict]) -> Tuple[int, int]:
-    """Insert batch of listings"""
+    """Upsert batch of listings (ids are content-derived, so re-runs update in place)"""
     if not listings:
         return 0, 0
     
     try:
-        response = supabase.table('nearby_listings').insert(listings).execute()
+        response = supabase.table('nearby_listings').upsert(listings, on_conflict='tripadvisor_id').execute()
         return len(listings), 0
     except Exception as e:
         print(f"  ❌ Insert error: {str(e)[:100]}")
@@ -409,6 +309,10 @@ def main():
     total_failed = 0
     batch = []
     BATCH_SIZE = 50
+    MAX_LISTINGS_PER_SEARCH = 10
+    seen = ListingSeenSet()
+    search_fetches = 0
+    detail_fetches = 0
     
     print(f"🌍 Processing {len(cities_to_process)} cities...\n")
     
@@ -420,12 +324,14 @@ def main():
             # Search for listings
             search_url = f"https://www.tripadvisor.com.ph/Search?q={city}+{category}"
             html = fetch_html(search_url)
+            search_fetches += 1
             
             if not html:
                 print(f"  {category}: ❌ Failed to fetch")
                 continue
             
-            listings = extract_listings(html, city, category)
+            # Each place once per run, however often it is linked or in however many cities
+            listings = seen.admit(extract_listings(html, city, category), limit=MAX_LISTINGS_PER_SEARCH)
             
             if not listings:
                 print(f"  {category}: ⚠️  No results")
@@ -436,6 +342,7 @@ def main():
             # Fetch details for each listing
             for listing in listings:
                 listing_html = fetch_html(listing['url'])
+                detail_fetches += 1
                 listing_data = extract_listing_data(listing_html, listing)
                 
                 if listing_data:
@@ -470,9 +377,12 @@ def main():
     print(f'  Failed: {total_failed}')
     if args.dry_run:
         print(f'  (Dry run - no data inserted)')
+    print(f'\n🔗 Listing links:')
+    print(f'  {seen.summary()}')
+    print(f'  Credits saved: {seen.credits_saved}')
     print(f'\n🔑 API Usage:')
-    print(f'  Total calls: ~{total_inserted * 2} (search + details)')
-    print(f'  Keys used: ~{(total_inserted * 2) // 1000} of {len(SCRAPINGBEE_KEYS)}\n')
+    print(f'  Total calls: {search_fetches + detail_fetches} ({search_fetches} search + {detail_fetches} detail pages)')
+    print(f'  Keys used: ~{(search_fetches + detail_fetches) // 1000} of {len(SCRAPINGBEE_KEYS)}\n')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+benchmark-extract-rules.py
+
+Compares the two ways the TripAdvisor sync reads a listing page, against a
+local ScrapingBee stand-in that serves synthetic listing pages:
+
+- html:  the full page is downloaded and parsed locally (parse_listing_html)
+- rules: the stand-in applies extract_rules and returns JSON (parse_extracted),
+         with a full-page fetch for core fields the rules missed
+
+Each synthetic page carries the usual payload of a real one (inline state
+JSON, review blocks), and every HIDDEN_COUNT_EVERY-th page shows its review
+count in markup the rules do not select. Rules mode leaves those counts out
+(the stored value stays) instead of paying for the full page. Reports bytes,
+local parse time and credits per listing, fallbacks, review counts left out,
+and whether both modes produced the same values for the columns they share.
+
+The stand-in answers like ScrapingBee's /api/v1 (url, extract_rules), so the
+sync script itself can run against it:
+
+Run with:
+    python scripts/benchmark-extract-rules.py --listings 100
+    python scripts/benchmark-extract-rules.py --serve 8765
+    SCRAPINGBEE_URL=http://127.0.0.1:8765/api/v1 python scripts/sync-tripadvisor-real-data.py --extract-rules --limit 5
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+from nearby_sync.listing_page import ExtractStats, extract_listing
+
+HIDDEN_COUNT_EVERY = 4
+REVIEWS_PER_PAGE = 40
+FIELDS = {
+    "name", "rating", "review_count", "address", "phone_number", "description",
+    "amenities", "hours_of_operation", "price_range", "website", "photos", "location_type",
+}
+
+
+def synthetic_page(url: str) -> str:
+    """A listing page for url; the same url always gives the same page"""
+    n = zlib.crc32(url.encode()) % 100000
+    name = f"Benchmark Place {n}"
+    reviews = n % 900 + 10
+    if n % HIDDEN_COUNT_EVERY == 0:
+        review_markup = f'<div class="biGQs">{reviews} reviews</div>'
+    else:
+        review_markup = f'<a href="#REVIEWS"><span class="reviewCount">{reviews} reviews</span></a>'
+    state = json.dumps({"urqlCache": {str(i): {"data": "x" * 200, "id": i} for i in range(300)}})
+    review_blocks = "".join(
+        f'<div class="review-container"><div class="quote">Visit {i}</div>'
+        f'<p class="partial_entry">{"Lovely spot, friendly staff and great views. " * 6}</p></div>'
+        for i in range(REVIEWS_PER_PAGE)
+    )
+    photos = "".join(
+        f'<img src="https://media-cdn.tripadvisor.com/media/photo-s/{n}/{i}.jpg" alt="">'
+        f'<img data-src="https://media-cdn.tripadvisor.com/media/photo-o/{n}/{i}.jpg">'
+        f'<img src="https://static.tacdn.com/img2/{i}.svg" data-src="https://media-cdn.tripadvisor.com/media/photo-l/{n}/{i}.jpg">'
+        for i in range(8)
+    )
+    return f"""<!DOCTYPE html><html><head><title>{name}</title>
+<script>window.__WEB_CONTEXT__={state};</script></head><body>
+<header><nav>{"<a href='/Tourism-g298460'>Cebu</a>" * 50}</nav></header>
+<h1>{name}</h1>
+<span class="ui_bubble_rating ratingValue">{3 + n % 20 / 10:.1f} of 5 bubbles</span>
+{review_markup}
+<address>{n} Osmeña Boulevard, Cebu City, Philippines</address>
+<a href="tel:+63 32 {n % 900 + 100} {n % 9000 + 1000}" class="phone">Call</a>
+<div class="description">A well loved place in Cebu City with views over the harbour and local food.</div>
+<ul><li class="amenity">Free Wifi access</li><li class="amenity">Parking available</li></ul>
+<div class="hours">Monday: 9:00 am - 5:00 pm Tuesday: 9:00 am - 5:00 pm Sunday: Closed</div>
+<span class="price">₱₱ - ₱₱₱</span>
+<a href="https://place{n}.example.ph/">Website</a>
+<picture><source srcset="https://media-cdn.tripadvisor.com/media/photo-w/{n}/hero.jpg 1x"></picture>
+{photos}
+{review_blocks}
+</body></html>"""
+
+
+def apply_rules(html: str, rules: Dict) -> Dict:
+    """Evaluate ScrapingBee extract_rules on html: selector, type item/list, output text/html/@attr"""
+    soup = BeautifulSoup(html, "html.parser")
+    result = {}
+    for key, rule in rules.items():
+        if isinstance(rule, str):
+            rule = {"selector": rule}
+        elements = soup.select(rule["selector"])
+        output = rule.get("output", "text")
+
+        def value(element):
+            if output.startswith("@"):
+                return element.get(output[1:], "")
+            return str(element) if output == "html" else element.get_text(strip=True)
+
+        if rule.get("type") == "list":
+            result[key] = [value(element) for element in elements]
+        else:
+            result[key] = value(elements[0]) if elements else ""
+    return result
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ScrapingBee's GET /api/v1 over synthetic listing pages"""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        target = query.get("url", [""])[0]
+        if not query.get("api_key") or not target:
+            self.send_error(401 if not query.get("api_key") else 400)
+            return
+        html = synthetic_page(target)
+        if "extract_rules" in query:
+            body = json.dumps(apply_rules(html, json.loads(query["extract_rules"][0])), ensure_ascii=False)
+            content_type = "application/json"
+        else:
+            body, content_type = html, "text/html; charset=utf-8"
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stand_in_fetch(endpoint: str):
+    session = requests.Session()
+
+    def fetch(url: str, extract_rules: Optional[Dict] = None) -> Optional[str]:
+        params = {"api_key": "benchmark", "url": url, "render_javascript": "false"}
+        if extract_rules:
+            params["extract_rules"] = json.dumps(extract_rules)
+        response = session.get(endpoint, params=params, timeout=20)
+        return response.text if response.status_code == 200 else None
+
+    return fetch
+
+
+def run(fetch, urls, use_rules: bool):
+    stats = ExtractStats()
+    started = time.perf_counter()
+    results = [extract_listing(url, FIELDS, fetch, use_rules=use_rules, stats=stats) for url in urls]
+    return results, stats, time.perf_counter() - started
+
+
+def comparable(data: Optional[Dict]) -> Dict:
+    return {k: v for k, v in (data or {}).items() if k != "last_verified_at"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ScrapingBee extract_rules against full-page parsing")
+    parser.add_argument("--listings", type=int, default=50, help="Synthetic listing pages per mode")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT",
+                        help="Only run the stand-in on PORT (for SCRAPINGBEE_URL)")
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        server = start_stand_in(args.serve)
+        print(f"🐝 ScrapingBee stand-in on http://127.0.0.1:{server.server_port}/api/v1 (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    server = start_stand_in()
+    fetch = stand_in_fetch(f"http://127.0.0.1:{server.server_port}/api/v1")
+    urls = [f"https://www.tripadvisor.com.ph/Attraction_Review-g298460-d{1000000 + i}-Reviews-"
+            f"Benchmark_Place_{i}-Cebu_City_Cebu_Island_Visayas.html" for i in range(args.listings)]
+
+    print("=" * 100)
+    print(f"📦 EXTRACT RULES BENCHMARK: {args.listings} listing pages")
+    print("=" * 100)
+    html_results, html_stats, html_seconds = run(fetch, urls, use_rules=False)
+    rules_results, rules_stats, rules_seconds = run(fetch, urls, use_rules=True)
+    server.shutdown()
+
+    for label, stats, seconds in (("html", html_stats, html_seconds), ("rules", rules_stats, rules_seconds)):
+        print(f"\n{label} mode ({seconds:.2f}s wall):")
+        for line in stats.summary():
+            print(f"  {line}")
+
+    html_bytes = sum(html_stats.bytes.values())
+    rules_bytes = sum(rules_stats.bytes.values())
+    html_cpu = sum(html_stats.seconds.values())
+    rules_cpu = sum(rules_stats.seconds.values())
+    mismatches, left_out = [], 0
+    for url, a, b in zip(urls, html_results, rules_results):
+        a, b = comparable(a), comparable(b)
+        left_out += "review_count" in a and "review_count" not in b
+        if any(a.get(column) != value for column, value in b.items()) or a.keys() - b.keys() - {"review_count"}:
+            mismatches.append(url)
+    print(f"""
+📊 RESULT:
+  Bytes per listing: {html_bytes / len(urls) / 1024:.1f} KB -> {rules_bytes / len(urls) / 1024:.1f} KB ({rules_bytes / max(1, html_bytes):.1%})
+  Parse time per listing: {html_cpu / len(urls) * 1000:.2f}ms -> {rules_cpu / len(urls) * 1000:.2f}ms ({rules_cpu / max(html_cpu, 1e-9):.1%})
+  Credits: {sum(html_stats.pages.values())} -> {sum(rules_stats.pages.values())} ({rules_stats.fallbacks} fallbacks)
+  Review counts left to the stored value: {left_out}
+  Listings with different columns: {len(mismatches)}
+""")
+    for url in mismatches[:5]:
+        print(f"  ⚠️  {url}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
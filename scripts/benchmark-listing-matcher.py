@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+benchmark-listing-matcher.py
+
+Compares the search-result matchers on the labeled cases in
+scripts/nearby_sync/benchmarks/listing_match_cases.json:
+
+- baseline: difflib.SequenceMatcher over the top 5 anchors, 0.3 threshold
+  (what sync-tripadvisor-real-data.py used before nearby_sync.matching)
+- engine:   nearby_sync.matching.CandidateIndex
+
+Each case is a listing, the anchors a search page returned and the URL of the
+correct match (null when none of the anchors is the listing).
+
+Run with:
+    python scripts/benchmark-listing-matcher.py
+    python scripts/benchmark-listing-matcher.py --repeat 2000 --verbose
+"""
+
+import argparse
+import json
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from nearby_sync.matching import CandidateIndex, candidate_from_anchor
+
+CASES_FILE = Path(__file__).parent / "nearby_sync" / "benchmarks" / "listing_match_cases.json"
+
+
+def baseline_match(case: Dict) -> Optional[str]:
+    """Previous strategy: SequenceMatcher over the first 5 anchors, 0.3 threshold"""
+    name = case["listing"]["name"]
+    best_url = None
+    best_score = 0.3
+
+    for candidate in case["candidates"][:5]:
+        score = SequenceMatcher(None, name.lower(), candidate["name"].lower()).ratio()
+        if score > best_score:
+            best_score = score
+            best_url = candidate["url"]
+
+    return best_url
+
+
+def engine_match(case: Dict) -> Optional[str]:
+    """nearby_sync.matching over every anchor, with city/category tiebreakers"""
+    listing = case["listing"]
+    index = CandidateIndex(candidate_from_anchor(c["name"], c["url"]) for c in case["candidates"])
+    match = index.best_match(listing["name"], listing.get("city"), listing.get("category"))
+    return match[0].url if match else None
+
+
+def canonical(url: Optional[str]) -> Optional[str]:
+    """Ignore #fragments when comparing URLs"""
+    return url.split("#", 1)[0] if url else None
+
+
+def run(matcher, cases: List[Dict], repeat: int, verbose: bool) -> Dict:
+    """Score a matcher for accuracy and time it over repeat passes"""
+    correct = 0
+    for case in cases:
+        got = canonical(matcher(case))
+        expected = canonical(case.get("expected"))
+        ok = got == expected
+        correct += ok
+        if verbose and not ok:
+            print(f"    ✗ {case['listing']['name']}: got {got}, expected {expected}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            matcher(case)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "correct": correct,
+        "accuracy": correct / len(cases) if cases else 0.0,
+        "us_per_case": elapsed / (repeat * len(cases)) * 1e6 if cases and repeat else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark listing name matchers")
+    parser.add_argument("--cases", type=str, default=str(CASES_FILE), help="Labeled cases JSON file")
+    parser.add_argument("--repeat", type=int, default=500, help="Timing passes over all cases")
+    parser.add_argument("--verbose", action="store_true", help="Print every miss")
+    args = parser.parse_args()
+
+    cases = json.loads(Path(args.cases).read_text(encoding="utf-8"))
+
+    print("=" * 80)
+    print(f"LISTING MATCHER BENCHMARK ({len(cases)} labeled cases)")
+    print("=" * 80)
+
+    for label, matcher in (("baseline (SequenceMatcher)", baseline_match), ("engine (token/trigram)", engine_match)):
+        print(f"\n{label}:")
+        result = run(matcher, cases, args.repeat, args.verbose)
+        print(f"  Accuracy: {result['correct']}/{len(cases)} ({result['accuracy']:.1%})")
+        print(f"  Time: {result['us_per_case']:.1f} µs/case")
+
+
+if __name__ == "__main__":
+    main()
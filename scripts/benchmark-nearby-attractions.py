@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+benchmark-nearby-attractions.py
+
+Times nearby_sync.nearby_attractions.AttractionJoin on synthetic tables and
+checks that incremental runs agree with full ones:
+
+1. full:        every listing joined, the lists "written" back into the rows
+2. edits:       --moved listings get new coordinates and --edited attractions a
+                new rating or name, a few rows are added and deleted and a few
+                lists are wiped the way ingestion upserts do
+3. incremental: the join against the snapshot of step 1, patches applied
+4. check:       a full join of the edited table must find nothing left to
+                patch, and a sample of lists must match a brute-force scan
+
+Listings cluster around the gazetteer's cities and municipalities like the
+real table. Nothing is written to Supabase.
+
+Run with:
+    python scripts/benchmark-nearby-attractions.py
+    python scripts/benchmark-nearby-attractions.py --sizes 50000 --moved 0.05
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from nearby_sync.gazetteer import gazetteer
+from nearby_sync.geo import haversine_m
+from nearby_sync.nearby_attractions import DEFAULT_MIN_RATING, DEFAULT_RADIUS_M, DEFAULT_TOP_N, AttractionJoin
+
+CATEGORIES = ["Attraction", "Restaurant", "Hotel"]
+CLUSTER_DEG = 0.04              # spread of listings around a city centre
+VERIFY_LISTINGS = 200
+
+
+def synthetic_rows(count: int, rng: np.random.Generator, first_id: int = 1) -> List[Dict]:
+    places = gazetteer()
+    picked = rng.choice(np.flatnonzero(~places.is_area), count)
+    lat = places.lat[picked] + rng.normal(0, CLUSTER_DEG, count)
+    lng = places.lng[picked] + rng.normal(0, CLUSTER_DEG, count)
+    categories = rng.choice(len(CATEGORIES), count, p=[0.3, 0.5, 0.2])
+    rating = np.round(rng.uniform(2.5, 5.0, count), 1)
+    rated = rng.random(count) >= 0.15
+    return [
+        {"id": first_id + i, "name": f"Benchmark Place {first_id + i}", "latitude": float(lat[i]),
+         "longitude": float(lng[i]), "rating": float(rating[i]) if rated[i] else None,
+         "location_type": CATEGORIES[categories[i]], "category": None, "nearby_attractions": []}
+        for i in range(count)
+    ]
+
+
+def run_join(rows: List[Dict], previous=None):
+    started = time.perf_counter()
+    join = AttractionJoin(rows)
+    patches = list(join.patches(previous))
+    return join, patches, time.perf_counter() - started
+
+
+def apply_patches(rows: List[Dict], patches) -> None:
+    by_id = {r["id"]: r for r in rows}
+    for listing_id, patch in patches:
+        by_id[listing_id].update(patch)
+
+
+def edit_rows(rows: List[Dict], args, rng: np.random.Generator) -> List[Dict]:
+    count = len(rows)
+    for i in rng.choice(count, int(count * args.moved), replace=False):
+        rows[i]["latitude"] += float(rng.normal(0, 0.01))
+        rows[i]["longitude"] += float(rng.normal(0, 0.01))
+    attractions = [r for r in rows if r["location_type"] == "Attraction"]
+    for i in rng.choice(len(attractions), int(len(attractions) * args.edited), replace=False):
+        if i % 2:
+            attractions[i]["rating"] = float(np.round(rng.uniform(2.5, 5.0), 1))
+        else:
+            attractions[i]["name"] += " (renamed)"
+    churn = max(1, count // 1000)
+    for i in rng.choice(count, churn, replace=False):
+        rows[i]["nearby_attractions"] = []
+    kept = [rows[i] for i in np.sort(rng.choice(count, count - churn, replace=False))]
+    return kept + synthetic_rows(churn, rng, first_id=count + 1)
+
+
+def brute_force_mismatches(rows: List[Dict], rng: np.random.Generator) -> int:
+    lat = np.array([r["latitude"] for r in rows])
+    lng = np.array([r["longitude"] for r in rows])
+    rated = np.array([r["location_type"] == "Attraction" and (r["rating"] or 0) >= DEFAULT_MIN_RATING for r in rows])
+    mismatches = 0
+    for i in rng.choice(len(rows), min(VERIFY_LISTINGS, len(rows)), replace=False):
+        meters = haversine_m(lat[i], lng[i], lat, lng)
+        meters[~rated] = np.inf
+        meters[i] = np.inf
+        nearest = [j for j in np.argsort(meters, kind="stable")[:DEFAULT_TOP_N] if meters[j] <= DEFAULT_RADIUS_M]
+        if [rows[j]["name"] for j in nearest] != rows[i]["nearby_attractions"]:
+            mismatches += 1
+    return mismatches
+
+
+def run_size(count: int, args, rng: np.random.Generator) -> Dict:
+    rows = synthetic_rows(count, rng)
+    full, patches, full_s = run_join(rows)
+    apply_patches(rows, patches)
+    with_lists = sum(1 for r in rows if r["nearby_attractions"])
+
+    rows = edit_rows(rows, args, rng)
+    incremental, patches, incremental_s = run_join(rows, full.snapshot)
+    apply_patches(rows, patches)
+
+    _, leftover, _ = run_join(rows)
+    return {
+        "count": count, "full_s": full_s, "with_lists": with_lists, "incremental_s": incremental_s,
+        "recomputed": incremental.recomputed, "patched": len(patches), "leftover": len(leftover),
+        "mismatches": brute_force_mismatches(rows, rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nearby_attractions spatial join")
+    parser.add_argument("--sizes", type=str, default="10000,100000,1000000", help="Comma-separated listing counts")
+    parser.add_argument("--moved", type=float, default=0.01, help="Share of listings moved between runs")
+    parser.add_argument("--edited", type=float, default=0.01, help="Share of attractions renamed or re-rated")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print("=" * 100)
+    print(f"🧭 NEARBY ATTRACTIONS BENCHMARK: {', '.join(f'{s:,}' for s in sizes)} listings "
+          f"(top {DEFAULT_TOP_N} rated {DEFAULT_MIN_RATING}+ within {DEFAULT_RADIUS_M / 1000:.0f}km)")
+    print("=" * 100)
+
+    results = []
+    for count in sizes:
+        print(f"\n⏱️  {count:,} listings...")
+        results.append(run_size(count, args, rng))
+
+    print(f"\n📊 RESULT ({args.moved:.0%} moved, {args.edited:.0%} of attractions edited between runs):\n")
+    print(f"  {'listings':>10} {'full':>8} {'with list':>10} {'incremental':>12} {'recomputed':>11} "
+          f"{'patched':>8} {'left over':>10} {'mismatches':>11}")
+    for r in results:
+        print(f"  {r['count']:>10,} {r['full_s']:>7.2f}s {r['with_lists']:>10,} {r['incremental_s']:>11.2f}s "
+              f"{r['recomputed']:>11,} {r['patched']:>8,} {r['leftover']:>10,} {r['mismatches']:>11}")
+
+    if any(r["leftover"] or r["mismatches"] for r in results):
+        print("\n⚠️  Incremental run differs from a full join or a brute-force scan", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+benchmark-spatial-index.py
+
+Measures nearby_sync.spatial_index.SpatialIndex on synthetic listings at
+several table sizes (10k / 100k / 1M by default):
+
+- build:  bucketing the columns into the grid, and save() to .npy files
+- load:   opening the saved index memory-mapped
+- radius: batched radius queries (attractions rated 4+ within --radius-m)
+- knn:    batched k-nearest queries, unfiltered and restaurant-only
+
+Listings cluster around the gazetteer's cities and municipalities (with a
+tenth scattered over the Philippine bounding box), which is how the real
+table is distributed. Every result for a sample of queries is checked
+against a brute-force haversine scan of all points.
+
+Run with:
+    python scripts/benchmark-spatial-index.py
+    python scripts/benchmark-spatial-index.py --sizes 10000,100000 --queries 5000
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+from nearby_sync.gazetteer import gazetteer
+from nearby_sync.geo import haversine_m
+from nearby_sync.spatial_index import SpatialIndex
+from nearby_sync.tiles import PH_BBOX
+
+CATEGORIES = np.array(["attraction", "restaurant", "hotel"])
+CLUSTER_DEG = 0.04              # spread of listings around a city centre
+SCATTERED = 0.1                 # share of listings anywhere in the bounding box
+VERIFY_QUERIES = 50
+
+
+def synthetic_points(count: int, rng: np.random.Generator) -> Tuple[np.ndarray, ...]:
+    places = gazetteer()
+    centres = np.flatnonzero(~places.is_area)
+    picked = rng.choice(centres, count)
+    lat = places.lat[picked] + rng.normal(0, CLUSTER_DEG, count)
+    lng = places.lng[picked] + rng.normal(0, CLUSTER_DEG, count)
+    scattered = rng.random(count) < SCATTERED
+    lat[scattered] = rng.uniform(PH_BBOX[0], PH_BBOX[2], scattered.sum())
+    lng[scattered] = rng.uniform(PH_BBOX[1], PH_BBOX[3], scattered.sum())
+    categories = rng.choice(CATEGORIES, count, p=[0.3, 0.5, 0.2])
+    rating = np.round(rng.uniform(2.5, 5.0, count), 1).astype(np.float32)
+    rating[rng.random(count) < 0.15] = np.nan
+    return np.arange(1, count + 1), lat, lng, categories, rating
+
+
+def brute_force_mismatches(index: SpatialIndex, qlat, qlng, radius_m: float, k: int) -> int:
+    """Queries whose radius or k-NN result differs from scanning every point"""
+    attraction = index.categories.index("attraction")
+    restaurant = index.categories.index("restaurant")
+    radius = index.radius(qlat, qlng, radius_m, category="attraction", min_rating=4.0)
+    nearest = index.knn(qlat, qlng, k, category="restaurant")
+    lat, lng = np.asarray(index.lat), np.asarray(index.lng)
+    mismatches = 0
+    for i in range(len(qlat)):
+        meters = haversine_m(qlat[i], qlng[i], lat, lng)
+        within = np.flatnonzero((meters <= radius_m) & (index.category_codes == attraction) & (index.rating >= 4.0))
+        expected_knn = np.sort(np.where(index.category_codes == restaurant, meters, np.inf))[:k]
+        if set(within.tolist()) != set(radius[i].rows.tolist()) or not np.allclose(expected_knn, nearest.meters[i]):
+            mismatches += 1
+    return mismatches
+
+
+def run_size(count: int, args, rng: np.random.Generator) -> dict:
+    ids, lat, lng, categories, rating = synthetic_points(count, rng)
+    qids, qlat, qlng, _, _ = synthetic_points(args.queries, rng)
+
+    started = time.perf_counter()
+    index = SpatialIndex.build(ids, lat, lng, categories, rating)
+    build_s = time.perf_counter() - started
+
+    path = Path(tempfile.mkdtemp(prefix="spatial-index-"))
+    try:
+        started = time.perf_counter()
+        index.save(str(path))
+        save_s = time.perf_counter() - started
+        size = sum(f.stat().st_size for f in path.iterdir())
+
+        started = time.perf_counter()
+        index = SpatialIndex.load(str(path))
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        found = index.radius(qlat, qlng, args.radius_m, category="attraction", min_rating=4.0)
+        radius_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.knn(qlat, qlng, args.k)
+        knn_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.knn(qlat, qlng, args.k, category="restaurant")
+        knn_filtered_s = time.perf_counter() - started
+
+        sample = rng.choice(args.queries, min(VERIFY_QUERIES, args.queries), replace=False)
+        mismatches = brute_force_mismatches(index, qlat[sample], qlng[sample], args.radius_m, args.k)
+    finally:
+        del index
+        shutil.rmtree(path, ignore_errors=True)
+
+    return {
+        "count": count, "build_s": build_s, "save_s": save_s, "load_s": load_s, "mb": size / 1024 / 1024,
+        "radius_s": radius_s, "knn_s": knn_s, "knn_filtered_s": knn_filtered_s,
+        "avg_found": np.mean([len(f.rows) for f in found]), "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nearby_listings spatial index")
+    parser.add_argument("--sizes", type=str, default="10000,100000,1000000", help="Comma-separated point counts")
+    parser.add_argument("--queries", type=int, default=10000, help="Query points per batch")
+    parser.add_argument("--radius-m", type=float, default=1000.0, help="Radius for radius queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours for k-NN queries")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print("=" * 100)
+    print(f"🗺️  SPATIAL INDEX BENCHMARK: {', '.join(f'{s:,}' for s in sizes)} points, {args.queries:,} queries per batch")
+    print("=" * 100)
+
+    results = []
+    for count in sizes:
+        print(f"\n⏱️  {count:,} points...")
+        results.append(run_size(count, args, rng))
+
+    print(f"\n📊 RESULT (radius {args.radius_m:.0f}m attractions 4+, k={args.k}):\n")
+    print(f"  {'points':>10} {'build':>9} {'save':>8} {'load':>8} {'size':>9} "
+          f"{'radius q/s':>11} {'found':>6} {'knn q/s':>10} {'knn rest. q/s':>14} {'mismatches':>11}")
+    for r in results:
+        print(f"  {r['count']:>10,} {r['build_s'] * 1000:>7.0f}ms {r['save_s'] * 1000:>6.0f}ms "
+              f"{r['load_s'] * 1000:>6.1f}ms {r['mb']:>7.1f}MB {args.queries / r['radius_s']:>11,.0f} "
+              f"{r['avg_found']:>6.1f} {args.queries / r['knn_s']:>10,.0f} {args.queries / r['knn_filtered_s']:>14,.0f} "
+              f"{r['mismatches']:>11}")
+
+    if any(r["mismatches"] for r in results):
+        print("\n⚠️  Results differ from the brute-force scan", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+build-nearby-spatial-index.py
+
+Builds the nearby_listings spatial index (nearby_sync.spatial_index) from a
+snapshot of the table and saves it as memory-mappable .npy columns, so other
+scripts can answer radius and k-nearest queries without touching Supabase:
+
+1. Load id, coordinates, rating and category (Supabase, local replica or a JSON backup)
+2. Bucket listings with precise coordinates into the grid and save the index
+3. With --near, print the nearest listings to a point as a quick check
+
+Run with:
+    python scripts/build-nearby-spatial-index.py                          # from Supabase
+    python scripts/build-nearby-spatial-index.py --replica                 # local replica, pull only changes
+    python scripts/build-nearby-spatial-index.py --input backup.json --near 14.5995,120.9842 --category attraction
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Dict
+from pathlib import Path
+
+import numpy as np
+from supabase import create_client, Client
+
+from nearby_sync.replica import DEFAULT_PATH as REPLICA_FILE, ListingReplica
+from nearby_sync.spatial_index import DEFAULT_CELL_DEG, DEFAULT_PATH as INDEX_PATH, SELECT_COLUMNS, SpatialIndex
+
+
+def fetch_all_rows(supabase: Client) -> List[Dict]:
+    """Page through nearby_listings selecting only the columns the index needs"""
+    rows = []
+    page = 0
+    page_size = 1000
+
+    while True:
+        response = supabase.table("nearby_listings").select(SELECT_COLUMNS).range(
+            page * page_size, (page + 1) * page_size - 1
+        ).execute()
+        data = response.data or []
+        rows.extend(data)
+
+        if len(data) < page_size:
+            break
+        page += 1
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the nearby_listings spatial index")
+    parser.add_argument("--input", type=str, help="Read rows from a JSON backup instead of Supabase")
+    parser.add_argument("--replica", nargs="?", const=REPLICA_FILE, default=None,
+                        help="Read rows from a local replica, pulling only changed rows")
+    parser.add_argument("--output", type=str, default=INDEX_PATH, help="Index directory")
+    parser.add_argument("--cell-deg", type=float, default=DEFAULT_CELL_DEG, help="Grid cell size in degrees")
+    parser.add_argument("--near", type=str, default=None, metavar="LAT,LNG",
+                        help="After building, print the nearest listings to this point")
+    parser.add_argument("--k", type=int, default=10, help="Listings printed for --near")
+    parser.add_argument("--category", action="append", default=None,
+                        help="Restrict --near to this location_type/category (repeatable)")
+    parser.add_argument("--min-rating", type=float, default=None, help="Restrict --near to this rating or better")
+    args = parser.parse_args()
+
+    supabase = None
+    if not args.input:
+        supabase_url = os.getenv("VITE_PROJECT_URL") or os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            print("❌ Missing Supabase environment variables", file=sys.stderr)
+            sys.exit(1)
+        supabase = create_client(supabase_url, supabase_key)
+
+    print("=" * 100)
+    print("NEARBY_LISTINGS SPATIAL INDEX")
+    print("=" * 100)
+
+    if args.input:
+        rows = json.loads(Path(args.input).read_text(encoding="utf-8"))
+        print(f"\n📥 Loaded {len(rows)} rows from {args.input}")
+    elif args.replica:
+        replica = ListingReplica(args.replica)
+        replica.refresh(supabase)
+        rows = list(replica.iter_rows(SELECT_COLUMNS.split(",")))
+        print(f"  ✅ {len(rows)} rows from {args.replica}")
+    else:
+        print("\n📥 Fetching nearby_listings from Supabase...")
+        rows = fetch_all_rows(supabase)
+        print(f"  ✅ {len(rows)} rows")
+
+    started = time.perf_counter()
+    index = SpatialIndex.from_rows(rows, cell_deg=args.cell_deg)
+    built = time.perf_counter() - started
+    index.save(args.output)
+    size = sum(f.stat().st_size for f in Path(args.output).iterdir())
+
+    print(f"""
+📊 SUMMARY:
+  {index.summary()}
+  Left out (no precise coordinates): {len(rows) - len(index)}
+  Built in {built * 1000:.0f}ms, {size / 1024 / 1024:.1f} MB in {args.output}/
+""")
+
+    if args.near:
+        lat, lng = (float(v) for v in args.near.split(","))
+        index = SpatialIndex.load(args.output)
+        found = index.knn([lat], [lng], args.k, category=args.category, min_rating=args.min_rating)
+        print(f"📍 Nearest to {lat}, {lng}:")
+        for position, meters in zip(found.rows[0], found.meters[0]):
+            if position < 0:
+                break
+            rating = "" if np.isnan(index.rating[position]) else f" ★{index.rating[position]:.1f}"
+            print(f"  {meters / 1000:>7.2f} km  [{index.ids[position]}] {index.categories[index.category_codes[position]]}{rating}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+compute-nearby-attractions.py
+
+Fills nearby_listings.nearby_attractions from the table itself
+(nearby_sync.nearby_attractions): for every listing, the names of the
+closest rated attractions within a radius, nearest first.
+
+1. Load id, name, coordinates, rating, category and the stored lists
+   (Supabase, local replica or a JSON backup)
+2. Compare with the snapshot of the last applied run and recompute only the
+   listings around new, moved or edited rows (everything on the first run,
+   with --full, or when radius / top / min rating changed)
+3. With --apply, patch the lists that differ through PatchWriter and save
+   the new snapshot
+
+Run with:
+    python scripts/compute-nearby-attractions.py --replica                 # preview, pull only changed rows
+    python scripts/compute-nearby-attractions.py --replica --apply
+    python scripts/compute-nearby-attractions.py --apply --full --radius-km 3 --top 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Dict
+from pathlib import Path
+
+from supabase import create_client, Client
+
+from nearby_sync.nearby_attractions import (
+    DEFAULT_MIN_RATING, DEFAULT_RADIUS_M, DEFAULT_STATE_PATH, DEFAULT_TOP_N, SELECT_COLUMNS,
+    AttractionJoin, AttractionSnapshot,
+)
+from nearby_sync.patches import PatchWriter
+from nearby_sync.replica import DEFAULT_PATH as REPLICA_FILE, ListingReplica
+from nearby_sync.spatial_index import DEFAULT_CELL_DEG
+
+
+def fetch_all_rows(supabase: Client) -> List[Dict]:
+    """Page through nearby_listings selecting only the columns the join needs"""
+    rows = []
+    page = 0
+    page_size = 1000
+
+    while True:
+        response = supabase.table("nearby_listings").select(SELECT_COLUMNS).range(
+            page * page_size, (page + 1) * page_size - 1
+        ).execute()
+        data = response.data or []
+        rows.extend(data)
+
+        if len(data) < page_size:
+            break
+        page += 1
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute nearby_attractions with a spatial self-join")
+    parser.add_argument("--input", type=str, help="Read rows from a JSON backup instead of Supabase")
+    parser.add_argument("--replica", nargs="?", const=REPLICA_FILE, default=None,
+                        help="Read rows from a local replica, pulling only changed rows")
+    parser.add_argument("--apply", action="store_true", help="Write changed lists and save the snapshot")
+    parser.add_argument("--full", action="store_true", help="Recompute every listing, ignoring the snapshot")
+    parser.add_argument("--state", type=str, default=DEFAULT_STATE_PATH, help="Snapshot of the last applied run")
+    parser.add_argument("--radius-km", type=float, default=DEFAULT_RADIUS_M / 1000, help="Search radius")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Attractions kept per listing")
+    parser.add_argument("--min-rating", type=float, default=DEFAULT_MIN_RATING, help="Minimum attraction rating")
+    parser.add_argument("--cell-deg", type=float, default=DEFAULT_CELL_DEG, help="Spatial index cell size in degrees")
+    parser.add_argument("--batch-size", type=int, default=500, help="Listing updates sent per bulk patch request")
+    parser.add_argument("--sample", type=int, default=5, help="Changed listings printed in preview mode")
+    args = parser.parse_args()
+
+    supabase = None
+    if args.apply or not args.input:
+        supabase_url = os.getenv("VITE_PROJECT_URL") or os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            print("❌ Missing Supabase environment variables", file=sys.stderr)
+            sys.exit(1)
+        supabase = create_client(supabase_url, supabase_key)
+
+    print("=" * 100)
+    print("NEARBY_ATTRACTIONS SPATIAL JOIN")
+    print("=" * 100)
+
+    if args.input:
+        rows = json.loads(Path(args.input).read_text(encoding="utf-8"))
+        print(f"\n📥 Loaded {len(rows)} rows from {args.input}")
+    elif args.replica:
+        replica = ListingReplica(args.replica)
+        replica.refresh(supabase)
+        rows = list(replica.iter_rows(SELECT_COLUMNS.split(",")))
+        print(f"  ✅ {len(rows)} rows from {args.replica}")
+    else:
+        print("\n📥 Fetching nearby_listings from Supabase...")
+        rows = fetch_all_rows(supabase)
+        print(f"  ✅ {len(rows)} rows")
+
+    previous = None if args.full else AttractionSnapshot.load(args.state)
+    if previous is not None:
+        print(f"  📌 Snapshot of {len(previous)} listings from {args.state}")
+
+    started = time.perf_counter()
+    join = AttractionJoin(rows, radius_m=args.radius_km * 1000, top_n=args.top, min_rating=args.min_rating,
+                          cell_deg=args.cell_deg)
+    patches = list(join.patches(previous))
+    joined = time.perf_counter() - started
+
+    print(f"\n🧭 Joined in {joined:.2f}s")
+    for line in join.summary():
+        print(f"  {line}")
+
+    if not args.apply:
+        names = {int(r["id"]): r.get("name") for r in rows}
+        for listing_id, patch in patches[:args.sample]:
+            print(f"\n  [{listing_id}] {names[listing_id]}")
+            for name in patch["nearby_attractions"]:
+                print(f"    - {name}")
+        print("\nℹ️  Preview only. Re-run with --apply to write the lists.")
+        return
+
+    writer = PatchWriter(supabase, batch_size=args.batch_size)
+    for listing_id, patch in patches:
+        writer.add(listing_id, patch)
+    writer.flush()
+
+    # A failed batch keeps the old snapshot, so the next run recomputes the same listings
+    if not writer.failed:
+        join.snapshot.save(args.state)
+
+    print(f"""
+📊 SUMMARY:
+  {writer.summary()}
+  Snapshot: {args.state if not writer.failed else 'not saved (failed updates)'}
+""")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+dedup-nearby-listings.py
+
+Batch entity resolution for nearby_listings:
+1. Load the table (only the columns matching needs) or a JSON backup
+2. Block by city + geohash and city + name token, score name/address
+   similarity and distance with NumPy (see nearby_sync.dedup)
+3. Write merge clusters with a chosen survivor row
+4. Optionally apply them: fill the survivor's empty columns from its
+   duplicates, back up and delete the duplicates
+
+Run with:
+    python scripts/dedup-nearby-listings.py                          # report only
+    python scripts/dedup-nearby-listings.py --input nearby_listings_backup.json
+    python scripts/dedup-nearby-listings.py --replica                # local replica, pull only changes
+    python scripts/dedup-nearby-listings.py --apply                  # merge + delete
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Dict
+from pathlib import Path
+
+from supabase import create_client, Client
+
+from nearby_sync.dedup import SELECT_COLUMNS, find_duplicate_clusters, merge_patch
+from nearby_sync.replica import DEFAULT_PATH as REPLICA_FILE, ListingReplica
+
+CLUSTERS_FILE = "nearby_listings_dedup_clusters.json"
+DELETED_BACKUP_FILE = "nearby_listings_dedup_deleted.json"
+DELETE_CHUNK_SIZE = 200
+
+
+def fetch_all_rows(supabase: Client) -> List[Dict]:
+    """Page through nearby_listings selecting only the columns dedup needs"""
+    rows = []
+    page = 0
+    page_size = 1000
+
+    while True:
+        response = supabase.table("nearby_listings").select(SELECT_COLUMNS).range(
+            page * page_size, (page + 1) * page_size - 1
+        ).execute()
+        data = response.data or []
+        rows.extend(data)
+
+        if len(data) < page_size:
+            break
+        page += 1
+
+    return rows
+
+
+def apply_clusters(supabase: Client, clusters: List[Dict], rows_by_id: Dict) -> int:
+    """Merge missing columns into survivors and delete duplicates; returns rows deleted"""
+    deleted_rows = []
+    to_delete = []
+
+    for cluster in clusters:
+        survivor = rows_by_id[cluster["survivor_id"]]
+        duplicates = [rows_by_id[i] for i in cluster["duplicate_ids"]]
+
+        patch = merge_patch(survivor, duplicates)
+        if patch:
+            try:
+                supabase.table("nearby_listings").update(patch).eq("id", survivor["id"]).execute()
+            except Exception as e:
+                print(f"  ❌ Merge error for {survivor['id']}: {e}", file=sys.stderr)
+                continue
+
+        deleted_rows.extend(duplicates)
+        to_delete.extend(cluster["duplicate_ids"])
+
+    # Keep a copy of everything we are about to delete
+    Path(DELETED_BACKUP_FILE).write_text(json.dumps(deleted_rows, indent=2, ensure_ascii=False, default=str))
+    print(f"  ✅ Backed up {len(deleted_rows)} duplicate rows to {DELETED_BACKUP_FILE}")
+
+    deleted = 0
+    for i in range(0, len(to_delete), DELETE_CHUNK_SIZE):
+        chunk = to_delete[i:i + DELETE_CHUNK_SIZE]
+        try:
+            supabase.table("nearby_listings").delete().in_("id", chunk).execute()
+            deleted += len(chunk)
+            print(f"  ✓ Deleted {deleted}/{len(to_delete)} duplicates")
+        except Exception as e:
+            print(f"  ❌ Delete error on chunk {i // DELETE_CHUNK_SIZE + 1}: {e}", file=sys.stderr)
+
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and merge duplicate nearby_listings rows")
+    parser.add_argument("--input", type=str, help="Read rows from a JSON backup instead of Supabase")
+    parser.add_argument("--output", type=str, default=CLUSTERS_FILE, help="Where to write merge clusters")
+    parser.add_argument("--replica", nargs="?", const=REPLICA_FILE, default=None,
+                        help="Read rows from a local replica, pulling only changed rows")
+    parser.add_argument("--apply", action="store_true", help="Merge survivors and delete duplicates")
+    args = parser.parse_args()
+
+    supabase = None
+    if args.apply or not args.input:
+        supabase_url = os.getenv("VITE_PROJECT_URL") or os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            print("❌ Missing Supabase environment variables", file=sys.stderr)
+            sys.exit(1)
+        supabase = create_client(supabase_url, supabase_key)
+
+    print("=" * 100)
+    print("NEARBY_LISTINGS ENTITY RESOLUTION")
+    print("=" * 100)
+
+    started = time.perf_counter()
+    replica = None
+    if args.input:
+        rows = json.loads(Path(args.input).read_text(encoding="utf-8"))
+        print(f"\n📥 Loaded {len(rows)} rows from {args.input}")
+    elif args.replica:
+        replica = ListingReplica(args.replica)
+        replica.refresh(supabase)
+        rows = list(replica.iter_rows(SELECT_COLUMNS.split(",")))
+        print(f"  ✅ {len(rows)} rows from {args.replica}")
+    else:
+        print("\n📥 Fetching nearby_listings from Supabase...")
+        rows = fetch_all_rows(supabase)
+        print(f"  ✅ {len(rows)} rows")
+    loaded = time.perf_counter()
+
+    clusters = find_duplicate_clusters(rows)
+    resolved = time.perf_counter()
+
+    duplicate_count = sum(len(c["duplicate_ids"]) for c in clusters)
+    Path(args.output).write_text(json.dumps(clusters, indent=2, ensure_ascii=False, default=str))
+
+    print(f"""
+📊 SUMMARY:
+  Rows scanned: {len(rows)}
+  Duplicate clusters: {len(clusters)}
+  Rows to remove: {duplicate_count}
+  Load time: {loaded - started:.1f}s
+  Resolution time: {resolved - loaded:.2f}s
+  Clusters written: {args.output}
+""")
+
+    for cluster in clusters[:5]:
+        names = ", ".join(f"{m['name']} [{m['tripadvisor_id']}]" for m in cluster["members"])
+        print(f"  • keep {cluster['survivor_id']}: {names}")
+
+    if args.apply and clusters:
+        print("\n🔀 Applying merges...")
+        rows_by_id = {r.get("id"): r for r in rows}
+        deleted = apply_clusters(supabase, clusters, rows_by_id)
+        if replica is not None:
+            # Deletes are invisible to the replica's watermark pull
+            replica.delete_ids([i for c in clusters for i in c["duplicate_ids"]])
+        print(f"\n✅ Removed {deleted} duplicate rows")
+    elif clusters:
+        print("\nℹ️  Report only. Re-run with --apply to merge and delete duplicates.")
+
+
+if __name__ == "__main__":
+    main()
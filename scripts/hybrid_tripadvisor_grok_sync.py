@@ -14,56 +14,33 @@ USAGE:
 
 import os
 import sys
-import json
 import time
 import argparse
-import random
-import string
 import math
 from typing import List, Dict, Optional
 from datetime import datetime
-import requests
 from supabase import create_client, Client
 
-PHILIPPINES_CITIES = [
-    "Abuyog", "Alaminos", "Alcala", "Angeles", "Antipolo", "Aroroy", "Bacolod",
-    "Bacoor", "Baguio", "Bago", "Bais", "Balanga", "Baliuag", "Bangued", "Bansalan",
-    "Bantayan", "Bataan", "Batac", "Batangas City", "Bayambang", "Bayawan",
-    "Baybay", "Bayugan", "Biñan", "Bislig", "Bocaue", "Bogo", "Boracay",
-    "Borongan", "Bohol", "Butuan", "Cabadbaran", "Cabanatuan", "Cabuyao", "Cadiz",
-    "Cagayan de Oro", "Calamba", "Calapan", "Calbayog", "Caloocan", "Camiling",
-    "Canlaon", "Caoayan", "Capiz", "Caraga", "Carmona", "Catbalogan", "Cauayan",
-    "Cavite City", "Cebu City", "Coron", "Cotabato City", "Dagupan", "Danao", "Dapitan",
-    "Daraga", "Dasmariñas", "Davao City", "Davao del Norte", "Davao del Sur",
-    "Davao Oriental", "Dipolog", "Dumaguete", "El Nido", "General Santos", "General Trias",
-    "Gingoog", "Guihulngan", "Himamaylan", "Ilagan", "Iligan", "Iloilo City",
-    "Imus", "Isabela", "Isulan", "Kabankalan", "Kidapawan", "Koronadal",
-    "La Carlota", "Laoag", "Lapu-Lapu", "Las Piñas", "Laoang", "Legazpi",
-    "Ligao", "Limay", "Lucena", "Maasin", "Mabalacat", "Malabon", "Makati", "Malaybalay",
-    "Malolos", "Mandaluyong", "Mandaue", "Manila", "Marawi", "Marilao",
-    "Masbate City", "Mati", "Meycauayan", "Muntinlupa", "Naga (Camarines Sur)",
-    "Navotas", "Olongapo", "Ormoc", "Oroquieta", "Ozamiz", "Pagadian", "Palo",
-    "Palawan", "Parañaque", "Pasay", "Pasig", "Passi", "Puerto Princesa", "Quezon City",
-    "Roxas", "Sagay", "Samal", "San Carlos (Negros Occidental)",
-    "San Carlos (Pangasinan)", "San Fernando (La Union)",
-    "San Fernando (Pampanga)", "San Jose (Antique)", "San Jose del Monte",
-    "San Juan", "San Pablo", "San Pedro", "Santiago", "Siargao", "Silay", "Sipalay",
-    "Sorsogon City", "Surigao City", "Tabaco", "Tabuk", "Tacloban", "Tacurong", "Tagaytay",
-    "Tagbilaran", "Taguig", "Talisay (Cebu)",
-    "Talisay (Negros Occidental)", "Tanjay", "Tarlac City", "Tayabas", "Toledo",
-    "Trece Martires", "Tuguegarao", "Urdaneta", "Valencia", "Valenzuela",
-    "Victorias", "Vigan", "Virac", "Zamboanga City"
-]
+from nearby_sync.details import DEFAULT_CACHE_PATH, DEFAULT_TTL_DAYS as DETAILS_TTL_DAYS, DetailsCache, DetailsFetcher
+from nearby_sync.gazetteer import city_names
+from nearby_sync.grok import DEFAULT_BATCH_SIZE as GROK_BATCH_SIZE, PROMPT_VERSION, GrokEnricher
+from nearby_sync.grok_pool import DEFAULT_RPM, DEFAULT_TPM, DEFAULT_WORKERS as GROK_WORKERS, GrokWorkerPool, MinuteBudget
+from nearby_sync.llm_cache import (
+    DEFAULT_MAX_ENTRIES, DEFAULT_PATH as GROK_CACHE_PATH, DEFAULT_TTL_DAYS as GROK_CACHE_TTL_DAYS, LLMCache,
+)
+from nearby_sync.partner_api import (
+    DEFAULT_RATE_PER_KEY, DEFAULT_WORKERS, PartnerApiClient, parse_api_keys, run_ordered,
+)
+from nearby_sync.stable_ids import stable_listing_id
+from nearby_sync.streaming import DEFAULT_BATCH_SIZE, BatchWriter, SeenIds
+
+PHILIPPINES_CITIES = city_names()
 
 CATEGORIES = [
     "attractions", "museums", "parks", "beaches", "hotels",
     "restaurants", "churches", "shopping", "nightlife"
 ]
 
-GROK_ENDPOINT = "https://api.x.ai/v1/chat/completions"
-GROK_MODEL = "grok-2"
-
-
 def create_slug(name: str, tripadvisor_id: str) -> str:
     """Create a unique slug from name and TripAdvisor ID"""
     base_slug = (
@@ -81,31 +58,19 @@ def create_slug(name: str, tripadvisor_id: str) -> str:
         return f"listing-{id_suffix}"
 
 
-def fetch_tripadvisor_data(query: str, api_key: str, limit: int = 30, city: str = None) -> List[Dict]:
+def fetch_tripadvisor_data(query: str, client: PartnerApiClient, limit: int = 30, city: str = None) -> List[Dict]:
     """Fetch data from TripAdvisor API"""
     params = {
         "query": query,
         "limit": limit
     }
     
-    url = "https://api.tripadvisor.com/api/partner/2.0/locations/search"
-    
     try:
-        response = requests.get(
-            url,
-            params=params,
-            headers={
-                "X-TripAdvisor-API-Key": api_key,
-                "Accept": "application/json",
-            },
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            print(f"  ⚠️  API returned {response.status_code}", file=sys.stderr)
+        data = client.get("locations/search", params)
+
+        if data is None:
             return []
-        
-        data = response.json()
+
         items = data.get("data", data.get("results", []))
         
         listings = []
@@ -140,8 +105,10 @@ def fetch_tripadvisor_data(query: str, api_key: str, limit: int = 30, city: str
                 else:
                     location_type = item.get("subcategory", "Attraction")
             
-            # Generate TripAdvisor ID
-            tripadvisor_id = str(item.get("location_id", f"php_{''.join(random.choices(string.ascii_lowercase + string.digits, k=8))}"))
+            # TripAdvisor ID (content-derived when the API has no location_id)
+            tripadvisor_id = str(item.get("location_id") or stable_listing_id(
+                name, api_city, address, item.get("latitude", item.get("lat")), item.get("longitude", item.get("lon"))
+            ))
             
             # Create slug
             slug = create_slug(name, tripadvisor_id)
@@ -321,68 +288,11 @@ def fetch_tripadvisor_data(query: str, api_key: str, limit: int = 30, city: str
         
         return listings
         
-    except requests.RequestException as e:
+    except Exception as e:
         print(f"  ❌ Error fetching {query}: {e}", file=sys.stderr)
         return []
 
 
-def enrich_with_grok(listing: Dict, api_key: str) -> Dict:
-    """Optionally enrich listing with Grok if fields are missing"""
-    if not api_key or not listing.get("fetch_status") == "success":
-        return listing
-    
-    # Only enrich if key fields are missing
-    missing_enrichment = not listing.get("hours_of_operation") or not listing.get("amenities")
-    
-    if not missing_enrichment:
-        return listing
-    
-    try:
-        prompt = f"""Based on this listing info, provide missing travel data as JSON only:
-Name: {listing.get('name')}
-City: {listing.get('city')}
-Category: {listing.get('category')}
-Type: {listing.get('location_type')}
-
-Return JSON with: hours_of_operation, amenities, best_for, price_level (1-4 or null).
-If unknown, return null for that field.
-"""
-        
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        payload = {
-            "model": GROK_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.0
-        }
-        
-        response = requests.post(GROK_ENDPOINT, headers=headers, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
-            # Extract JSON from response
-            import re
-            match = re.search(r"(\{.*\})", content, flags=re.DOTALL)
-            if match:
-                enrichment = json.loads(match.group(1))
-                
-                # Merge enrichment, only if original was empty
-                if enrichment.get("hours_of_operation") and not listing.get("hours_of_operation"):
-                    listing["hours_of_operation"] = enrichment["hours_of_operation"]
-                if enrichment.get("amenities") and not listing.get("amenities"):
-                    listing["amenities"] = enrichment["amenities"]
-                if enrichment.get("best_for") and not listing.get("best_for"):
-                    listing["best_for"] = enrichment["best_for"]
-                if enrichment.get("price_level") and not listing.get("price_level"):
-                    listing["price_level"] = enrichment["price_level"]
-        
-    except Exception as e:
-        print(f"  ⚠️  Grok enrichment error for {listing.get('name')}: {e}", file=sys.stderr)
-    
-    return listing
-
-
 def upsert_listings(supabase: Client, listings: List[Dict]) -> int:
     """Upsert listings to Supabase"""
     if not listings:
@@ -397,7 +307,7 @@ def upsert_listings(supabase: Client, listings: List[Dict]) -> int:
         try:
             supabase.table("nearby_listings").upsert(
                 chunk,
-                {"onConflict": "tripadvisor_id"}
+                on_conflict="tripadvisor_id"
             ).execute()
             
             upserted_count += len(chunk)
@@ -417,20 +327,46 @@ def main():
     parser.add_argument("--category", type=str, help="Specific category to sync")
     parser.add_argument("--limit", type=int, default=30, help="Results per query")
     parser.add_argument("--use-grok", action="store_true", help="Enable Grok enrichment")
+    parser.add_argument("--grok-batch", type=int, default=GROK_BATCH_SIZE,
+                        help="Listings per Grok request (1 = one request per listing)")
+    parser.add_argument("--grok-cache", type=str, default=GROK_CACHE_PATH, help="Persistent Grok answer cache file")
+    parser.add_argument("--grok-cache-ttl", type=float, default=GROK_CACHE_TTL_DAYS,
+                        help="Days before a cached Grok answer is asked again")
+    parser.add_argument("--grok-cache-max", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Most cached Grok answers kept (least recently used are evicted)")
+    parser.add_argument("--no-grok-cache", action="store_true", help="Always call Grok, ignoring the cache")
+    parser.add_argument("--grok-workers", type=int, default=GROK_WORKERS, help="Concurrent Grok requests")
+    parser.add_argument("--grok-rpm", type=float, default=DEFAULT_RPM,
+                        help="Grok requests per minute across all workers (0 = unlimited)")
+    parser.add_argument("--grok-tpm", type=float, default=DEFAULT_TPM,
+                        help="Grok tokens per minute across all workers (0 = unlimited)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Unique listings buffered before each upsert during the sweep")
+    parser.add_argument("--bloom", type=int, default=0,
+                        help="Dedup with a Bloom filter sized for this many ids instead of an exact set")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent Partner API requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_KEY,
+                        help="Max requests per second per TripAdvisor API key")
+    parser.add_argument("--details", action="store_true",
+                        help="Fetch location details and photos for newly seen listings (before Grok)")
+    parser.add_argument("--details-ttl", type=float, default=DETAILS_TTL_DAYS,
+                        help="With --details, days before cached details are fetched again")
+    parser.add_argument("--details-cache", type=str, default=DEFAULT_CACHE_PATH,
+                        help="With --details, SQLite details cache file")
     
     args = parser.parse_args()
     
     # Load environment variables
     supabase_url = os.getenv("VITE_PROJECT_URL") or os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    tripadvisor_key = os.getenv("VITE_TRIPADVISOR") or os.getenv("TRIPADVISOR")
+    tripadvisor_keys = parse_api_keys(os.getenv("VITE_TRIPADVISOR") or os.getenv("TRIPADVISOR"))
     grok_key = os.getenv("X_API_KEY") if args.use_grok else None
     
     if not supabase_url or not supabase_key:
         print("❌ Missing Supabase environment variables", file=sys.stderr)
         sys.exit(1)
     
-    if not tripadvisor_key:
+    if not tripadvisor_keys:
         print("❌ Missing TripAdvisor API key", file=sys.stderr)
         sys.exit(1)
     
@@ -443,70 +379,97 @@ def main():
     cities = [args.city] if args.city else PHILIPPINES_CITIES
     categories = [args.category] if args.category else CATEGORIES
     
+    client = PartnerApiClient(tripadvisor_keys, rate_per_key=args.rate)
     total_queries = len(cities) * len(categories)
     print(f"📍 Starting sync for {len(cities)} cities × {len(categories)} categories")
     print(f"Total queries: {total_queries}")
     if args.use_grok:
-        print(f"🤖 Grok enrichment: ENABLED\n")
+        print(f"🤖 Grok enrichment: ENABLED ({args.grok_batch} listings per request, "
+              f"{args.grok_workers} workers, {args.grok_rpm:g} req/min, {args.grok_tpm:g} tokens/min)\n")
     else:
         print(f"🤖 Grok enrichment: disabled (use --use-grok to enable)\n")
     
-    all_listings = []
+    seen = SeenIds(args.bloom or None)
+    writer = BatchWriter(lambda batch: upsert_listings(supabase, batch), args.batch_size)
+    pool = None
+    if args.use_grok:
+        cache = None
+        if not args.no_grok_cache:
+            cache = LLMCache(args.grok_cache, PROMPT_VERSION, args.grok_cache_ttl, args.grok_cache_max)
+        grok = GrokEnricher(grok_key, batch_size=args.grok_batch, cache=cache)
+        pool = GrokWorkerPool(grok, args.grok_workers, MinuteBudget(args.grok_rpm, args.grok_tpm))
+    details = None
+    if args.details:
+        details = DetailsFetcher(client, DetailsCache(args.details_cache), args.details_ttl, args.workers)
     total_fetched = 0
     success_count = 0
     error_count = 0
     query_count = 0
     
-    # Fetch data
-    for city in cities:
-        for category in categories:
-            query_count += 1
-            query = f"{category} in {city} Philippines"
-            print(f"[{query_count}/{total_queries}] Fetching {query}... ", end="", flush=True)
-            
-            try:
-                listings = fetch_tripadvisor_data(query, tripadvisor_key, args.limit, city)
-                
-                if listings:
-                    # Optional Grok enrichment
-                    if args.use_grok:
-                        listings = [enrich_with_grok(l, grok_key) for l in listings]
-                        time.sleep(0.5)
-                    
-                    all_listings.extend(listings)
-                    total_fetched += len(listings)
-                    success_count += 1
-                    print(f"✓ {len(listings)} items")
-                else:
-                    print("(no results)")
-                
-                time.sleep(0.3)
-                
-            except Exception as e:
-                error_count += 1
-                print(f"✗ Error: {e}", file=sys.stderr)
-    
+    # Fetch data (concurrently, reported in query order)
+    started = time.time()
+    tasks = [(city, category) for city in cities for category in categories]
+
+    def fetch(task):
+        city, category = task
+        return fetch_tripadvisor_data(f"{category} in {city} Philippines", client, args.limit, city)
+
+    for (city, category), listings, error in run_ordered(fetch, tasks, args.workers):
+        query_count += 1
+        query = f"{category} in {city} Philippines"
+        print(f"[{query_count}/{total_queries}] Fetching {query}... ", end="", flush=True)
+
+        if error:
+            error_count += 1
+            print(f"✗ Error: {error}", file=sys.stderr)
+        elif listings:
+            total_fetched += len(listings)
+            listings = [l for l in listings if seen.add(l["tripadvisor_id"])]
+
+            # Details first, so Grok is only asked for what the API cannot fill
+            if details:
+                details.enrich(listings)
+
+            # Optional Grok enrichment, only for listings not seen earlier in the sweep;
+            # the pool enriches in the background and finished listings are written below
+            if pool:
+                pool.submit(listings)
+            else:
+                writer.extend(listings)
+            success_count += 1
+            print(f"✓ {len(listings)} new items")
+        else:
+            print("(no results)")
+
+        if pool:
+            writer.extend(pool.drain())
+
+    if pool:
+        print(f"\n⏳ Waiting for Grok enrichment to finish...")
+        writer.extend(pool.close())
+    writer.flush()
+    if details:
+        details.close()
+
     # Print summary
     print(f"\n📊 Results:\n")
     print(f"  Total fetched: {total_fetched}")
     print(f"  Successful queries: {success_count}")
     print(f"  Failed queries: {error_count}")
-    
-    # Deduplicate listings
-    unique_map = {}
-    for listing in all_listings:
-        tid = listing["tripadvisor_id"]
-        if tid not in unique_map:
-            unique_map[tid] = listing
-    
-    unique_listings = list(unique_map.values())
-    print(f"  Unique listings: {len(unique_listings)}")
-    
-    # Upsert to database
-    if unique_listings:
-        print(f"\n💾 Upserting to database...")
-        upserted_count = upsert_listings(supabase, unique_listings)
-        print(f"\n✅ Sync complete! Upserted {upserted_count} listings.\n")
+    print(f"  Partner API: {client.summary()}")
+    print(f"  Fetch time: {time.time() - started:.1f}s ({args.workers} workers, {args.rate:g} req/s per key)")
+    print(f"  Unique listings: {len(seen)} ({seen.repeats} repeats dropped, {seen.describe()})")
+    if details:
+        print("  Details stage:")
+        for line in details.summary():
+            print(f"    {line}")
+    if pool:
+        print("  Grok enrichment:")
+        for line in pool.summary():
+            print(f"    {line}")
+
+    if len(seen):
+        print(f"\n✅ Sync complete! Upserted {writer.written} listings in {writer.batches} batches.\n")
     else:
         print(f"\n⚠️  No listings found. Check TripAdvisor API key.\n")
 
@@ -0,0 +1,9 @@
+"""
+nearby_sync
+
+Shared building blocks for the nearby_listings sync scripts in scripts/.
+
+The sync scripts are run directly (python scripts/<name>.py), which puts
+scripts/ on sys.path, so modules here are imported as
+``from nearby_sync.<module> import ...``.
+"""
@@ -0,0 +1,224 @@
+"""
+backfill.py
+
+Gap-targeted backfill planning for nearby_listings.
+
+Instead of refetching every field of every row, the planner:
+
+1. builds a boolean missing-field matrix (rows x BACKFILL_FIELDS), one
+   column at a time;
+2. packs each row's missing set, plus what the row makes possible (a real
+   location id for the Partner API, a known listing URL for a direct page
+   scrape), into one integer and groups identical rows with np.unique;
+3. routes every group to the cheapest combination of sources that can fill
+   its fields (see SOURCES), so a row missing only photos costs a Partner
+   API photo call and a row missing only best_for costs one LLM answer.
+
+Costs are rough USD estimates per row and only need to be right relative
+to each other; adjust them to the plans in use.
+"""
+
+import re
+from itertools import combinations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+BACKFILL_FIELDS = [
+    "rating", "review_count", "address", "phone_number", "website", "description",
+    "hours_of_operation", "amenities", "photo_urls", "price_range", "price_level",
+    "ranking_in_city", "awards", "best_for",
+]
+SELECT_COLUMNS = ",".join(["id", "tripadvisor_id", "web_url", "name", "city", "category", "location_type"]
+                          + BACKFILL_FIELDS)
+
+LISTING_URL_RE = re.compile(r"-d\d+-")
+
+# Estimated USD per row
+PARTNER_API_CALL_COST = 0.0005
+SCRAPE_CREDIT_COST = 0.0003
+SEARCH_PAGES = 2                # search pages spent finding a listing URL, on average
+LLM_ROW_COST = 0.0015
+
+SHADES = " ░▒▓█"
+
+
+class Source(NamedTuple):
+    name: str
+    label: str
+    fields: frozenset
+    requires: Optional[str]     # row flag the source needs, if any
+
+    def cost(self, has_listing_url: bool) -> float:
+        if self.name == "partner_api":
+            return 2 * PARTNER_API_CALL_COST
+        if self.name == "scrape":
+            return SCRAPE_CREDIT_COST * (1 if has_listing_url else 1 + SEARCH_PAGES)
+        return LLM_ROW_COST
+
+
+SOURCES = [
+    Source("partner_api", "Partner API details + photos", frozenset({
+        "rating", "review_count", "phone_number", "website", "description", "hours_of_operation",
+        "amenities", "photo_urls", "price_range", "price_level", "ranking_in_city", "awards", "best_for",
+    }), "location_id"),
+    Source("scrape", "detail page scrape", frozenset({
+        "rating", "review_count", "address", "phone_number", "website", "description",
+        "hours_of_operation", "amenities", "photo_urls", "price_range",
+    }), None),
+    Source("llm", "Grok", frozenset({"hours_of_operation", "amenities", "best_for", "price_level"}), None),
+]
+SOURCES_BY_NAME = {source.name: source for source in SOURCES}
+
+
+def is_empty(value, field: str = "") -> bool:
+    if value is None or value == "" or value == [] or value == {}:
+        return True
+    if field == "rating":
+        try:
+            return float(value) <= 0
+        except (TypeError, ValueError):
+            return True
+    return False
+
+
+def missing_matrix(rows: Sequence[Dict], fields: Sequence[str] = BACKFILL_FIELDS) -> np.ndarray:
+    """Boolean (rows x fields) matrix, True where the row's field is missing or empty"""
+    matrix = np.zeros((len(rows), len(fields)), dtype=bool)
+    for j, field in enumerate(fields):
+        matrix[:, j] = np.fromiter((is_empty(row.get(field), field) for row in rows), dtype=bool, count=len(rows))
+    return matrix
+
+
+def row_flags(rows: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """(has a numeric location id, has a listing page URL) per row"""
+    has_location_id = np.fromiter((str(r.get("tripadvisor_id") or "").isdigit() for r in rows),
+                                  dtype=bool, count=len(rows))
+    has_listing_url = np.fromiter((bool(LISTING_URL_RE.search(r.get("web_url") or "")) for r in rows),
+                                  dtype=bool, count=len(rows))
+    return has_location_id, has_listing_url
+
+
+class Route(NamedTuple):
+    steps: List[Tuple[str, List[str]]]      # (source name, fields it fills)
+    unfillable: List[str]
+    cost_per_row: float
+
+
+def route_fields(missing: Iterable[str], has_location_id: bool, has_listing_url: bool) -> Route:
+    """Cheapest source combination covering as many of the missing fields as possible"""
+    missing = set(missing)
+    eligible = [s for s in SOURCES if s.requires != "location_id" or has_location_id]
+
+    best = None
+    for n in range(1, len(eligible) + 1):
+        for combo in combinations(eligible, n):
+            covered = missing & frozenset().union(*(s.fields for s in combo))
+            cost = sum(s.cost(has_listing_url) for s in combo)
+            key = (-len(covered), cost)
+            if best is None or key < best[0]:
+                best = (key, combo, covered)
+
+    if best is None or not best[2]:
+        return Route([], sorted(missing), 0.0)
+
+    _, combo, covered = best
+    steps = []
+    remaining = set(covered)
+    # Cheapest source first takes every field it can, the others fill what is left
+    for source in sorted(combo, key=lambda s: s.cost(has_listing_url)):
+        fields = sorted(remaining & source.fields)
+        if fields:
+            steps.append((source.name, fields))
+            remaining -= source.fields
+    cost = sum(SOURCES_BY_NAME[name].cost(has_listing_url) for name, _ in steps)
+    return Route(steps, sorted(missing - covered), cost)
+
+
+class BackfillGroup(NamedTuple):
+    missing: List[str]
+    has_location_id: bool
+    has_listing_url: bool
+    row_indexes: np.ndarray
+    route: Route
+
+    @property
+    def cost(self) -> float:
+        return self.route.cost_per_row * len(self.row_indexes)
+
+
+class BackfillPlan:
+    """Missing-field matrix of a set of rows, grouped by exact missing set and routed"""
+
+    def __init__(self, rows: Sequence[Dict], fields: Sequence[str] = BACKFILL_FIELDS):
+        self.rows = rows
+        self.fields = list(fields)
+        self.matrix = missing_matrix(rows, self.fields)
+        self.has_location_id, self.has_listing_url = row_flags(rows)
+        self.groups = self._group()
+
+    def _group(self) -> List[BackfillGroup]:
+        k = len(self.fields)
+        if not len(self.rows):
+            return []
+        weights = np.left_shift(np.int64(1), np.arange(k, dtype=np.int64))
+        codes = self.matrix.astype(np.int64) @ weights
+        codes |= self.has_location_id.astype(np.int64) << k
+        codes |= self.has_listing_url.astype(np.int64) << (k + 1)
+
+        uniq, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        members = np.split(order, np.cumsum(counts)[:-1])
+
+        groups = []
+        for code, indexes in zip(uniq.tolist(), members):
+            missing = [f for j, f in enumerate(self.fields) if code >> j & 1]
+            if not missing:
+                continue
+            has_location_id = bool(code >> k & 1)
+            has_listing_url = bool(code >> (k + 1) & 1)
+            route = route_fields(missing, has_location_id, has_listing_url)
+            groups.append(BackfillGroup(missing, has_location_id, has_listing_url, indexes, route))
+        groups.sort(key=lambda g: -len(g.row_indexes))
+        return groups
+
+    def source_totals(self) -> Dict[str, Dict]:
+        """Rows, field fills and estimated cost per source"""
+        totals = {s.name: {"rows": 0, "fields": 0, "cost": 0.0} for s in SOURCES}
+        for group in self.groups:
+            n = len(group.row_indexes)
+            for name, fields in group.route.steps:
+                totals[name]["rows"] += n
+                totals[name]["fields"] += n * len(fields)
+                totals[name]["cost"] += n * SOURCES_BY_NAME[name].cost(group.has_listing_url)
+        return totals
+
+    def assignments(self, source: str) -> List[Tuple[Dict, List[str]]]:
+        """(row, fields to fill) for every row routed through source"""
+        result = []
+        for group in self.groups:
+            for name, fields in group.route.steps:
+                if name == source:
+                    result.extend((self.rows[i], fields) for i in group.row_indexes.tolist())
+        return result
+
+    def heatmap(self, by: str = "location_type", top: int = 12) -> List[str]:
+        """Text heatmap of the missing fraction per field, overall and for the largest row types"""
+        n = len(self.rows)
+        labels = np.array([str(r.get(by) or "—")[:18] for r in self.rows], dtype=object)
+        kinds, counts = np.unique(labels, return_counts=True)
+        kinds = kinds[np.argsort(-counts)][:top]
+
+        short = [f[:6] for f in self.fields]
+        lines = [f"{'':>26}  " + " ".join(f"{s:>6}" for s in short)]
+
+        def row_line(label: str, mask: np.ndarray) -> str:
+            rate = self.matrix[mask].mean(axis=0) if mask.any() else np.zeros(len(self.fields))
+            cells = [SHADES[min(len(SHADES) - 1, int(r * (len(SHADES) - 1) + 0.5))] * 3 + f"{r * 100:3.0f}" for r in rate]
+            return f"{label:>18} {int(mask.sum()):>7} " + " ".join(cells)
+
+        lines.append(row_line("ALL", np.ones(n, dtype=bool)))
+        for kind in kinds:
+            lines.append(row_line(kind, labels == kind))
+        lines.append(f"{'missing':>18} {'':>7} " + " ".join(f"{int(c):>6}" for c in self.matrix.sum(axis=0)))
+        return lines
@@ -0,0 +1,87 @@
+"""
+blue_green.py
+
+Client side of the nearby_listings blue/green generations
+(supabase/migrations/0209_nearby_listings_blue_green.sql).
+
+A full refetch writes into nearby_listings_shadow while the live table keeps
+serving, then swap_shadow() validates row counts and key coverage and swaps
+the tables in one transaction. Votes and other ON DELETE CASCADE references
+to listings the new generation dropped are deleted and counted in the
+result. The replaced generation stays in nearby_listings_previous until the
+next swap, and rollback() puts it back.
+"""
+
+import time
+from typing import Dict
+
+LIVE_TABLE = "nearby_listings"
+SHADOW_TABLE = "nearby_listings_shadow"
+PREVIOUS_TABLE = "nearby_listings_previous"
+
+# Minimum shadow/live row ratio and share of live TripAdvisor ids present in the shadow
+MIN_ROW_RATIO = 0.9
+MIN_KEY_COVERAGE = 0.9
+
+
+def generations(supabase) -> Dict:
+    """Row counts of live, shadow and previous generations that exist"""
+    return supabase.rpc("nearby_listings_generations", {}).execute().data or {}
+
+
+def prepare_shadow(supabase, timeout: float = 30.0) -> str:
+    """Recreate an empty shadow table and wait until PostgREST exposes it"""
+    supabase.rpc("nearby_listings_prepare_shadow", {}).execute()
+
+    # The function asks PostgREST to reload its schema cache; that is asynchronous
+    deadline = time.time() + timeout
+    while True:
+        try:
+            supabase.table(SHADOW_TABLE).select("id").limit(1).execute()
+            return SHADOW_TABLE
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(1.0)
+
+
+def validate_shadow(supabase, min_row_ratio: float = MIN_ROW_RATIO,
+                    min_key_coverage: float = MIN_KEY_COVERAGE) -> Dict:
+    return supabase.rpc("nearby_listings_validate_shadow", {
+        "p_min_row_ratio": min_row_ratio,
+        "p_min_key_coverage": min_key_coverage,
+    }).execute().data or {}
+
+
+def swap_shadow(supabase, min_row_ratio: float = MIN_ROW_RATIO,
+                min_key_coverage: float = MIN_KEY_COVERAGE, force: bool = False) -> Dict:
+    """Validate the shadow generation and make it live if it passes (or force)"""
+    return supabase.rpc("nearby_listings_swap", {
+        "p_min_row_ratio": min_row_ratio,
+        "p_min_key_coverage": min_key_coverage,
+        "p_force": force,
+    }).execute().data or {}
+
+
+def rollback(supabase) -> Dict:
+    """Make the previous generation live again"""
+    return supabase.rpc("nearby_listings_rollback", {}).execute().data or {}
+
+
+def orphaned_count(report: Dict) -> int:
+    """Referencing rows (listing_votes, ...) a swap or rollback deleted with their listings"""
+    return sum((report.get("orphaned_references") or {}).values())
+
+
+def print_validation(report: Dict):
+    print(f"  Live rows: {report.get('live_rows')}")
+    print(f"  Shadow rows: {report.get('shadow_rows')} (ratio {report.get('row_ratio')})")
+    print(f"  TripAdvisor id coverage: {report.get('covered_keys')}/{report.get('live_keys')} "
+          f"({report.get('key_coverage')})")
+    print(f"  Rows without a name: {report.get('missing_names')}")
+    print(f"  Valid: {'✅' if report.get('ok') else '❌'}")
+    orphans = report.get("orphaned_references")
+    if orphans is not None:
+        detail = ", ".join(f"{name}: {count}" for name, count in orphans.items())
+        print(f"  Rows deleted for listings missing from the new generation: {orphaned_count(report)}"
+              + (f" ({detail})" if detail else ""))
@@ -0,0 +1,198 @@
+"""
+bulk_load.py
+
+Direct-database bulk loader for nearby_listings.
+
+Instead of one PostgREST request per row (or per 50 rows), rows are
+streamed with COPY ... FROM STDIN into a temporary staging table and merged
+into the target with a single INSERT ... ON CONFLICT statement, all in one
+transaction. A failed batch leaves the target untouched.
+
+Needs psycopg2 and a direct connection string (DATABASE_URL, e.g. the
+Supabase "Connection string" or a local postgres://... for testing).
+"""
+
+import io
+import json
+import os
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:  # optional: only the COPY path needs it
+    psycopg2 = None
+    sql = None
+
+DEFAULT_TABLE = "nearby_listings"
+DEFAULT_KEY = "tripadvisor_id"
+STAGE_TABLE = "nearby_listings_stage"
+SEQ_COLUMN = "_load_seq"
+
+# Inserted when new, never overwritten on conflict: id is the row's BIGSERIAL
+# and created_at its first insert. Foreign keys (listing_votes.listing_id)
+# reference the conflict key, tripadvisor_id, not id
+INSERT_ONLY_COLUMNS = ("id", "created_at")
+
+
+class LoadResult(NamedTuple):
+    rows: int
+    merged: int
+    seconds: float
+    skipped_columns: List[str]
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def database_url() -> Optional[str]:
+    return os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DB_URL")
+
+
+def _pg_array(values) -> str:
+    """Postgres array literal for a Python list of scalars"""
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        else:
+            text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            items.append(f'"{text}"')
+    return "{" + ",".join(items) + "}"
+
+
+def format_value(value, data_type: str) -> Optional[str]:
+    """Text form of a Python value for a column of the given information_schema data_type"""
+    if value is None:
+        return None
+    if data_type in ("json", "jsonb"):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if data_type == "ARRAY":
+        return _pg_array(value if isinstance(value, (list, tuple)) else [value])
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _csv_field(text: Optional[str]) -> str:
+    # Values are always quoted so that an unquoted empty field means NULL
+    if text is None:
+        return ""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def rows_to_csv(rows: List[Dict], columns: List[str], types: Dict[str, str]) -> io.StringIO:
+    """CSV buffer for COPY (FORMAT csv), with a trailing sequence column"""
+    buffer = io.StringIO()
+    for seq, row in enumerate(rows):
+        fields = [_csv_field(format_value(row.get(c), types[c])) for c in columns]
+        fields.append(str(seq))
+        buffer.write(",".join(fields))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+class CopyLoader:
+    """COPY rows into a staging table and merge them into the target table"""
+
+    def __init__(self, dsn: Optional[str] = None, table: str = DEFAULT_TABLE, key: str = DEFAULT_KEY):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is not installed (pip install psycopg2-binary)")
+        dsn = dsn or database_url()
+        if not dsn:
+            raise RuntimeError("Set DATABASE_URL to a direct Postgres connection string")
+        self.table = table
+        self.key = key
+        self.conn = psycopg2.connect(dsn)
+        self._types: Optional[Dict[str, str]] = None
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column_types(self) -> Dict[str, str]:
+        """Target table columns and their information_schema data_type"""
+        if self._types is None:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT column_name, data_type FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = %s",
+                    (self.table,),
+                )
+                self._types = dict(cur.fetchall())
+            self.conn.rollback()
+            if not self._types:
+                raise RuntimeError(f"Table {self.table} not found")
+        return self._types
+
+    def load(self, rows: Iterable[Dict], update_columns: Optional[Iterable[str]] = None) -> LoadResult:
+        """Upsert rows on the key column; the last row wins for duplicate keys
+
+        On conflict the update_columns are overwritten (default: every loaded
+        column except the key and INSERT_ONLY_COLUMNS).
+        """
+        rows = [r for r in rows if r.get(self.key) is not None]
+        started = time.perf_counter()
+        if not rows:
+            return LoadResult(0, 0, 0.0, [])
+
+        types = self.column_types()
+        seen = []
+        for row in rows:
+            for col in row:
+                if col not in seen:
+                    seen.append(col)
+        columns = [c for c in seen if c in types]
+        skipped = [c for c in seen if c not in types]
+
+        ident = sql.Identifier
+        cols = sql.SQL(", ").join(ident(c) for c in columns)
+        if update_columns is None:
+            update_columns = [c for c in columns if c != self.key and c not in INSERT_ONLY_COLUMNS]
+        else:
+            update_columns = [c for c in update_columns if c in columns and c != self.key]
+        updates = sql.SQL(", ").join(
+            sql.SQL("{} = EXCLUDED.{}").format(ident(c), ident(c)) for c in update_columns
+        )
+
+        try:
+            with self.conn.cursor() as cur:
+                # Same column types as the target, none of its constraints
+                cur.execute(sql.SQL(
+                    "CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA"
+                ).format(stage=ident(STAGE_TABLE), cols=cols, table=ident(self.table)))
+                cur.execute(sql.SQL("ALTER TABLE {stage} ADD COLUMN {seq} BIGINT").format(
+                    stage=ident(STAGE_TABLE), seq=ident(SEQ_COLUMN)))
+
+                copy = sql.SQL("COPY {stage} ({cols}, {seq}) FROM STDIN WITH (FORMAT csv)").format(
+                    stage=ident(STAGE_TABLE), cols=cols, seq=ident(SEQ_COLUMN))
+                cur.copy_expert(copy.as_string(self.conn), rows_to_csv(rows, columns, types))
+
+                merge = sql.SQL(
+                    "INSERT INTO {table} ({cols}) "
+                    "SELECT DISTINCT ON ({key}) {cols} FROM {stage} ORDER BY {key}, {seq} DESC "
+                    "ON CONFLICT ({key}) DO "
+                ).format(table=ident(self.table), cols=cols, key=ident(self.key),
+                         stage=ident(STAGE_TABLE), seq=ident(SEQ_COLUMN))
+                merge += (sql.SQL("UPDATE SET ") + updates) if update_columns else sql.SQL("NOTHING")
+                cur.execute(merge)
+                merged = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        return LoadResult(len(rows), merged, time.perf_counter() - started, skipped)
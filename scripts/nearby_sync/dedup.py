@@ -0,0 +1,317 @@
+"""
+dedup.py
+
+Entity resolution over nearby_listings rows from every sync source.
+
+The ingestion paths write overlapping rows: random php_xxxxxxxx ids when the
+Partner API has no location_id, uuid ids and unsuffixed slugs from the
+refetch script, d{timestamp} ids from fetch-tripadvisor-accurate.py. This
+module finds those duplicates for the whole table at once:
+
+1. Block candidate pairs by city + geohash cell (with neighbours) and by
+   city + first name token, so rows with fallback coordinates still meet
+2. Score name and address similarity as hashed-trigram Dice coefficients,
+   computed block-wise with NumPy matrix products, plus haversine distance
+3. Union matching pairs into clusters, strongest first, never putting two
+   different real TripAdvisor ids in one cluster, and pick a survivor row
+   per cluster
+"""
+
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from nearby_sync.geo import geohash_encode, geohash_with_neighbors, haversine_m, precise_coords
+from nearby_sync.matching import name_trigrams, normalize_name
+
+# Hashed trigram feature width
+FEATURE_DIM = 1024
+
+# Geohash precision for spatial blocking (5 = ~4.9km cells)
+GEOHASH_PRECISION = 5
+
+# Query rows scored per matrix product, bounds memory on very large blocks
+CHUNK_ROWS = 512
+
+# Decision thresholds
+NAME_STRONG = 0.92          # near-identical names
+NAME_MATCH = 0.75           # similar names that need address or distance support
+ADDRESS_MATCH = 0.6
+NEAR_M = 250.0              # "same place" distance
+FAR_M = 2000.0              # identical names further apart than this are branches
+
+REAL_TRIPADVISOR_ID_RE = re.compile(r"^\d+$")
+
+# Columns used to decide which row of a cluster survives
+COMPLETENESS_COLUMNS = (
+    "address", "phone_number", "website", "description", "rating", "review_count",
+    "image_url", "photo_urls", "hours_of_operation", "amenities", "latitude", "longitude",
+)
+
+SELECT_COLUMNS = (
+    "id,tripadvisor_id,slug,name,address,city,latitude,longitude,source,rating,review_count,"
+    "phone_number,website,description,image_url,photo_urls,hours_of_operation,amenities,updated_at"
+)
+
+
+def is_real_tripadvisor_id(value) -> bool:
+    """True for numeric TripAdvisor location ids, False for php_/uuid/d{timestamp} fallbacks"""
+    return bool(value) and bool(REAL_TRIPADVISOR_ID_RE.match(str(value)))
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def hashed_trigram_matrix(texts: List[str], dim: int = FEATURE_DIM) -> Tuple[np.ndarray, np.ndarray]:
+    """Binary (n, dim) float32 matrix of hashed trigrams, and each row's trigram count"""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    columns: Dict[str, int] = {}
+    for row, text in enumerate(texts):
+        cols = []
+        for gram in name_trigrams(text):
+            col = columns.get(gram)
+            if col is None:
+                col = columns[gram] = zlib.crc32(gram.encode("utf-8")) % dim
+            cols.append(col)
+        if cols:
+            matrix[row, cols] = 1.0
+    return matrix, matrix.sum(axis=1)
+
+
+class ListingTable:
+    """Column arrays for a snapshot of nearby_listings rows"""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        n = len(rows)
+        self.city = np.array([normalize_name(r.get("city") or "") for r in rows], dtype=object)
+        self.names = [normalize_name(r.get("name") or "") for r in rows]
+        # "Manila, Philippines" style fallback addresses say nothing about the place
+        self.addresses = [
+            "" if address == city else address
+            for address, city in zip((normalize_name(r.get("address") or "") for r in rows), self.city)
+        ]
+        self.lat = np.array([_to_float(r.get("latitude", r.get("lat"))) for r in rows], dtype=np.float64)
+        self.lng = np.array([_to_float(r.get("longitude", r.get("lng"))) for r in rows], dtype=np.float64)
+        self.precise = precise_coords(self.lat, self.lng) if n else np.zeros(0, dtype=bool)
+        self.real_id = np.array([is_real_tripadvisor_id(r.get("tripadvisor_id")) for r in rows], dtype=bool)
+        self.tripadvisor_id = np.array([str(r.get("tripadvisor_id") or "") for r in rows], dtype=object)
+
+        self.name_vec, self.name_len = hashed_trigram_matrix(self.names)
+        self.addr_vec, self.addr_len = hashed_trigram_matrix(self.addresses)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def build_blocks(table: ListingTable) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(query_rows, candidate_rows) index pairs to compare
+
+    Spatial blocks compare each geohash cell against itself and its 8
+    neighbours inside the same city. Name blocks compare rows of a city that
+    share their first name token, which catches rows whose coordinates are
+    fallbacks. A pair is only scored once per block (query < candidate).
+    """
+    blocks: List[Tuple[np.ndarray, np.ndarray]] = []
+    if not len(table):
+        return blocks
+
+    # Spatial blocking on rows with precise coordinates
+    idx = np.nonzero(table.precise)[0]
+    if len(idx):
+        cells = geohash_encode(table.lat[idx], table.lng[idx], GEOHASH_PRECISION)
+        neighbours = geohash_with_neighbors(table.lat[idx], table.lng[idx], GEOHASH_PRECISION)
+
+        by_cell: Dict[Tuple[str, str], List[int]] = {}
+        for pos, row in enumerate(idx):
+            by_cell.setdefault((table.city[row], cells[pos]), []).append(row)
+
+        for (city, cell), rows in by_cell.items():
+            pos = np.searchsorted(idx, rows[0])
+            candidates: List[int] = []
+            for neighbour in neighbours[pos]:
+                candidates.extend(by_cell.get((city, neighbour), ()))
+            blocks.append((np.array(rows), np.unique(np.array(candidates))))
+
+    # Name-token blocking for every row
+    by_token: Dict[Tuple[str, str], List[int]] = {}
+    for row, name in enumerate(table.names):
+        if name:
+            by_token.setdefault((table.city[row], name.split()[0]), []).append(row)
+    for rows in by_token.values():
+        if len(rows) > 1:
+            arr = np.array(rows)
+            blocks.append((arr, arr))
+
+    return blocks
+
+
+def score_block(table: ListingTable, queries: np.ndarray, candidates: np.ndarray) -> List[Tuple[int, int, float]]:
+    """Matching (i, j, name_score) pairs between query and candidate rows, i < j"""
+    matches: List[Tuple[int, int, float]] = []
+
+    cand_name = table.name_vec[candidates]
+    cand_addr = table.addr_vec[candidates]
+
+    for start in range(0, len(queries), CHUNK_ROWS):
+        q = queries[start:start + CHUNK_ROWS]
+
+        name_inter = table.name_vec[q] @ cand_name.T
+        name_total = table.name_len[q][:, None] + table.name_len[candidates][None, :]
+        name_sim = np.divide(2.0 * name_inter, name_total, out=np.zeros_like(name_inter), where=name_total > 0)
+
+        addr_inter = table.addr_vec[q] @ cand_addr.T
+        addr_total = table.addr_len[q][:, None] + table.addr_len[candidates][None, :]
+        addr_sim = np.divide(2.0 * addr_inter, addr_total, out=np.zeros_like(addr_inter), where=addr_total > 0)
+
+        both_precise = table.precise[q][:, None] & table.precise[candidates][None, :]
+        dist = np.where(
+            both_precise,
+            haversine_m(table.lat[q][:, None], table.lng[q][:, None],
+                        table.lat[candidates][None, :], table.lng[candidates][None, :]),
+            np.nan,
+        )
+        near = both_precise & (dist <= NEAR_M)
+        not_far = ~both_precise | (dist <= FAR_M)
+
+        # Two distinct real TripAdvisor ids are two distinct places
+        conflicting_ids = (
+            table.real_id[q][:, None] & table.real_id[candidates][None, :]
+            & (table.tripadvisor_id[q][:, None] != table.tripadvisor_id[candidates][None, :])
+        )
+
+        is_match = (
+            ((name_sim >= NAME_STRONG) & not_far)
+            | ((name_sim >= NAME_MATCH) & ((addr_sim >= ADDRESS_MATCH) | near))
+        )
+        is_match &= ~conflicting_ids
+        is_match &= q[:, None] < candidates[None, :]
+
+        qi, cj = np.nonzero(is_match)
+        for a, b in zip(qi.tolist(), cj.tolist()):
+            matches.append((int(q[a]), int(candidates[b]), float(name_sim[a, b])))
+
+    return matches
+
+
+class UnionFind:
+    """Disjoint sets over row positions, never joining sets with different labels
+
+    labels[i] is the real TripAdvisor id of row i ("" for fallback ids); each
+    root carries the label of its set, so a php_ row matching two different
+    real listings can join only one of them.
+    """
+
+    def __init__(self, n: int, labels: Optional[List[str]] = None):
+        self.parent = list(range(n))
+        self.label = list(labels) if labels is not None else [""] * n
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """Join the sets of a and b; False when their labels conflict"""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return True
+        la, lb = self.label[ra], self.label[rb]
+        if la and lb and la != lb:
+            return False
+        root, child = min(ra, rb), max(ra, rb)
+        self.parent[child] = root
+        self.label[root] = la or lb
+        return True
+
+
+def completeness(row: Dict) -> int:
+    """Number of filled detail columns"""
+    return sum(1 for col in COMPLETENESS_COLUMNS if row.get(col) not in (None, "", [], {}))
+
+
+def survivor_key(row: Dict) -> Tuple:
+    """Sort key: real TripAdvisor id, most complete, most reviews, newest, lowest id"""
+    try:
+        reviews = int(row.get("review_count") or 0)
+    except (TypeError, ValueError):
+        reviews = 0
+    row_id = _to_float(row.get("id"))
+    return (
+        is_real_tripadvisor_id(row.get("tripadvisor_id")),
+        completeness(row),
+        reviews,
+        str(row.get("updated_at") or ""),
+        -row_id if np.isfinite(row_id) else 0.0,
+    )
+
+
+def find_duplicate_clusters(rows: List[Dict]) -> List[Dict]:
+    """Cluster duplicate rows and choose a survivor for each cluster
+
+    Returns dicts with survivor_id, duplicate_ids, min_name_score and the
+    members' (id, tripadvisor_id, name, city) for review.
+    """
+    table = ListingTable(rows)
+    uf = UnionFind(len(table), [tid if real else "" for tid, real in zip(table.tripadvisor_id, table.real_id)])
+    min_score: Dict[int, float] = {}
+
+    matches = [match for queries, candidates in build_blocks(table)
+               for match in score_block(table, queries, candidates)]
+    # Strongest pairs first, so a fallback row joins the real listing it matches best
+    matches.sort(key=lambda m: (-m[2], m[0], m[1]))
+    for i, j, score in matches:
+        if not uf.union(i, j):
+            continue
+        min_score[i] = min(min_score.get(i, 1.0), score)
+        min_score[j] = min(min_score.get(j, 1.0), score)
+
+    members: Dict[int, List[int]] = {}
+    for row in min_score:
+        members.setdefault(uf.find(row), []).append(row)
+
+    clusters = []
+    for positions in members.values():
+        if len(positions) < 2:
+            continue
+        ordered = sorted(positions, key=lambda p: survivor_key(rows[p]), reverse=True)
+        survivor = rows[ordered[0]]
+        clusters.append({
+            "survivor_id": survivor.get("id"),
+            "survivor_tripadvisor_id": survivor.get("tripadvisor_id"),
+            "duplicate_ids": [rows[p].get("id") for p in ordered[1:]],
+            "min_name_score": round(min(min_score[p] for p in positions), 3),
+            "members": [
+                {
+                    "id": rows[p].get("id"),
+                    "tripadvisor_id": rows[p].get("tripadvisor_id"),
+                    "name": rows[p].get("name"),
+                    "city": rows[p].get("city"),
+                    "source": rows[p].get("source"),
+                }
+                for p in ordered
+            ],
+        })
+
+    clusters.sort(key=lambda c: len(c["members"]), reverse=True)
+    return clusters
+
+
+def merge_patch(survivor: Dict, duplicates: Iterable[Dict]) -> Dict:
+    """Columns the survivor is missing that a duplicate can fill"""
+    patch = {}
+    for col in COMPLETENESS_COLUMNS:
+        if survivor.get(col) not in (None, "", [], {}):
+            continue
+        for dup in duplicates:
+            if dup.get(col) not in (None, "", [], {}):
+                patch[col] = dup[col]
+                break
+    return patch
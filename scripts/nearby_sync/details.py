@@ -0,0 +1,279 @@
+"""
+details.py
+
+Location details + photos stage for Partner API sweeps.
+
+locations/search and the nearby search only return a summary per place, so
+hours, amenities, rankings and photos stay mostly empty. DetailsFetcher takes
+the listings a sweep has just seen for the first time and fans out
+location/{id}/details and location/{id}/photos requests for them on a
+bounded thread pool (sharing the sweep's rate-limited PartnerApiClient).
+
+Results are kept in a SQLite cache keyed by location id. An id fetched
+within the TTL is filled from the cache without any request, so re-running a
+sweep only pays for ids that are new or stale.
+
+Usage:
+    with DetailsFetcher(client, DetailsCache()) as details:
+        listings = details.enrich(listings)
+    print("\n".join(details.summary()))
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from nearby_sync.partner_api import DEFAULT_WORKERS, PartnerApiClient
+
+DEFAULT_CACHE_PATH = os.getenv("TRIPADVISOR_DETAILS_CACHE") or "tripadvisor_details_cache.sqlite3"
+DEFAULT_TTL_DAYS = 14.0
+PHOTO_LIMIT = 20
+
+STAGES = ("details", "photos")
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS details (
+    location_id TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    columns TEXT NOT NULL
+);
+"""
+
+
+def is_location_id(tripadvisor_id) -> bool:
+    """True for real Partner API ids (synthetic php_ ids have nothing to fetch)"""
+    return str(tripadvisor_id).isdigit()
+
+
+def _hours(hours) -> Dict:
+    """{"Monday": "09:00 - 17:00", ...} from either Partner API hours shape"""
+    result = {}
+    if isinstance(hours, list):
+        for entry in hours:
+            if isinstance(entry, dict) and entry.get("open_time") and entry.get("close_time"):
+                day = entry.get("day")
+                if isinstance(day, int) and 0 <= day < 7:
+                    result[WEEKDAYS[day]] = f"{entry['open_time']} - {entry['close_time']}"
+    elif isinstance(hours, dict):
+        for text in hours.get("weekday_text") or []:
+            day, _, value = str(text).partition(":")
+            if day.strip() in WEEKDAYS and value.strip():
+                result[day.strip()] = value.strip()
+    return result
+
+
+def _names(values, limit: int = 50) -> List[str]:
+    names = []
+    for value in values or []:
+        if isinstance(value, dict):
+            value = value.get("display_name") or value.get("name") or value.get("award_type")
+        if value and value not in names:
+            names.append(str(value))
+    return names[:limit]
+
+
+def _photo_urls(photos: Dict) -> List[str]:
+    urls = []
+    for photo in (photos or {}).get("data", []):
+        images = photo.get("images", {}) if isinstance(photo, dict) else {}
+        for size in ("large", "original", "medium"):
+            url = (images.get(size) or {}).get("url")
+            if url:
+                if url not in urls:
+                    urls.append(url)
+                break
+    return urls[:PHOTO_LIMIT]
+
+
+def details_columns(details: Dict, photos: Optional[Dict] = None) -> Dict:
+    """nearby_listings columns from a details (+ photos) response; empty values are left out"""
+    ranking = details.get("ranking_data") or {}
+    columns = {
+        "description": details.get("description"),
+        "phone_number": details.get("phone"),
+        "website": details.get("website"),
+        "web_url": details.get("web_url"),
+        "hours_of_operation": _hours(details.get("hours")),
+        "amenities": _names(details.get("amenities")),
+        "awards": _names(details.get("awards")),
+        "best_for": _names(details.get("trip_types")),
+        "ranking_in_city": ranking.get("ranking_string"),
+        "photo_count": details.get("photo_count"),
+    }
+
+    try:
+        columns["ranking_in_category"] = int(ranking["ranking"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        columns["rating"] = float(details["rating"])
+        columns["review_count"] = int(details["num_reviews"])
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    price = details.get("price_level")
+    if isinstance(price, str) and price and set(price) == {"$"}:
+        columns["price_level"] = len(price)
+        columns["price_range"] = price
+
+    photo_urls = _photo_urls(photos)
+    if photo_urls:
+        columns["photo_urls"] = photo_urls
+        columns["image_url"] = columns["featured_image_url"] = columns["primary_image_url"] = photo_urls[0]
+
+    return {key: value for key, value in columns.items() if value not in (None, "", [], {})}
+
+
+class DetailsCache:
+    """SQLite cache of detail columns per location id, with fetch time"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.conn = sqlite3.connect(path or ":memory:")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def fresh(self, location_ids: List[str], ttl_seconds: float) -> Dict[str, Dict]:
+        """Cached columns for the ids fetched within the TTL"""
+        if not location_ids:
+            return {}
+        cutoff = time.time() - ttl_seconds
+        placeholders = ",".join("?" * len(location_ids))
+        rows = self.conn.execute(
+            f"SELECT location_id, columns FROM details WHERE fetched_at >= ? AND location_id IN ({placeholders})",
+            [cutoff, *location_ids],
+        )
+        return {location_id: json.loads(columns) for location_id, columns in rows}
+
+    def store(self, entries: Dict[str, Dict]):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO details (location_id, fetched_at, columns) VALUES (?, ?, ?)",
+                [(location_id, now, json.dumps(columns)) for location_id, columns in entries.items()],
+            )
+
+
+class StageTimer:
+    """Thread-safe latency samples per stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def describe(self, stage: str, unit: str = "requests") -> str:
+        values = sorted(self.samples.get(stage, []))
+        if not values:
+            return f"{stage}: no {unit}"
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        return (f"{stage}: {len(values)} {unit}, mean {sum(values) / len(values) * 1000:.0f}ms, "
+                f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms")
+
+
+class DetailsFetcher:
+    """Fill listings with details + photos, fetching only ids without fresh cached details"""
+
+    def __init__(self, client: PartnerApiClient, cache: Optional[DetailsCache] = None,
+                 ttl_days: float = DEFAULT_TTL_DAYS, workers: int = DEFAULT_WORKERS,
+                 language: str = "en"):
+        self.client = client
+        self.cache = cache or DetailsCache(None)
+        self.ttl_seconds = ttl_days * 86400
+        self.language = language
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.timer = StageTimer()
+
+        self.listings = 0
+        self.cached = 0
+        self.fetched = 0
+        self.failed = 0
+        self.requests = 0
+        self.wall = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.cache.close()
+
+    def _request(self, location_id: str, stage: str) -> Tuple[str, str, Optional[Dict]]:
+        path = f"location/{location_id}/{stage}"
+        params = {"language": self.language}
+        if stage == "photos":
+            params["limit"] = PHOTO_LIMIT
+        started = time.perf_counter()
+        data = self.client.get(path, params)
+        self.timer.record(stage, time.perf_counter() - started)
+        return location_id, stage, data
+
+    def enrich(self, listings: List[Dict]) -> List[Dict]:
+        """Merge detail columns into listings in place (and return them)"""
+        by_id = {}
+        for listing in listings:
+            if is_location_id(listing.get("tripadvisor_id")):
+                by_id.setdefault(str(listing["tripadvisor_id"]), []).append(listing)
+        if not by_id:
+            return listings
+
+        started = time.perf_counter()
+        self.listings += len(by_id)
+        columns = self.cache.fresh(list(by_id), self.ttl_seconds)
+        self.cached += len(columns)
+
+        # Both stages of every stale id go to the pool at once
+        stale = [location_id for location_id in by_id if location_id not in columns]
+        futures = [self.pool.submit(self._request, location_id, stage) for location_id in stale for stage in STAGES]
+        self.requests += len(futures)
+
+        responses: Dict[str, Dict] = {}
+        for future in futures:
+            location_id, stage, data = future.result()
+            responses.setdefault(location_id, {})[stage] = data
+
+        fetched = {}
+        for location_id in stale:
+            details = responses[location_id].get("details")
+            photos = responses[location_id].get("photos")
+            if details is None:
+                self.failed += 1
+                continue
+            columns[location_id] = details_columns(details, photos)
+            self.fetched += 1
+            # Cache only complete results so a failed photos call is retried next run
+            if photos is not None:
+                fetched[location_id] = columns[location_id]
+        self.cache.store(fetched)
+
+        now = datetime.now().isoformat()
+        for location_id, values in columns.items():
+            for listing in by_id[location_id]:
+                listing.update(values)
+                listing["last_verified_at"] = now
+
+        self.wall += time.perf_counter() - started
+        return listings
+
+    def summary(self) -> List[str]:
+        per_listing = self.requests / self.listings if self.listings else 0.0
+        return [
+            f"{self.listings} listings: {self.fetched} fetched, {self.cached} from cache "
+            f"(TTL {self.ttl_seconds / 86400:g} days), {self.failed} failed",
+            f"{self.requests} requests, {per_listing:.2f} calls per listing, {self.wall:.1f}s in the details stage",
+        ] + [self.timer.describe(stage) for stage in STAGES]
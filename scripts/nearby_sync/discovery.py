@@ -0,0 +1,303 @@
+"""
+discovery.py
+
+Listing discovery from TripAdvisor category pages.
+
+Guessing search URLs per city and category costs up to four credits and
+returns whatever the search page shows. Every city has a geo id, though
+(g298460 for Cebu City), and its Attractions / Hotels / Restaurants pages
+list 30 places each, with pagination offsets (-oa30-, -oa60-, ...) to the rest:
+
+- GeoIdCache: city -> (geo id, URL slug), resolved once from a search page
+  and kept permanently in SQLite; cities that could not be resolved are
+  remembered too, so they are not searched again every run
+- CategoryCrawler: walks a city's category pages through a deduplicated
+  URL frontier, seeded with the first page and fed with the pagination links
+  found on each page (plus the next offset while pages come back full), and
+  collects every listing link once per location id
+
+Pages are fetched through a fetch_html(url) -> Optional[str] callable (the
+calling script's ScrapingBee fetch), so every page fetched is one credit.
+
+A results page links each place several times (title, photo, review
+snippets), sometimes as review-page variants (#REVIEWS, -Reviews-or10-).
+canonical_listing_url() reduces every variant to one URL per location id,
+and ListingSeenSet keeps the ids already queued for a detail fetch across
+the whole run (all cities and categories), so each place is fetched once.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bs4 import BeautifulSoup
+
+from nearby_sync.matching import URL_CATEGORY_PREFIXES, normalize_name
+from nearby_sync.streaming import SeenIds
+
+TRIPADVISOR_BASE = "https://www.tripadvisor.com.ph"
+DEFAULT_GEO_CACHE_PATH = os.getenv("TRIPADVISOR_GEO_CACHE") or "tripadvisor_geo_ids.sqlite3"
+
+PAGE_SIZE = 30
+DEFAULT_MAX_PAGES = 10          # per city and category
+
+TOURISM_RE = re.compile(r"/Tourism-g(\d+)-([A-Za-z0-9_]+)-Vacations\.html")
+LISTING_RE = re.compile(r"/(Attraction_Review|AttractionProductReview|Hotel_Review|Restaurant_Review)-g\d+-d(\d+)-")
+LISTING_URL_RE = re.compile(r"^(?:https?://[^/]+)?/([A-Za-z_]+)-g(\d+)-d(\d+)-(.+)$")
+REVIEW_PAGE_RE = re.compile(r"^Reviews-or\d+-")
+OFFSET_RE = re.compile(r"-oa(\d+)-")
+RANK_PREFIX_RE = re.compile(r"^\d+\.\s*")
+REVIEW_COUNT_RE = re.compile(r"^[\d,]+\s+reviews?$", re.IGNORECASE)
+
+# Category page URL for a geo id, slug and offset (offset 0 has no -oa part)
+CATEGORY_PAGES = {
+    "Attractions": "/Attractions-g{geo}-Activities-{oa}{slug}.html",
+    "Hotels": "/Hotels-g{geo}-{oa}{slug}-Hotels.html",
+    "Restaurants": "/Restaurants-g{geo}-{oa}{slug}.html",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geo_ids (
+    city TEXT PRIMARY KEY,
+    geo_id TEXT,
+    slug TEXT,
+    resolved_at REAL NOT NULL
+);
+"""
+
+
+class GeoId(NamedTuple):
+    geo_id: str
+    slug: str       # e.g. Cebu_City_Cebu_Island_Visayas
+
+
+def category_url(geo: GeoId, category: str, offset: int = 0) -> str:
+    oa = f"oa{offset}-" if offset else ""
+    return TRIPADVISOR_BASE + CATEGORY_PAGES[category].format(geo=geo.geo_id, slug=geo.slug, oa=oa)
+
+
+def absolute_url(href: str) -> str:
+    href = href.split("#", 1)[0]
+    return href if href.startswith("http") else f"{TRIPADVISOR_BASE}{href}"
+
+
+def canonical_listing_url(href: str) -> Optional[Tuple[str, str]]:
+    """(location id, canonical URL) of a listing link, None if href is not one
+
+    Fragments, query strings and review page offsets are dropped and the host
+    is always TRIPADVISOR_BASE, so every link to a place gives the same URL.
+    """
+    match = LISTING_URL_RE.match(href.split("#", 1)[0].split("?", 1)[0])
+    if not match:
+        return None
+    kind, geo_id, location_id, rest = match.groups()
+    rest = REVIEW_PAGE_RE.sub("Reviews-", rest)
+    return location_id, f"{TRIPADVISOR_BASE}/{kind}-g{geo_id}-d{location_id}-{rest}"
+
+
+def listing_links(anchors, city: str, category: str, city_key: str = "location") -> List[Dict]:
+    """One entry per location id from result anchors, named by the first title-like anchor text
+
+    "links" counts the anchors that pointed at the place; each used to be a
+    detail fetch of its own.
+    """
+    by_id: Dict[str, Dict] = {}
+    for link in anchors:
+        canonical = canonical_listing_url(link.get("href", ""))
+        if canonical is None:
+            continue
+        location_id, url = canonical
+        name = RANK_PREFIX_RE.sub("", link.get_text(" ", strip=True))
+        entry = by_id.setdefault(location_id, {
+            "url": url,
+            "name": "",
+            city_key: city,
+            "category": category,
+            "location_id": location_id,
+            "listing_type": URL_CATEGORY_PREFIXES.get(url[len(TRIPADVISOR_BASE) + 1:].split("-", 1)[0]),
+            "links": 0,
+        })
+        entry["links"] += 1
+        # Image and review anchors link the same place; the title comes first
+        if not entry["name"] and 2 < len(name) < 120 and not REVIEW_COUNT_RE.match(name):
+            entry["name"] = name
+    return [entry for entry in by_id.values() if len(entry["name"]) > 2]
+
+
+class ListingSeenSet:
+    """Location ids queued for a detail fetch during this run, across every city and category"""
+
+    def __init__(self):
+        self.ids = SeenIds()
+        self.links = 0
+        self.repeated_links = 0     # extra anchors to a place on the same page
+        self.seen_before = 0        # places already queued from another page, city or category
+
+    def admit(self, listings: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """The listings not queued yet (at most limit of them); the rest are counted as saved fetches"""
+        admitted = []
+        for listing in listings:
+            links = listing.get("links", 1)
+            self.links += links
+            self.repeated_links += links - 1
+            if limit is not None and len(admitted) >= limit:
+                continue
+            if self.ids.add(listing["location_id"]):
+                admitted.append(listing)
+            else:
+                self.seen_before += 1
+        return admitted
+
+    @property
+    def credits_saved(self) -> int:
+        return self.repeated_links + self.seen_before
+
+    def summary(self) -> str:
+        return (f"{self.links} listing links -> {len(self.ids)} unique places; "
+                f"{self.credits_saved} detail fetches saved ({self.repeated_links} repeated links on a page, "
+                f"{self.seen_before} places seen earlier in the run)")
+
+
+def geo_from_search(html: str, city: str) -> Optional[GeoId]:
+    """The Tourism-g… link of a search page whose place name starts with the city"""
+    wanted = normalize_name(city)
+    if not wanted:
+        return None
+    for match in TOURISM_RE.finditer(html):
+        geo_id, slug = match.groups()
+        if normalize_name(slug.replace("_", " ")).startswith(wanted):
+            return GeoId(geo_id, slug)
+    return None
+
+
+class GeoIdCache:
+    """Permanent SQLite map of city -> TripAdvisor geo id (None = searched, not found)"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_GEO_CACHE_PATH):
+        self.conn = sqlite3.connect(path or ":memory:")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, city: str) -> Tuple[bool, Optional[GeoId]]:
+        """(known, geo id) for city; known is False if it was never resolved"""
+        row = self.conn.execute("SELECT geo_id, slug FROM geo_ids WHERE city = ?", (city,)).fetchone()
+        if row is None:
+            return False, None
+        return True, GeoId(*row) if row[0] else None
+
+    def store(self, city: str, geo: Optional[GeoId]):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geo_ids (city, geo_id, slug, resolved_at) VALUES (?, ?, ?, ?)",
+                (city, geo.geo_id if geo else None, geo.slug if geo else None, time.time()),
+            )
+
+    def forget_misses(self) -> int:
+        with self.conn:
+            return self.conn.execute("DELETE FROM geo_ids WHERE geo_id IS NULL").rowcount
+
+
+def listings_from_page(html: str, city: str, category: str) -> List[Dict]:
+    """Listing links on a category page, one per location id"""
+    soup = BeautifulSoup(html, "html.parser")
+    return listing_links(soup.find_all("a", href=LISTING_RE), city, category)
+
+
+class CategoryCrawler:
+    """Paginated category-page discovery over a deduplicated URL frontier"""
+
+    def __init__(self, fetch_html: Callable[[str], Optional[str]], geo_cache: GeoIdCache,
+                 max_pages: int = DEFAULT_MAX_PAGES):
+        self.fetch_html = fetch_html
+        self.geo_cache = geo_cache
+        self.max_pages = max_pages
+        self.visited: Set[str] = set()
+
+        self.geo_lookups = 0
+        self.geo_cached = 0
+        self.geo_missing = 0
+        self.pages = 0
+        self.empty_pages = 0
+        self.listings = 0
+
+    def resolve(self, city: str) -> Optional[GeoId]:
+        known, geo = self.geo_cache.lookup(city)
+        if known:
+            self.geo_cached += 1
+            return geo
+        self.geo_lookups += 1
+        query = f"{city} Philippines".replace(" ", "%20")
+        html = self.fetch_html(f"{TRIPADVISOR_BASE}/Search?q={query}")
+        if html is None:
+            return None     # fetch failed, try again next run
+        geo = geo_from_search(html, city)
+        self.geo_cache.store(city, geo)
+        if geo is None:
+            self.geo_missing += 1
+        return geo
+
+    def _next_pages(self, html: str, geo: GeoId, category: str, offset: int, found: int) -> List[str]:
+        prefix = f"{TRIPADVISOR_BASE}/{category}-g{geo.geo_id}-"
+        urls = []
+        for href in re.findall(r'href="([^"]+-oa\d+-[^"]+)"', html):
+            url = absolute_url(href)
+            if url.startswith(prefix):
+                urls.append(url)
+        # Pagination links are often rendered by script; a full page means there is probably another
+        if found >= PAGE_SIZE:
+            urls.append(category_url(geo, category, offset + PAGE_SIZE))
+        return urls
+
+    def crawl(self, city: str, category: str) -> Optional[List[Dict]]:
+        """Every listing on a city's category pages; None if the city has no geo id"""
+        geo = self.resolve(city)
+        if geo is None:
+            return None
+
+        frontier = deque([category_url(geo, category)])
+        by_id: Dict[str, Dict] = {}
+        pages = 0
+        while frontier and pages < self.max_pages:
+            url = frontier.popleft()
+            if url in self.visited:
+                continue
+            self.visited.add(url)
+
+            html = self.fetch_html(url)
+            pages += 1
+            self.pages += 1
+            if not html:
+                self.empty_pages += 1
+                continue
+
+            found = listings_from_page(html, city, category)
+            new = [entry for entry in found if entry["location_id"] not in by_id]
+            for entry in new:
+                by_id[entry["location_id"]] = entry
+            if not new:
+                self.empty_pages += 1
+                continue
+
+            match = OFFSET_RE.search(url)
+            offset = int(match.group(1)) if match else 0
+            frontier.extend(u for u in self._next_pages(html, geo, category, offset, len(found))
+                            if u not in self.visited)
+
+        self.listings += len(by_id)
+        return list(by_id.values())
+
+    def summary(self) -> List[str]:
+        credits = self.pages + self.geo_lookups
+        per_credit = self.listings / credits if credits else 0.0
+        return [
+            f"geo ids: {self.geo_cached} from cache, {self.geo_lookups} looked up "
+            f"({self.geo_missing} not found)",
+            f"category pages: {self.pages} fetched ({self.empty_pages} empty or failed), "
+            f"{self.listings} listings, {per_credit:.1f} listings per credit",
+        ]
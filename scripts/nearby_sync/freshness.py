@@ -0,0 +1,117 @@
+"""
+freshness.py
+
+Per-field freshness policies for scraped nearby_listings data.
+
+Ratings and review counts move weekly; addresses, phones and hours almost
+never do. Each scraped field (collector names as in
+sync-tripadvisor-real-data.py) gets a maximum age, and every row keeps a
+field_refreshed_at JSON object ({field: ISO time of the last fetch}, see
+supabase/migrations/0211_nearby_listings_field_freshness.sql).
+
+The scheduler asks for a row's due fields only and picks the cheapest fetch
+that covers them:
+
+- "fresh": nothing is due, no request at all
+- "snippet": only rating/review_count are due and the listing URL is not
+  known yet; both are read from the search result card that has to be
+  fetched anyway, so the detail page is skipped
+- "detail": the detail page, collecting only the due fields (reached
+  directly when the row already stores its listing URL)
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+
+FRESHNESS_DAYS = {
+    "rating": 7,
+    "review_count": 7,
+    "photos": 90,
+    "hours_of_operation": 60,
+    "price_range": 120,
+    "amenities": 180,
+    "description": 180,
+    "location_type": 365,
+    "name": 365,
+    "address": 365,
+    "phone_number": 365,
+    "website": 365,
+}
+
+SNIPPET_FIELDS = frozenset({"rating", "review_count"})
+REFRESHED_COLUMN = "field_refreshed_at"
+
+RATING_RE = re.compile(r"(\d(?:\.\d)?) of 5 bubbles", re.IGNORECASE)
+REVIEWS_RE = re.compile(r"([\d,]+)\s+reviews?", re.IGNORECASE)
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def refreshed_at(row: Dict) -> Dict[str, Optional[datetime]]:
+    """When each field was last fetched; rows from before per-field tracking fall back to last_verified_at"""
+    record = row.get(REFRESHED_COLUMN) or {}
+    baseline = _parse_time(row.get("last_verified_at")) if row.get("fetch_status") == "success" else None
+    return {field: _parse_time(record.get(field)) or baseline for field in FRESHNESS_DAYS}
+
+
+def due_fields(row: Dict, now: Optional[datetime] = None,
+               fields: Optional[Iterable[str]] = None) -> Set[str]:
+    """Fields (of fields, default all) whose last fetch is older than their policy allows"""
+    now = now or datetime.now()
+    last = refreshed_at(row)
+    due = set()
+    for field in fields or FRESHNESS_DAYS:
+        fetched = last.get(field)
+        if fetched is None or now - fetched >= timedelta(days=FRESHNESS_DAYS.get(field, 0)):
+            due.add(field)
+    return due
+
+
+def choose_fetch(due: Set[str], has_listing_url: bool) -> str:
+    """"fresh", "snippet" or "detail" (see module docstring)"""
+    if not due:
+        return "fresh"
+    if due <= SNIPPET_FIELDS and not has_listing_url:
+        return "snippet"
+    return "detail"
+
+
+def mark_refreshed(row: Dict, fields: Iterable[str], now: Optional[datetime] = None) -> Dict:
+    """Updated field_refreshed_at value after fetching fields for row"""
+    stamp = (now or datetime.now()).isoformat()
+    record = dict(row.get(REFRESHED_COLUMN) or {})
+    record.update({field: stamp for field in fields})
+    return record
+
+
+def snippet_fields(card_text: str) -> Dict:
+    """rating / review_count from the text of a search result card (missing keys if absent)"""
+    values = {}
+    match = RATING_RE.search(card_text or "")
+    if match:
+        values["rating"] = float(match.group(1))
+    match = REVIEWS_RE.search(card_text or "")
+    if match:
+        values["review_count"] = int(match.group(1).replace(",", ""))
+    return values
+
+
+def result_card_text(anchor, max_depth: int = 6) -> str:
+    """Text of the smallest ancestor of a result anchor that holds its rating or review count"""
+    node = anchor
+    for _ in range(max_depth):
+        node = getattr(node, "parent", None)
+        if node is None:
+            break
+        text = node.get_text(" ", strip=True)
+        if RATING_RE.search(text) or REVIEWS_RE.search(text):
+            return text
+    return ""
@@ -0,0 +1,180 @@
+"""
+gazetteer.py
+
+The Philippine cities and municipalities the sync scripts work through, with
+province, region, coordinates and TripAdvisor geo id, as NumPy columns.
+
+The city list used to be pasted into every script (PHILIPPINES_CITIES,
+PH_CITIES, CITIES), the region map into two of them, and coordinates existed
+for ten cities only, so every other listing was placed at the country
+centroid. data/ph_gazetteer.csv is now the one copy:
+
+- name, aliases ("|"-separated), province, region, is_area, lat, lng, geo_id
+- is_area marks provinces and islands in the list (Palawan, Bohol, ...):
+  they are crawled like cities but never returned by reverse geocoding
+- geo_id is TripAdvisor's g-number where known (0 = unknown; the discovery
+  geo id cache resolves the rest together with the URL slug)
+
+Gazetteer keeps the rows in file order (the crawl order the scripts always
+used), provinces and regions as small integer codes into tuples of the
+distinct values, and coordinates as float64 arrays. Names and aliases are
+interned into one dict of folded keys (accents, case, hyphens and a
+trailing " City" ignored), so lookups are a single dict probe.
+nearest() reverse geocodes whole coordinate arrays at once.
+"""
+
+import csv
+import os
+import sys
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from nearby_sync.geo import PH_CENTROID, haversine_m, valid_coords
+from nearby_sync.matching import strip_accents
+
+DEFAULT_PATH = os.getenv("PH_GAZETTEER") or os.path.join(os.path.dirname(__file__), "data", "ph_gazetteer.csv")
+DEFAULT_REGION = "Philippines"
+DEFAULT_MAX_KM = 60.0           # farther than this from every place = no city
+NEAREST_CHUNK = 16384           # coordinates per distance matrix in nearest()
+
+
+def name_key(name: str) -> str:
+    """Folded lookup key: Parañaque City -> paranaque, Lapu-Lapu -> lapu lapu"""
+    key = " ".join(strip_accents(name).replace("-", " ").split()).casefold()
+    if key.endswith(" city") and key != "city":
+        key = key[:-5]
+    return sys.intern(key)
+
+
+def _codes(values: List[str]) -> Tuple[np.ndarray, Tuple[str, ...]]:
+    labels = tuple(dict.fromkeys(values))
+    index = {label: i for i, label in enumerate(labels)}
+    return np.array([index[v] for v in values], dtype=np.int16), labels
+
+
+def _coord(value) -> float:
+    """API coordinates come as numbers or strings; anything else is NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class Gazetteer:
+    """Column store of places with O(1) name lookup and vectorized reverse geocoding"""
+
+    def __init__(self, rows: List[Dict[str, str]]):
+        self.names = tuple(sys.intern(row["name"]) for row in rows)
+        self.aliases = tuple(tuple(a for a in (row.get("aliases") or "").split("|") if a) for row in rows)
+        self.province_codes, self.provinces = _codes([row.get("province") or "" for row in rows])
+        self.region_codes, self.regions = _codes([row.get("region") or DEFAULT_REGION for row in rows])
+        self.is_area = np.array([row.get("is_area") == "1" for row in rows], dtype=bool)
+        self.lat = np.array([float(row["lat"]) for row in rows], dtype=np.float64)
+        self.lng = np.array([float(row["lng"]) for row in rows], dtype=np.float64)
+        self.geo_ids = np.array([int(row.get("geo_id") or 0) for row in rows], dtype=np.int64)
+
+        # Canonical names win over aliases, earlier rows over later ones
+        self._index: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            self._index.setdefault(name, i)
+            self._index.setdefault(name_key(name), i)
+        for i, aliases in enumerate(self.aliases):
+            for alias in aliases:
+                self._index.setdefault(name_key(alias), i)
+
+        places = np.flatnonzero(~self.is_area)
+        self._places = places
+        self._place_lat = self.lat[places]
+        self._place_lng = self.lng[places]
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> "Gazetteer":
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(list(csv.DictReader(f)))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index(self, name: Optional[str]) -> Optional[int]:
+        """Row of a name or alias, None if unknown"""
+        if not name:
+            return None
+        found = self._index.get(name)
+        return found if found is not None else self._index.get(name_key(name))
+
+    def __contains__(self, name: str) -> bool:
+        return self.index(name) is not None
+
+    def region(self, name: Optional[str], default: str = DEFAULT_REGION) -> str:
+        i = self.index(name)
+        return self.regions[self.region_codes[i]] if i is not None else default
+
+    def province(self, name: Optional[str]) -> Optional[str]:
+        i = self.index(name)
+        return (self.provinces[self.province_codes[i]] or None) if i is not None else None
+
+    def coords(self, name: Optional[str], default: Tuple[float, float] = PH_CENTROID) -> Tuple[float, float]:
+        i = self.index(name)
+        return (float(self.lat[i]), float(self.lng[i])) if i is not None else default
+
+    def geo_id(self, name: Optional[str]) -> Optional[str]:
+        i = self.index(name)
+        return str(self.geo_ids[i]) if i is not None and self.geo_ids[i] else None
+
+    def nearest(self, lat, lng, max_km: Optional[float] = DEFAULT_MAX_KM) -> Tuple[np.ndarray, np.ndarray]:
+        """(row, meters) of the nearest city or municipality for each coordinate
+
+        Rows are -1 for invalid coordinates and, with max_km, for points
+        farther than that from every place. Candidates are ranked by
+        equirectangular distance in chunks, the winner's distance is haversine.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        rows = np.full(lat.shape, -1, dtype=np.int64)
+        meters = np.full(lat.shape, np.inf)
+        ok = np.flatnonzero(valid_coords(lat, lng))
+
+        for start in range(0, len(ok), NEAREST_CHUNK):
+            chunk = ok[start:start + NEAREST_CHUNK]
+            plat, plng = lat[chunk, None], lng[chunk, None]
+            dx = (plng - self._place_lng) * np.cos(np.radians(plat))
+            dy = plat - self._place_lat
+            best = np.argmin(dx * dx + dy * dy, axis=1)
+            rows[chunk] = self._places[best]
+            meters[chunk] = haversine_m(lat[chunk], lng[chunk], self._place_lat[best], self._place_lng[best])
+
+        if max_km is not None:
+            rows[meters > max_km * 1000.0] = -1
+        return rows, meters
+
+    def reverse_geocode(self, lat, lng, max_km: Optional[float] = DEFAULT_MAX_KM) -> List[Optional[str]]:
+        """Nearest city or municipality name per coordinate (None where nearest() gives -1)"""
+        rows, _ = self.nearest(lat, lng, max_km)
+        return [self.names[i] if i >= 0 else None for i in rows]
+
+    def fill_cities(self, listings: List[Dict], max_km: Optional[float] = DEFAULT_MAX_KM) -> int:
+        """Set "city" on listings that have coordinates but no city; returns how many were filled"""
+        todo = [listing for listing in listings if not listing.get("city")]
+        if not todo:
+            return 0
+        lat = np.array([_coord(listing.get("latitude")) for listing in todo], dtype=np.float64)
+        lng = np.array([_coord(listing.get("longitude")) for listing in todo], dtype=np.float64)
+        filled = 0
+        for listing, city in zip(todo, self.reverse_geocode(lat, lng, max_km)):
+            if city:
+                listing["city"] = city
+                filled += 1
+        return filled
+
+
+@lru_cache(maxsize=None)
+def gazetteer(path: str = DEFAULT_PATH) -> Gazetteer:
+    """The shared Gazetteer, loaded once per process"""
+    return Gazetteer.load(path)
+
+
+def city_names() -> List[str]:
+    """Every place the city-by-city scripts crawl, in crawl order"""
+    return list(gazetteer().names)
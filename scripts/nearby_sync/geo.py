@@ -0,0 +1,97 @@
+"""
+geo.py
+
+Vectorized geographic helpers shared by the nearby_listings jobs:
+haversine distances and geohash cells over NumPy coordinate arrays.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Country centroid the scrapers fall back to when a city has no coordinates
+PH_CENTROID = (12.8797, 121.7740)
+
+GEOHASH_ALPHABET = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Great-circle distance in meters; arguments broadcast like NumPy arrays"""
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def valid_coords(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """Mask of coordinates that are present and inside lat/lng bounds"""
+    return np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90) & (np.abs(lng) <= 180)
+
+
+def precise_coords(lat: np.ndarray, lng: np.ndarray, tolerance: float = 0.02) -> np.ndarray:
+    """Mask of valid coordinates that are not the country-centroid fallback (± jitter)"""
+    near_centroid = (np.abs(lat - PH_CENTROID[0]) < tolerance) & (np.abs(lng - PH_CENTROID[1]) < tolerance)
+    return valid_coords(lat, lng) & ~near_centroid
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(lat_degrees, lng_degrees) spanned by one geohash cell"""
+    bits = 5 * precision
+    lat_bits = bits // 2
+    lng_bits = bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def geohash_encode(lat: np.ndarray, lng: np.ndarray, precision: int = 6) -> np.ndarray:
+    """Geohash strings for arrays of coordinates (invalid coordinates give "")"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    ok = valid_coords(lat, lng)
+
+    bits = 5 * precision
+    lat_bits = bits // 2
+    lng_bits = bits - lat_bits
+
+    lat_q = np.zeros(lat.shape, dtype=np.int64)
+    lng_q = np.zeros(lng.shape, dtype=np.int64)
+    lat_q[ok] = np.minimum(((lat[ok] + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), (1 << lat_bits) - 1)
+    lng_q[ok] = np.minimum(((lng[ok] + 180.0) / 360.0 * (1 << lng_bits)).astype(np.int64), (1 << lng_bits) - 1)
+
+    # Interleave bits, longitude first, most significant bit first
+    code = np.zeros(lat.shape, dtype=np.int64)
+    lat_i, lng_i = lat_bits - 1, lng_bits - 1
+    for bit in range(bits):
+        if bit % 2 == 0:
+            code = (code << 1) | ((lng_q >> lng_i) & 1)
+            lng_i -= 1
+        else:
+            code = (code << 1) | ((lat_q >> lat_i) & 1)
+            lat_i -= 1
+
+    chars = np.empty(lat.shape + (precision,), dtype="<U1")
+    for i in range(precision):
+        chars[..., precision - 1 - i] = GEOHASH_ALPHABET[(code >> (5 * i)) & 31]
+
+    # Reinterpret each row of single characters as one fixed-width string
+    hashes = np.ascontiguousarray(chars).view(f"<U{precision}").reshape(lat.shape).astype(object)
+    hashes[~ok] = ""
+    return hashes
+
+
+def geohash_with_neighbors(lat: np.ndarray, lng: np.ndarray, precision: int = 6) -> np.ndarray:
+    """(n, 9) geohashes of each point's cell and its 8 neighbours"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    dlat, dlng = geohash_cell_size(precision)
+
+    cells = []
+    for oy in (-1, 0, 1):
+        for ox in (-1, 0, 1):
+            shifted_lat = np.clip(lat + oy * dlat, -90.0, 90.0)
+            shifted_lng = ((lng + ox * dlng + 180.0) % 360.0) - 180.0
+            cells.append(geohash_encode(shifted_lat, shifted_lng, precision))
+    return np.stack(cells, axis=-1)
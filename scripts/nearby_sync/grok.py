@@ -0,0 +1,280 @@
+"""
+grok.py
+
+Grok enrichment of listing fields the TripAdvisor API leaves empty.
+
+The single-item path sends one chat completion per listing. The batched
+path puts up to batch_size listings into one prompt and asks for a JSON
+array keyed by tripadvisor_id, so a 30-result query costs a few requests
+instead of 30 and the shared instructions are paid for once. Listings whose
+entry is missing or malformed in a batch answer (or the whole batch, if the
+answer does not parse) fall back to single-item requests.
+
+Enrichment only fills empty fields; values from the API are never replaced.
+
+With an LLMCache, answers are stored per listing under the single-item
+prompt (also for listings answered in a batch), so a listing asked about on
+an earlier run is filled from the cache whichever path runs now. Bump
+PROMPT_VERSION whenever a prompt template or ENRICH_FIELDS change.
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from nearby_sync.details import StageTimer
+from nearby_sync.llm_cache import LLMCache
+
+GROK_ENDPOINT = "https://api.x.ai/v1/chat/completions"
+GROK_MODEL = "grok-2"
+
+ENRICH_FIELDS = ("hours_of_operation", "amenities", "best_for", "price_level")
+PROMPT_VERSION = "1"
+DEFAULT_BATCH_SIZE = 10
+TIMEOUT = 30
+BATCH_TIMEOUT = 90
+
+# USD per million tokens, used for the run's cost estimate
+PRICE_PER_M_PROMPT = 2.0
+PRICE_PER_M_COMPLETION = 10.0
+COMPLETION_TOKENS_PER_LISTING = 120     # budget estimate before the real usage is known
+
+
+def needs_enrichment(listing: Dict) -> bool:
+    """Only successfully fetched listings missing hours or amenities are worth a call"""
+    if listing.get("fetch_status") != "success":
+        return False
+    return not listing.get("hours_of_operation") or not listing.get("amenities")
+
+
+def single_prompt(listing: Dict) -> str:
+    return f"""Based on this listing info, provide missing travel data as JSON only:
+Name: {listing.get('name')}
+City: {listing.get('city')}
+Category: {listing.get('category')}
+Type: {listing.get('location_type')}
+
+Return JSON with: hours_of_operation, amenities, best_for, price_level (1-4 or null).
+If unknown, return null for that field.
+"""
+
+
+def batch_prompt(listings: List[Dict]) -> str:
+    items = [
+        {
+            "tripadvisor_id": str(l.get("tripadvisor_id")),
+            "name": l.get("name"),
+            "city": l.get("city"),
+            "category": l.get("category"),
+            "type": l.get("location_type"),
+        }
+        for l in listings
+    ]
+    return f"""For each listing below, provide missing travel data.
+Listings:
+{json.dumps(items, ensure_ascii=False)}
+
+Return ONLY a JSON array with one object per listing, in any order:
+[{{"tripadvisor_id": "...", "hours_of_operation": ..., "amenities": [...], "best_for": [...], "price_level": 1-4 or null}}]
+Copy tripadvisor_id exactly. If a field is unknown, return null for that field.
+"""
+
+
+def extract_json(content: str, pattern: str = r"(\{.*\})"):
+    """First JSON object (or array, with pattern r"(\\[.*\\])") in a chat answer; None if it does not parse"""
+    match = re.search(pattern, content or "", flags=re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def merge_enrichment(listing: Dict, enrichment: Dict) -> Dict:
+    """Copy enriched fields into listing where the listing has nothing"""
+    for field in ENRICH_FIELDS:
+        if enrichment.get(field) and not listing.get(field):
+            listing[field] = enrichment[field]
+    return listing
+
+
+class PathStats:
+    """Requests, tokens and wall time spent on one enrichment path"""
+
+    def __init__(self):
+        self.listings = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    def add_usage(self, usage: Dict, seconds: float):
+        self.requests += 1
+        self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+        self.completion_tokens += int(usage.get("completion_tokens") or 0)
+        self.seconds += seconds
+
+    @property
+    def cost(self) -> float:
+        return (self.prompt_tokens * PRICE_PER_M_PROMPT + self.completion_tokens * PRICE_PER_M_COMPLETION) / 1e6
+
+    def describe(self, name: str) -> str:
+        if not self.listings:
+            return f"{name}: no listings"
+        tokens = self.prompt_tokens + self.completion_tokens
+        return (f"{name}: {self.listings} listings in {self.requests} requests, "
+                f"{tokens / self.listings:.0f} tokens/listing "
+                f"({self.prompt_tokens} prompt + {self.completion_tokens} completion), "
+                f"{self.seconds / self.listings:.2f}s/listing, ${self.cost:.4f}")
+
+
+class GrokEnricher:
+    """Fill missing listing fields with Grok, one listing or batch_size listings per request
+
+    Safe to call from several threads; with a budget (see grok_pool.MinuteBudget)
+    every request first waits for its share of the requests/tokens per minute.
+    """
+
+    def __init__(self, api_key: str, model: str = GROK_MODEL, batch_size: int = DEFAULT_BATCH_SIZE,
+                 cache: Optional[LLMCache] = None):
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self.budget = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.timer = StageTimer()
+        self.stats = {"batch": PathStats(), "single": PathStats()}
+        self.fallbacks = 0
+        self.errors = 0
+        self.cached = 0
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def _count(self, path: Optional[str] = None, listings: int = 0, **counters):
+        with self.lock:
+            if path:
+                self.stats[path].listings += listings
+            for name, n in counters.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def _complete(self, prompt: str, path: str, timeout: float, listings: int = 1) -> str:
+        """One chat completion; returns the answer text (raises on HTTP errors)"""
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.0
+        }
+        estimate = len(prompt) // 4 + COMPLETION_TOKENS_PER_LISTING * listings
+        if self.budget:
+            self.budget.acquire(estimate)
+
+        started = time.perf_counter()
+        response = self._session().post(GROK_ENDPOINT, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        elapsed = time.perf_counter() - started
+        usage = data.get("usage") or {}
+        self.timer.record(path, elapsed)
+        with self.lock:
+            self.stats[path].add_usage(usage, elapsed)
+        if self.budget:
+            self.budget.settle(estimate, int(usage.get("total_tokens") or estimate))
+        return data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+    def enrich_one(self, listing: Dict, force: bool = False) -> Dict:
+        if not force and not needs_enrichment(listing):
+            return listing
+        self._count("single", 1)
+        try:
+            enrichment = extract_json(self._complete(single_prompt(listing), "single", TIMEOUT))
+            if isinstance(enrichment, dict):
+                merge_enrichment(listing, enrichment)
+                self._remember(listing, enrichment)
+        except Exception as e:
+            self._count(errors=1)
+            print(f"  ⚠️  Grok enrichment error for {listing.get('name')}: {e}", file=sys.stderr)
+        return listing
+
+    def _enrich_chunk(self, chunk: List[Dict]) -> List[Dict]:
+        """One batched request; returns the listings it did not answer properly"""
+        self._count("batch", len(chunk))
+        try:
+            answer = extract_json(self._complete(batch_prompt(chunk), "batch", BATCH_TIMEOUT, len(chunk)), r"(\[.*\])")
+        except Exception as e:
+            self._count(errors=1)
+            print(f"  ⚠️  Grok batch of {len(chunk)} failed ({e}), retrying one by one", file=sys.stderr)
+            return chunk
+
+        by_id: Dict[str, Dict] = {}
+        for entry in answer if isinstance(answer, list) else []:
+            if isinstance(entry, dict) and entry.get("tripadvisor_id") is not None:
+                by_id[str(entry["tripadvisor_id"])] = entry
+
+        missing = []
+        for listing in chunk:
+            entry = by_id.get(str(listing.get("tripadvisor_id")))
+            if entry is None:
+                missing.append(listing)
+            else:
+                merge_enrichment(listing, entry)
+                self._remember(listing, entry)
+        return missing
+
+    def _remember(self, listing: Dict, enrichment: Dict):
+        if self.cache is not None:
+            self.cache.put(self.model, single_prompt(listing), {f: enrichment.get(f) for f in ENRICH_FIELDS})
+
+    def _from_cache(self, listing: Dict) -> bool:
+        if self.cache is None:
+            return False
+        enrichment = self.cache.get(self.model, single_prompt(listing))
+        if enrichment is None:
+            return False
+        merge_enrichment(listing, enrichment)
+        self._count(cached=1)
+        return True
+
+    def enrich(self, listings: List[Dict], force: bool = False) -> List[Dict]:
+        """Enrich listings in place (batched unless batch_size is 1) and return them
+
+        force asks about every listing, not only those needs_enrichment() picks.
+        """
+        pending = [l for l in listings if (force or needs_enrichment(l)) and not self._from_cache(l)]
+        if self.batch_size == 1:
+            for listing in pending:
+                self.enrich_one(listing, force)
+            return listings
+
+        for i in range(0, len(pending), self.batch_size):
+            chunk = pending[i:i + self.batch_size]
+            if len(chunk) == 1:
+                self.enrich_one(chunk[0], force)
+                continue
+            for listing in self._enrich_chunk(chunk):
+                self._count(fallbacks=1)
+                self.enrich_one(listing, force)
+        return listings
+
+    def summary(self) -> List[str]:
+        lines = [self.stats[path].describe(path) for path in ("batch", "single")]
+        if self.cache is not None:
+            lines.append(f"cache: {self.cached} listings filled without a request; {self.cache.summary()}")
+        if self.batch_size > 1:
+            lines.append(f"{self.fallbacks} listings fell back to single requests, {self.errors} request errors")
+        lines += [f"latency {self.timer.describe(path)}" for path in ("batch", "single") if self.stats[path].requests]
+        lines.append(f"estimated cost: ${sum(stats.cost for stats in self.stats.values()):.4f} "
+                     f"(${PRICE_PER_M_PROMPT:g}/${PRICE_PER_M_COMPLETION:g} per 1M prompt/completion tokens)")
+        return lines
@@ -0,0 +1,182 @@
+"""
+grok_pool.py
+
+Background Grok enrichment that overlaps with Partner API fetching.
+
+The sweep hands every new listing to GrokWorkerPool.submit() and keeps
+fetching; worker threads take the highest visibility_score listings first
+(up to the enricher's batch size at a time) and run them through
+GrokEnricher. The sweep collects finished listings with drain() between
+queries and writes them, and close() waits for the rest at the end.
+
+All workers share one MinuteBudget, so the whole pool stays inside the
+account's requests-per-minute and tokens-per-minute limits however many
+workers run. Listings that need no enrichment skip the queue.
+"""
+
+import itertools
+import sys
+import threading
+import time
+from queue import Empty, PriorityQueue, Queue
+from typing import Dict, List, Optional
+
+from nearby_sync.details import StageTimer
+from nearby_sync.grok import GrokEnricher, needs_enrichment
+
+DEFAULT_WORKERS = 4
+DEFAULT_RPM = 60
+DEFAULT_TPM = 100_000
+
+_STOP = float("inf")
+
+
+class MinuteBudget:
+    """Requests and tokens per minute shared by all workers (0 = unlimited)"""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int):
+        """Block until one request and an estimated number of tokens are available"""
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                request_ok = not self.rpm or self.requests >= 1.0
+                tokens_ok = not self.tpm or self.tokens >= tokens
+                if request_ok and tokens_ok:
+                    if self.rpm:
+                        self.requests -= 1.0
+                    if self.tpm:
+                        self.tokens -= tokens
+                    self.waited += now - started
+                    return
+                wait = max(
+                    (1.0 - self.requests) * 60.0 / self.rpm if not request_ok else 0.0,
+                    (tokens - self.tokens) * 60.0 / self.tpm if not tokens_ok else 0.0,
+                )
+            time.sleep(min(max(wait, 0.01), 1.0))
+
+    def settle(self, estimated: int, actual: int):
+        """Charge the difference once the real token usage is known"""
+        if self.tpm:
+            with self.lock:
+                self.tokens -= actual - estimated
+
+
+class GrokWorkerPool:
+    """Priority queue of listings enriched by worker threads under a shared budget"""
+
+    def __init__(self, enricher: GrokEnricher, workers: int = DEFAULT_WORKERS,
+                 budget: Optional[MinuteBudget] = None):
+        self.enricher = enricher
+        self.budget = budget or MinuteBudget()
+        enricher.budget = self.budget
+        self.queue: PriorityQueue = PriorityQueue()
+        self.done: Queue = Queue()
+        self.order = itertools.count()
+        self.timer = StageTimer()
+        self.started = time.perf_counter()
+
+        self.submitted = 0
+        self.skipped = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, listings: List[Dict]):
+        for listing in listings:
+            if not needs_enrichment(listing):
+                self.skipped += 1
+                self.done.put(listing)
+                continue
+            self.submitted += 1
+            score = float(listing.get("visibility_score") or 0.0)
+            self.queue.put((-score, next(self.order), time.perf_counter(), listing))
+
+    def _take_batch(self) -> Optional[List]:
+        """Next (up to batch size) highest-priority items; None once stopped"""
+        first = self.queue.get()
+        if first[0] == _STOP:
+            return None
+        batch = [first]
+        while len(batch) < self.enricher.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item[0] == _STOP:
+                self.queue.put(item)
+                break
+            batch.append(item)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            now = time.perf_counter()
+            for _, _, queued, _ in batch:
+                self.timer.record("queue wait", now - queued)
+
+            listings = [item[3] for item in batch]
+            try:
+                self.enricher.enrich(listings)
+            except Exception as e:
+                print(f"  ⚠️  Grok worker error: {e}", file=sys.stderr)
+            elapsed = time.perf_counter() - now
+            self.timer.record("batch", elapsed)
+            with self.lock:
+                self.busy_seconds += elapsed
+            for listing in listings:
+                self.done.put(listing)
+
+    def drain(self) -> List[Dict]:
+        """Listings finished so far (enriched or skipped)"""
+        finished = []
+        while True:
+            try:
+                finished.append(self.done.get_nowait())
+            except Empty:
+                return finished
+
+    def close(self) -> List[Dict]:
+        """Wait for queued listings, stop the workers and return what is left to write"""
+        for _ in self.threads:
+            self.queue.put((_STOP, next(self.order), 0.0, None))
+        for thread in self.threads:
+            thread.join()
+        return self.drain()
+
+    def summary(self) -> List[str]:
+        wall = time.perf_counter() - self.started
+        return [
+            f"{len(self.threads)} workers, {self.submitted} listings queued by visibility_score, "
+            f"{self.skipped} needed nothing",
+            f"budget: {self.budget.rpm or 'unlimited'} req/min, {self.budget.tpm or 'unlimited'} tokens/min, "
+            f"{self.budget.waited:.1f}s waiting on it",
+            self.timer.describe("queue wait", "listings"),
+            f"worker busy {self.busy_seconds:.1f}s over {wall:.1f}s wall "
+            f"({self.busy_seconds / wall if wall else 0.0:.1f} workers busy on average)",
+        ] + self.enricher.summary()
@@ -0,0 +1,481 @@
+"""
+listing_page.py
+
+Field extraction from TripAdvisor listing pages, from full HTML or from
+ScrapingBee extract_rules JSON.
+
+The sync used to download every listing page in full (often 1 MB+ of HTML)
+and run BeautifulSoup over it, even for a rating refresh. ScrapingBee can
+evaluate CSS extraction rules on its side and return only the matched text
+and attributes as JSON, for one credit like a page fetch:
+
+- parse_listing_html(): the collectors over the full page, as before
+- rules_for(fields): the extract_rules for the collectors asked for; every
+  collector has CSS rules that select what its HTML counterpart reads
+  (the elements it finds, or the elements whose text its regexes search)
+- parse_extracted(): the same collectors over the returned JSON, giving the
+  same columns as parse_listing_html()
+
+CSS cannot express every HTML collector exactly (review counts are searched
+in any text node, hours and prices in the raw markup), so a rules result can
+miss fields the full page has. missing_fields() reports the requested
+FALLBACK_FIELDS that came back empty: fields nearly every listing page has
+and the rules select the same elements for, so an empty one means the
+rules did not match rather than the place having no data. The caller then
+fetches the full page for just those fields, at a second credit. Other
+fields (hours, phone, price range, ...) are often genuinely absent and are
+not worth a second credit.
+
+Review counts are the common miss (the count is often in markup without a
+review class), and a second credit for every such page would cost more
+than the rules save. An empty review count from the rules is left out of
+the result instead (KEEP_STORED_FIELDS), so the stored count stays until an
+html-mode run finds a new one.
+
+extract_listing() runs either mode with the fallback through the calling
+script's fetch(url, extract_rules=None) -> Optional[str], and ExtractStats
+counts payload bytes and local parse time per mode.
+"""
+
+import json
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from bs4 import BeautifulSoup
+
+from nearby_sync.backfill import is_empty
+
+PHONE_PATTERNS = (
+    r'\+63\s?[\d\s-]+',
+    r'tel:\s*[\d\s-]+',
+    r'\(\d{3}\)\s*\d{3}-\d{4}',
+)
+HOURS_RE = re.compile(r'(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)[:\s]+([0-9:\s–\-ampm]+|Closed)',
+                      re.IGNORECASE)
+PRICE_RE = re.compile(r'(₱|€|\$)\s*-?\s*(₱|€|\$)?')
+DESCRIPTION_SELECTORS = ('div.description', 'div.about', 'div[class*="description"]', 'p')
+MAX_PHOTOS = 50
+
+# ScrapingBee extract_rules per collector. A plain string is the text of the
+# first match; "type": "list" returns every match, "output": "@attr" an attribute.
+FIELD_RULES: Dict[str, Dict] = {
+    "name": {"name": "h1"},
+    "rating": {
+        "rating": {"selector": "span[class*='Rating'], span[class*='rating']",
+                   "type": "list"},
+    },
+    "review_count": {
+        "review_texts": {"selector": "a[href*='#REVIEWS'], a[href*='-Reviews-'], "
+                                     "span[class*='review'], span[class*='Review']", "type": "list"},
+    },
+    "address": {
+        "address": "address",
+        "address_alt": "span[class*='address'], div[class*='address'], "
+                       "span[class*='location'], div[class*='location']",
+    },
+    "phone_number": {
+        "phone_links": {"selector": "a[href^='tel:']", "type": "list", "output": "@href"},
+        "phone_texts": {"selector": "[class*='phone'], [class*='Phone']", "type": "list"},
+    },
+    "description": {f"description_{i}": selector for i, selector in enumerate(DESCRIPTION_SELECTORS)},
+    "amenities": {
+        "amenities": {"selector": ", ".join(f"{tag}[class*='{word}']" for tag in ("li", "div")
+                                            for word in ("amenity", "feature", "highlight")),
+                      "type": "list"},
+    },
+    "hours_of_operation": {
+        "hours": {"selector": "[class*='hours'], [class*='Hours']", "type": "list"},
+    },
+    "price_range": {
+        "prices": {"selector": "[class*='price'], [class*='Price']", "type": "list"},
+    },
+    "website": {
+        "links": {"selector": "a[href^='http']", "type": "list", "output": "@href"},
+    },
+    "photos": {
+        # One entry per img in both lists, so src falls back to data-src per image as in the HTML collector
+        "img_src": {"selector": "img", "type": "list", "output": "@src"},
+        "img_data_src": {"selector": "img", "type": "list", "output": "@data-src"},
+        "data_src": {"selector": "[data-src]", "type": "list", "output": "@data-src"},
+        "srcset": {"selector": "picture source[srcset]", "type": "list", "output": "@srcset"},
+    },
+    "location_type": {"name": "h1"},
+}
+
+# Requested fields whose absence from a rules result triggers a full-page fetch
+FALLBACK_FIELDS = frozenset({"name", "rating", "address", "photos"})
+
+# Fields dropped from a rules result when empty, keeping the stored value, rather than fetched again
+KEEP_STORED_FIELDS = frozenset({"review_count"})
+
+# First column of a field; decides whether the field was found
+FIELD_PRIMARY_COLUMN = {"photos": "photo_urls"}
+
+
+def rules_for(fields: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """extract_rules covering the given collectors (None = all)"""
+    rules: Dict[str, Dict] = {}
+    for field in (FIELD_RULES if fields is None else fields):
+        rules.update(FIELD_RULES.get(field, {}))
+    return rules
+
+
+def listing_type(name: Optional[str], url: str) -> str:
+    location_type = "Attraction"
+    if (name and 'restaurant' in name.lower()) or 'restaurant' in url.lower():
+        location_type = "Restaurant"
+    elif (name and 'hotel' in name.lower()) or 'hotel' in url.lower():
+        location_type = "Hotel"
+    elif 'attraction' in url.lower():
+        location_type = "Attraction"
+    return location_type
+
+
+def is_photo_url(src: str) -> bool:
+    return bool(src) and any(word in src for word in ('media', 'photo', 'image', 'static'))
+
+
+def srcset_urls(srcset: str) -> List[str]:
+    urls = []
+    for url_part in srcset.split(','):
+        url_match = re.search(r'(https?://[^\s]+)', url_part.strip())
+        if url_match:
+            urls.append(url_match.group(1).split()[0])
+    return urls
+
+
+def listing_data(url: str, collected: Dict[str, Dict], fields: Optional[Set[str]]) -> Dict:
+    """The row update for a page: identity and status columns plus the requested collectors' columns"""
+    match = re.search(r'-d(\d+)-', url)
+    data = {
+        "tripadvisor_id": match.group(1) if match else None,
+        "web_url": url,
+        "fetch_status": "success",
+        "fetch_error_message": None,
+        "last_verified_at": datetime.now().isoformat(),
+    }
+    for field, values in collected.items():
+        if fields is None or field in fields:
+            data.update(values)
+    return data
+
+
+def photo_columns(photo_urls: List[str]) -> Dict:
+    photo_urls = list(dict.fromkeys(photo_urls))[:MAX_PHOTOS]
+    return {"image_url": photo_urls[0] if photo_urls else None, "photo_urls": photo_urls,
+            "photo_count": len(photo_urls)}
+
+
+def parse_listing_html(html: str, url: str, fields: Optional[Set[str]] = None) -> Dict:
+    """Collect fields from a full listing page; fields limits the collectors (None = all)"""
+    def wants(field: str) -> bool:
+        return fields is None or field in fields
+
+    soup = BeautifulSoup(html, 'html.parser')
+    html_content = html
+
+    # Extract name (usually in h1)
+    name = None
+    if wants("name") or wants("location_type"):
+        h1 = soup.find('h1')
+        if h1:
+            name = h1.get_text(strip=True)
+
+    # Extract rating
+    rating = None
+    if wants("rating"):
+        rating_elem = soup.find('span', class_=re.compile('ratingFilter|Rating|rating'))
+        if rating_elem:
+            rating_text = rating_elem.get_text(strip=True)
+            try:
+                rating_match = re.search(r'[\d.]+', rating_text)
+                if rating_match:
+                    rating = float(rating_match.group())
+            except:
+                pass
+
+    # Extract review count
+    review_count = None
+    if wants("review_count"):
+        review_patterns = [
+            soup.find(text=re.compile(r'\d+\s+review')),
+            soup.find(text=re.compile(r'\d+.*review'))
+        ]
+        for review_elem in review_patterns:
+            if review_elem:
+                try:
+                    review_match = re.search(r'(\d+)', review_elem)
+                    if review_match:
+                        review_count = int(review_match.group(1))
+                        break
+                except:
+                    pass
+
+    # Extract address
+    address = None
+    if wants("address"):
+        address_elem = soup.find('address')
+        if address_elem:
+            address = address_elem.get_text(strip=True)
+        else:
+            # Try alternate selectors
+            for elem in soup.find_all(['span', 'div'], class_=re.compile('address|location')):
+                if elem:
+                    address = elem.get_text(strip=True)
+                    break
+
+    # Extract phone
+    phone = None
+    if wants("phone_number"):
+        for pattern in PHONE_PATTERNS:
+            phone_match = re.search(pattern, html_content)
+            if phone_match:
+                phone = phone_match.group(0).strip()
+                break
+
+    # Extract description
+    description = None
+    if wants("description"):
+        for selector in DESCRIPTION_SELECTORS:
+            desc_elem = soup.select_one(selector)
+            if desc_elem:
+                text = desc_elem.get_text(strip=True)
+                if len(text) > 20:
+                    description = text
+                    break
+
+    # Extract amenities list
+    amenities = []
+    if wants("amenities"):
+        for item in soup.find_all(['li', 'div'], class_=re.compile('amenity|feature|highlight')):
+            amenity_text = item.get_text(strip=True)
+            if amenity_text and 5 < len(amenity_text) < 100:
+                amenities.append(amenity_text)
+
+    # Extract hours
+    hours_of_operation = {}
+    if wants("hours_of_operation"):
+        for day, hours in HOURS_RE.findall(html_content):
+            hours_of_operation[day.capitalize()] = hours.strip()
+
+    # Extract price range
+    price_range = None
+    if wants("price_range"):
+        price_match = PRICE_RE.search(html_content)
+        if price_match:
+            price_range = price_match.group(0).strip()
+
+    # Extract website
+    website = None
+    if wants("website"):
+        for link in soup.find_all('a', href=re.compile(r'^http')):
+            href = link.get('href', '')
+            if href and 'tripadvisor' not in href.lower() and 'javascript' not in href.lower():
+                website = href
+                break
+
+    # Extract ALL photo URLs
+    photo_urls = []
+    if wants("photos"):
+        # Method 1: Extract from img tags
+        for img in soup.find_all('img'):
+            src = img.get('src', '') or img.get('data-src', '')
+            if is_photo_url(src) and src.startswith('http'):
+                photo_urls.append(src)
+
+        # Method 2: Extract from picture/source tags
+        for picture in soup.find_all('picture'):
+            for source in picture.find_all('source'):
+                photo_urls += srcset_urls(source.get('srcset', ''))
+
+        # Method 3: Extract from data attributes
+        for attr_val in re.findall(r'data-src="([^"]*)"', html_content):
+            if attr_val and 'media' in attr_val:
+                photo_urls.append(attr_val)
+
+    return listing_data(url, {
+        "name": {"name": name},
+        "rating": {"rating": rating},
+        "review_count": {"review_count": review_count},
+        "address": {"address": address},
+        "phone_number": {"phone_number": phone},
+        "description": {"description": description},
+        "amenities": {"amenities": amenities},
+        "hours_of_operation": {"hours_of_operation": hours_of_operation},
+        "price_range": {"price_range": price_range},
+        "website": {"website": website},
+        "photos": photo_columns(photo_urls),
+        "location_type": {"location_type": listing_type(name, url)},
+    }, fields)
+
+
+def _texts(extracted: Dict, key: str) -> List[str]:
+    """A rule's result as a list of stripped, non-empty strings (item rules give one string or none)"""
+    value = extracted.get(key)
+    values = value if isinstance(value, list) else [value]
+    return [v.strip() for v in values if isinstance(v, str) and v.strip()]
+
+
+def parse_extracted(extracted: Dict, url: str, fields: Optional[Set[str]] = None) -> Dict:
+    """Collect fields from an extract_rules JSON response, with parse_listing_html()'s columns"""
+    name = next(iter(_texts(extracted, "name")), None)
+
+    rating = None
+    for text in _texts(extracted, "rating")[:1]:
+        rating_match = re.search(r'\d+(?:\.\d+)?', text)
+        if rating_match:
+            rating = float(rating_match.group())
+
+    review_count = None
+    texts = _texts(extracted, "review_texts")
+    for pattern in (r'\d+\s+review', r'\d+.*review'):
+        text = next((t for t in texts if re.search(pattern, t, re.IGNORECASE)), None)
+        if text:
+            review_count = int(re.search(r'(\d+)', text.replace(",", "")).group(1))
+            break
+
+    address = next(iter(_texts(extracted, "address") + _texts(extracted, "address_alt")), None)
+
+    phone = None
+    phone_text = "\n".join(_texts(extracted, "phone_links") + _texts(extracted, "phone_texts"))
+    for pattern in PHONE_PATTERNS:
+        phone_match = re.search(pattern, phone_text)
+        if phone_match:
+            phone = phone_match.group(0).strip()
+            break
+
+    description = None
+    for i in range(len(DESCRIPTION_SELECTORS)):
+        text = next(iter(_texts(extracted, f"description_{i}")), "")
+        if len(text) > 20:
+            description = text
+            break
+
+    amenities = [text for text in _texts(extracted, "amenities") if 5 < len(text) < 100]
+
+    hours_of_operation = {}
+    for day, hours in HOURS_RE.findall("\n".join(_texts(extracted, "hours"))):
+        hours_of_operation[day.capitalize()] = hours.strip()
+
+    price_match = PRICE_RE.search("\n".join(_texts(extracted, "prices")))
+    price_range = price_match.group(0).strip() if price_match else None
+
+    website = next((href for href in _texts(extracted, "links")
+                    if 'tripadvisor' not in href.lower() and 'javascript' not in href.lower()), None)
+
+    srcs, data_srcs = extracted.get("img_src") or [], extracted.get("img_data_src") or []
+    photo_urls = []
+    for i, src in enumerate(srcs if isinstance(srcs, list) else []):
+        src = src or (data_srcs[i] if isinstance(data_srcs, list) and i < len(data_srcs) else "") or ""
+        if is_photo_url(src) and src.startswith('http'):
+            photo_urls.append(src)
+    for srcset in _texts(extracted, "srcset"):
+        photo_urls += srcset_urls(srcset)
+    photo_urls += [src for src in _texts(extracted, "data_src") if 'media' in src]
+
+    return listing_data(url, {
+        "name": {"name": name},
+        "rating": {"rating": rating},
+        "review_count": {"review_count": review_count},
+        "address": {"address": address},
+        "phone_number": {"phone_number": phone},
+        "description": {"description": description},
+        "amenities": {"amenities": amenities},
+        "hours_of_operation": {"hours_of_operation": hours_of_operation},
+        "price_range": {"price_range": price_range},
+        "website": {"website": website},
+        "photos": photo_columns(photo_urls),
+        "location_type": {"location_type": listing_type(name, url)},
+    }, fields)
+
+
+def missing_fields(data: Dict, fields: Optional[Set[str]] = None) -> Set[str]:
+    """Requested FALLBACK_FIELDS a rules result left empty"""
+    wanted = FALLBACK_FIELDS if fields is None else FALLBACK_FIELDS & set(fields)
+    return {field for field in wanted
+            if is_empty(data.get(FIELD_PRIMARY_COLUMN.get(field, field)), field)}
+
+
+def decode_extracted(body: str) -> Optional[Dict]:
+    try:
+        extracted = json.loads(body)
+    except ValueError:
+        return None
+    return extracted if isinstance(extracted, dict) else None
+
+
+class ExtractStats:
+    """Payload bytes and local parse time per extraction mode"""
+
+    def __init__(self):
+        self.pages: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.listings = 0
+        self.fallbacks = 0
+        self.fallback_fields: Dict[str, int] = {}
+
+    def record(self, mode: str, body: str, started: float):
+        """One payload of the given mode ("html", "rules"), parsed since started (perf_counter)"""
+        self.pages[mode] = self.pages.get(mode, 0) + 1
+        self.bytes[mode] = self.bytes.get(mode, 0) + len(body.encode("utf-8"))
+        self.seconds[mode] = self.seconds.get(mode, 0.0) + time.perf_counter() - started
+
+    def fallback(self, fields: Set[str]):
+        self.fallbacks += 1
+        for field in fields:
+            self.fallback_fields[field] = self.fallback_fields.get(field, 0) + 1
+
+    def summary(self) -> List[str]:
+        listings = max(1, self.listings)
+        total_bytes = sum(self.bytes.values())
+        total_seconds = sum(self.seconds.values())
+        lines = [f"{self.listings} listing pages extracted: {total_bytes / listings / 1024:.1f} KB and "
+                 f"{total_seconds / listings * 1000:.1f}ms local parsing per listing"]
+        for mode in sorted(self.pages):
+            pages = self.pages[mode]
+            lines.append(f"{mode}: {pages} payloads, {self.bytes[mode] / pages / 1024:.1f} KB and "
+                         f"{self.seconds[mode] / pages * 1000:.1f}ms parse each")
+        if self.fallbacks:
+            fields = ", ".join(f"{f} {n}" for f, n in sorted(self.fallback_fields.items(), key=lambda x: -x[1]))
+            lines.append(f"{self.fallbacks} full-page fallbacks ({fields})")
+        return lines
+
+
+def extract_listing(url: str, fields: Optional[Set[str]], fetch: Callable[..., Optional[str]],
+                    use_rules: bool = False, stats: Optional[ExtractStats] = None) -> Optional[Dict]:
+    """A listing page's fields, via extract_rules JSON first when use_rules, else (or for what it missed) the HTML"""
+    stats = stats if stats is not None else ExtractStats()
+    data = None
+    wanted = fields
+    if use_rules:
+        body = fetch(url, extract_rules=rules_for(fields))
+        started = time.perf_counter()
+        extracted = decode_extracted(body) if body else None
+        if extracted is not None:
+            data = parse_extracted(extracted, url, fields)
+            for column in KEEP_STORED_FIELDS:
+                if column in data and is_empty(data[column], column):
+                    del data[column]
+            wanted = missing_fields(data, fields)
+            stats.record("rules", body, started)
+        if data is not None and not wanted:
+            stats.listings += 1
+            return data
+        if data is not None:
+            stats.fallback(wanted)
+
+    html = fetch(url)
+    if not html:
+        return data
+
+    started = time.perf_counter()
+    html_data = parse_listing_html(html, url, wanted)
+    stats.record("html", html, started)
+    stats.listings += 1
+    if data is None:
+        return html_data
+    data.update({column: value for column, value in html_data.items() if not is_empty(value, column)})
+    return data
@@ -0,0 +1,140 @@
+"""
+llm_cache.py
+
+Persistent cache for deterministic (temperature 0) LLM answers.
+
+Entries are keyed by sha256(model + version + normalized prompt), where the
+prompt is lowercased with whitespace collapsed, so the same listing asked
+about on every run hits the cache instead of paying for another completion.
+
+- ttl_days: entries older than this are ignored and purged
+- max_entries: the least recently used entries are evicted past this size
+- version: a tag for the prompt template; bump it whenever the template or
+  the fields it asks for change, and entries written under another version
+  are dropped when the cache is opened
+
+The file is SQLite and safe to share between threads.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_PATH = os.getenv("LLM_CACHE_PATH") or "llm_enrichment_cache.sqlite3"
+DEFAULT_TTL_DAYS = 30.0
+DEFAULT_MAX_ENTRIES = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    version TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_accessed_at ON answers(accessed_at);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt or "").strip().lower()
+
+
+class LLMCache:
+    """Model + prompt keyed answer cache with TTL, LRU size bound and version tag"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, version: str = "1",
+                 ttl_days: float = DEFAULT_TTL_DAYS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.version = version
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self.lookup_seconds = 0.0
+
+        with self.lock, self.conn:
+            purged = self.conn.execute(
+                "DELETE FROM answers WHERE version <> ? OR created_at < ?",
+                (self.version, time.time() - self.ttl_seconds),
+            ).rowcount
+        self.evicted += purged
+        self.size = len(self)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def key(self, model: str, prompt: str) -> str:
+        raw = "\x1f".join((model, self.version, normalize_prompt(prompt)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str) -> Optional[Dict]:
+        """Cached answer for this model and prompt, or None if absent or expired"""
+        started = time.perf_counter()
+        key = self.key(model, prompt)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM answers WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row:
+                self.conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.lookup_seconds += time.perf_counter() - started
+        return json.loads(row[0]) if row else None
+
+    def put(self, model: str, prompt: str, value: Dict):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (key, model, version, created_at, accessed_at, value) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(model, prompt), model, self.version, now, now, json.dumps(value)),
+            )
+            self.stores += 1
+            # Overestimates on replaced keys; corrected by the real count below
+            self.size += 1
+            if self.size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the lock; trims 5% extra so this runs rarely
+        count = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries + max(1, self.max_entries // 20)
+            deleted = self.conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self.evicted += deleted
+            count -= deleted
+        self.size = count
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        per_lookup = self.lookup_seconds / lookups * 1e6 if lookups else 0.0
+        return (f"{self.hits}/{lookups} hits ({rate:.0f}%), {per_lookup:.0f}µs per lookup, "
+                f"{self.stores} stored, {self.evicted} evicted/expired (version {self.version})")
@@ -0,0 +1,309 @@
+"""
+matching.py
+
+Candidate ranking for matching a nearby_listings row against TripAdvisor
+search results.
+
+Three steps:
+1. Normalize names (accents like Biñan/Parañaque, stop words, branch suffixes)
+2. Block candidates through a token/trigram inverted index and score them with
+   a token-set + trigram similarity (linear in name length)
+3. Break ties with city and category agreement
+
+Usage:
+    index = CandidateIndex(candidates_from_anchors(links))
+    match = index.best_match("Manila Bay Kitchen", city="Manila", category="restaurants")
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Minimum name similarity (0-1) for a candidate to count as a match
+DEFAULT_THRESHOLD = 0.55
+
+# Weights of the two name similarity signals
+TOKEN_WEIGHT = 0.6
+TRIGRAM_WEIGHT = 0.4
+
+# Tiebreaker bonuses, only applied to rank candidates that already pass the threshold
+CITY_BONUS = 0.05
+CATEGORY_BONUS = 0.03
+
+STOP_WORDS = {
+    "the", "a", "an", "and", "or", "in", "on", "at", "to", "for", "of", "de", "del",
+    "la", "las", "los", "le", "ng", "sa", "with", "by", "n",
+}
+
+# Descriptive words that say what kind of place it is rather than which one;
+# they still count towards similarity but with GENERIC_WEIGHT
+GENERIC_WORDS = {
+    "resort", "resorts", "spa", "hotel", "hotels", "inn", "suites", "restaurant", "cafe",
+    "bar", "grill", "lounge", "museum", "church", "cathedral", "parish", "shrine", "park",
+    "garden", "gardens", "beach", "island", "falls", "mall", "center", "centre", "city",
+    "tour", "tours", "area",
+}
+GENERIC_WEIGHT = 0.3
+
+# Tokens of the listing's own city say little about which place it is
+CITY_WEIGHT = 0.2
+
+# Words that only describe which outlet of a chain this is
+BRANCH_WORDS = {
+    "branch", "outlet", "store", "kiosk", "main", "annex", "extension", "ph",
+    "philippines", "inc", "corp", "corporation", "co", "ltd",
+}
+
+BRANCH_SUFFIX_RE = re.compile(r"\s[-–—|@]\s.*$")
+PARENS_RE = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+CATEGORY_KEYWORDS = {
+    "restaurant": ("restaurant", "restaurants", "food", "cafe", "dining", "bar", "nightlife"),
+    "hotel": ("hotel", "hotels", "resort", "inn", "lodging", "accommodation"),
+    "attraction": ("attraction", "attractions", "museum", "museums", "park", "parks",
+                   "beach", "beaches", "church", "churches", "shopping", "landmark"),
+}
+
+URL_CATEGORY_PREFIXES = {
+    "Restaurant_Review": "restaurant",
+    "Hotel_Review": "hotel",
+    "Attraction_Review": "attraction",
+    "AttractionProductReview": "attraction",
+}
+
+
+class Candidate(NamedTuple):
+    """A search result anchor that may be the listing we are looking for"""
+    name: str
+    url: str
+    city: Optional[str] = None
+    category: Optional[str] = None
+
+
+def strip_accents(text: str) -> str:
+    """Fold accented characters to ASCII (Parañaque -> Paranaque)"""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=8192)
+def normalize_name(name: str) -> str:
+    """Normalize a place name for comparison
+
+    Lowercases, folds accents, drops parenthesized qualifiers, " - Branch"
+    suffixes, stop words and branch words. Cached, since the same anchors come
+    back for every search strategy tried for a listing.
+    """
+    if not name:
+        return ""
+
+    text = strip_accents(name).replace("&", " and ")
+    text = PARENS_RE.sub(" ", text)
+    stripped = BRANCH_SUFFIX_RE.sub("", text)
+    if stripped.strip():
+        text = stripped
+
+    tokens = [t for t in NON_WORD_RE.split(text.lower()) if t]
+    return " ".join(t for t in tokens if t not in STOP_WORDS and t not in BRANCH_WORDS)
+
+
+def name_tokens(normalized: str) -> Set[str]:
+    """Token set of a normalized name"""
+    return set(normalized.split())
+
+
+def name_trigrams(normalized: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so short words still count"""
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def token_weight(token: str, city_tokens: Set[str] = frozenset()) -> float:
+    """Weight of a token in the token-set similarity"""
+    if token in city_tokens:
+        return CITY_WEIGHT
+    if token in GENERIC_WORDS:
+        return GENERIC_WEIGHT
+    return 1.0
+
+
+def token_set_similarity(a: Set[str], b: Set[str], city_tokens: Set[str] = frozenset()) -> float:
+    """Weighted Dice overlap of two token sets, lifted when one name contains the other"""
+    if not a or not b:
+        return 0.0
+    weight_a = sum(token_weight(t, city_tokens) for t in a)
+    weight_b = sum(token_weight(t, city_tokens) for t in b)
+    common = sum(token_weight(t, city_tokens) for t in a & b)
+    dice = 2.0 * common / (weight_a + weight_b)
+    if min(len(a), len(b)) < 2:
+        return dice
+    containment = common / min(weight_a, weight_b)
+    return max(dice, 0.9 * containment)
+
+
+def trigram_similarity(a: Set[str], b: Set[str]) -> float:
+    """Dice overlap of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def category_family(category: Optional[str]) -> Optional[str]:
+    """Map a free-form category or location_type to restaurant/hotel/attraction"""
+    if not category:
+        return None
+    lowered = category.lower()
+    for family, keywords in CATEGORY_KEYWORDS.items():
+        if any(k in lowered for k in keywords):
+            return family
+    return None
+
+
+def candidate_from_anchor(text: str, href: str) -> Candidate:
+    """Build a Candidate from a result anchor, reading city/category from the URL
+
+    TripAdvisor detail URLs look like
+    /Restaurant_Review-g298573-d26455563-Reviews-Manila_Bay_Kitchen-Manila_Metro_Manila_Luzon.html
+    """
+    path = href.split("://", 1)[-1]
+    path = path.split("/", 1)[-1] if "/" in path else path
+    prefix = path.split("-", 1)[0]
+    category = URL_CATEGORY_PREFIXES.get(prefix)
+
+    city = None
+    match = re.search(r"-Reviews-(?:or\d+-)?[^-]+-([^.#?]+)", href)
+    if match:
+        city = match.group(1).split("_Province")[0].replace("_", " ")
+
+    return Candidate(name=text, url=href, city=city, category=category)
+
+
+def candidates_from_anchors(links: Iterable) -> List[Candidate]:
+    """Turn BeautifulSoup result anchors into Candidates, keeping one per URL
+
+    A result links its listing several times (title, image, review snippets);
+    the first anchor with text is the title, so later ones are dropped.
+    """
+    seen: Set[str] = set()
+    candidates: List[Candidate] = []
+
+    for link in links:
+        href = link.get("href", "")
+        text = link.get_text(strip=True)
+        if not href or not text or len(text) < 3:
+            continue
+
+        key = href.split("#", 1)[0]
+        if key in seen:
+            continue
+
+        seen.add(key)
+        candidates.append(candidate_from_anchor(text, href))
+
+    return candidates
+
+
+class CandidateIndex:
+    """Token/trigram inverted index over candidates for one search
+
+    Only candidates sharing at least one token or trigram with the query are
+    scored, and every candidate's normalized form is computed once.
+    """
+
+    def __init__(self, candidates: Iterable[Candidate]):
+        self.candidates: List[Candidate] = []
+        self._tokens: List[Set[str]] = []
+        self._trigrams: List[Set[str]] = []
+        self._cities: List[str] = []
+        self._token_index: Dict[str, List[int]] = {}
+        self._trigram_index: Dict[str, List[int]] = {}
+
+        for candidate in candidates:
+            self.add(candidate)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def add(self, candidate: Candidate):
+        """Add a candidate to the index"""
+        idx = len(self.candidates)
+        normalized = normalize_name(candidate.name)
+        tokens = name_tokens(normalized)
+        trigrams = name_trigrams(normalized)
+
+        self.candidates.append(candidate)
+        self._tokens.append(tokens)
+        self._trigrams.append(trigrams)
+        self._cities.append(normalize_name(candidate.city) if candidate.city else "")
+
+        for token in tokens:
+            self._token_index.setdefault(token, []).append(idx)
+        for gram in trigrams:
+            self._trigram_index.setdefault(gram, []).append(idx)
+
+    def _block(self, tokens: Set[str], trigrams: Set[str]) -> Set[int]:
+        """Ids of candidates that share a token, or failing that a trigram, with the query"""
+        ids: Set[int] = set()
+        for token in tokens:
+            ids.update(self._token_index.get(token, ()))
+        if not ids:
+            for gram in trigrams:
+                ids.update(self._trigram_index.get(gram, ()))
+        return ids
+
+    def rank(self, name: str, city: Optional[str] = None,
+             category: Optional[str] = None) -> List[Tuple[float, float, Candidate]]:
+        """Rank blocked candidates, best first
+
+        Returns (rank_score, name_score, candidate) tuples. name_score is the
+        pure name similarity; rank_score adds the city/category tiebreakers.
+        """
+        normalized = normalize_name(name)
+        tokens = name_tokens(normalized)
+        trigrams = name_trigrams(normalized)
+        if not tokens:
+            return []
+
+        city_key = normalize_name(city) if city else None
+        city_tokens = name_tokens(city_key) if city_key else frozenset()
+        family = category_family(category)
+
+        ranked = []
+        for idx in self._block(tokens, trigrams):
+            candidate = self.candidates[idx]
+            name_score = (
+                TOKEN_WEIGHT * token_set_similarity(tokens, self._tokens[idx], city_tokens)
+                + TRIGRAM_WEIGHT * trigram_similarity(trigrams, self._trigrams[idx])
+            )
+
+            rank_score = name_score
+            if city_key and self._cities[idx].startswith(city_key):
+                rank_score += CITY_BONUS
+            if family and candidate.category == family:
+                rank_score += CATEGORY_BONUS
+
+            ranked.append((rank_score, name_score, candidate))
+
+        ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        return ranked
+
+    def best_match(self, name: str, city: Optional[str] = None, category: Optional[str] = None,
+                   threshold: float = DEFAULT_THRESHOLD) -> Optional[Tuple[Candidate, float]]:
+        """Best candidate whose name similarity clears threshold, with its score"""
+        for _, name_score, candidate in self.rank(name, city, category):
+            if name_score >= threshold:
+                return candidate, name_score
+        return None
+
+
+def best_match(name: str, candidates: Iterable[Candidate], city: Optional[str] = None,
+               category: Optional[str] = None,
+               threshold: float = DEFAULT_THRESHOLD) -> Optional[Tuple[Candidate, float]]:
+    """One-shot helper: index candidates and return the best match"""
+    return CandidateIndex(candidates).best_match(name, city, category, threshold)
@@ -0,0 +1,263 @@
+"""
+nearby_attractions.py
+
+nearby_attractions for every listing, computed from the table itself.
+
+Every ingestion path writes nearby_attractions: [] or copies whatever the
+API sent, so most rows have none. AttractionJoin fills the column with a
+spatial self-join over a SpatialIndex of the table: the top_n closest
+attractions rated min_rating or better within radius_m of each listing,
+nearest first, stored as names (the column is TEXT[] and ListingDetail
+renders the strings). A listing is never its own nearby attraction.
+Listings without precise coordinates are left as they are.
+
+Each run saves an AttractionSnapshot: per listing the id, coordinates,
+rating, attraction flag, a name fingerprint, a fingerprint of the list it
+was given and its reach (the distance of its last listed attraction,
+radius_m while the list is not full), plus the join parameters. The next
+run compares the table with it and only recomputes the listings whose
+nearby_attractions can have changed:
+
+- listings that are new or whose coordinates changed
+- listings whose stored list is no longer the one the join wrote (an
+  ingestion upsert sent [] or the API's list)
+- listings whose reach covers the old or the new position of a qualifying
+  attraction (rated min_rating or better) that appeared, disappeared, moved,
+  was renamed, or started or stopped qualifying; anything farther away was
+  not on the list and would not make it onto it. Lists hold names only, so
+  a new rating that keeps an attraction on the same side of min_rating
+  changes no list
+
+A missing snapshot or different join parameters mean a full run. Patches
+are produced only where the computed list differs from the stored one.
+"""
+
+import os
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from nearby_sync.spatial_index import DEFAULT_CELL_DEG, SpatialIndex, category_key
+
+DEFAULT_RADIUS_M = 5000.0
+DEFAULT_TOP_N = 10
+DEFAULT_MIN_RATING = 3.5
+DEFAULT_STATE_PATH = os.getenv("NEARBY_ATTRACTIONS_STATE") or "nearby_attractions_state.npz"
+ATTRACTION_CATEGORIES = ("attraction", "attractions")
+SELECT_COLUMNS = "id,name,latitude,longitude,rating,location_type,category,nearby_attractions"
+
+SNAPSHOT_COLUMNS = ("ids", "lat", "lng", "rating", "attraction", "name_hash", "list_hash", "reach")
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _float_column(values: List) -> np.ndarray:
+    # numpy turns None into NaN; anything it cannot convert goes through _to_float
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(v) for v in values], dtype=np.float64)
+
+
+def _list_hash(names) -> int:
+    return zlib.crc32("\x1f".join(names or []).encode("utf-8"))
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Elementwise equality where NaN equals NaN"""
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+class AttractionSnapshot:
+    """The per-listing columns nearby_attractions depends on, sorted by id"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], params: Tuple[float, int, float]):
+        for name in SNAPSHOT_COLUMNS:
+            setattr(self, name, columns[name])
+        self.params = tuple(params)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], params: Tuple[float, int, float]) -> "AttractionSnapshot":
+        return cls.from_rows_ordered(rows, params)[0]
+
+    @classmethod
+    def from_rows_ordered(cls, rows: List[Dict],
+                          params: Tuple[float, int, float]) -> Tuple["AttractionSnapshot", np.ndarray]:
+        """The snapshot of rows and, per snapshot position, the index of its row in rows"""
+        ids = np.array([int(r["id"]) for r in rows], dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        columns = {
+            "ids": ids,
+            "lat": _float_column([r.get("latitude", r.get("lat")) for r in rows]),
+            "lng": _float_column([r.get("longitude", r.get("lng")) for r in rows]),
+            "rating": _float_column([r.get("rating") for r in rows]),
+            # row_category() and _list_hash() inlined: these run once per row on every run
+            "attraction": np.array([category_key(r.get("location_type") or r.get("category")) in ATTRACTION_CATEGORIES
+                                    for r in rows], dtype=bool),
+            "name_hash": np.array([zlib.crc32((r.get("name") or "").encode("utf-8")) for r in rows], dtype=np.int64),
+            # The stored lists; the join replaces these with the lists it computed
+            "list_hash": np.array([zlib.crc32("\x1f".join(r.get("nearby_attractions") or ()).encode("utf-8"))
+                                   for r in rows], dtype=np.int64),
+            "reach": np.full(len(rows), np.nan),
+        }
+        return cls({name: values[order] for name, values in columns.items()}, params), order
+
+    def save(self, path: str = DEFAULT_STATE_PATH):
+        with open(path, "wb") as f:
+            np.savez(f, params=np.array(self.params, dtype=np.float64),
+                     **{name: getattr(self, name) for name in SNAPSHOT_COLUMNS})
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_STATE_PATH) -> Optional["AttractionSnapshot"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if any(name not in data for name in SNAPSHOT_COLUMNS):
+                return None
+            radius_m, top_n, min_rating = data["params"].tolist()
+            return cls({name: data[name] for name in SNAPSHOT_COLUMNS}, (radius_m, int(top_n), min_rating))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class AttractionJoin:
+    """Top-N rated attractions within a radius of every listing, recomputed incrementally"""
+
+    def __init__(self, rows: List[Dict], radius_m: float = DEFAULT_RADIUS_M, top_n: int = DEFAULT_TOP_N,
+                 min_rating: float = DEFAULT_MIN_RATING, cell_deg: float = DEFAULT_CELL_DEG):
+        self.rows = rows
+        self.radius_m = radius_m
+        self.top_n = top_n
+        self.min_rating = min_rating
+        snapshot, order = AttractionSnapshot.from_rows_ordered(rows, self.params)
+        self.snapshot = snapshot
+        # The join only tells attractions from everything else, so the snapshot columns are enough
+        self.index = SpatialIndex.build(snapshot.ids, snapshot.lat, snapshot.lng,
+                                        np.where(snapshot.attraction, ATTRACTION_CATEGORIES[0], ""),
+                                        snapshot.rating, cell_deg=cell_deg)
+
+        # Per index position: its snapshot position and its row; names only where a list can show them
+        self._at = np.searchsorted(snapshot.ids, self.index.ids)
+        self._row = order[self._at]
+        self.names = np.full(len(self.index), "", dtype=object)
+        listed = np.flatnonzero(self.qualifies(snapshot)[self._at])
+        self.names[listed] = [rows[i].get("name") or "" for i in self._row[listed].tolist()]
+
+        self.full = True
+        self.moved = 0
+        self.stale = 0
+        self.changed_attractions = 0
+        self.recomputed = 0
+        self.changed = 0
+
+    @property
+    def params(self) -> Tuple[float, int, float]:
+        return (float(self.radius_m), int(self.top_n), float(self.min_rating))
+
+    def qualifies(self, snapshot: AttractionSnapshot) -> np.ndarray:
+        """Per snapshot position: an attraction rated min_rating or better, the only rows a list can show"""
+        # float32 like the index's rating column, so both agree at the threshold
+        return snapshot.attraction & (snapshot.rating.astype(np.float32) >= self.min_rating)
+
+    def dirty_ids(self, previous: Optional[AttractionSnapshot]) -> Optional[np.ndarray]:
+        """Ids whose nearby_attractions may have changed since previous; None means every listing"""
+        if previous is None or previous.params != self.params:
+            self.full = True
+            return None
+        self.full = False
+        new, old = self.snapshot, previous
+
+        _, new_at, old_at = np.intersect1d(new.ids, old.ids, assume_unique=True, return_indices=True)
+        added = np.ones(len(new), dtype=bool)
+        added[new_at] = False
+        removed = np.ones(len(old), dtype=bool)
+        removed[old_at] = False
+
+        moved = added.copy()
+        moved[new_at] = ~(_same(new.lat[new_at], old.lat[old_at]) & _same(new.lng[new_at], old.lng[old_at]))
+        # Stored list overwritten since the join wrote it
+        stale = new_at[new.list_hash[new_at] != old.list_hash[old_at]]
+
+        # Lists show qualifying attractions by name in distance order: only gaining or losing the
+        # qualification, or moving or renaming while qualified, changes what listings around see
+        was, now = self.qualifies(old), self.qualifies(new)
+        was_at, now_at = was[old_at], now[new_at]
+        renamed = new.name_hash[new_at] != old.name_hash[old_at]
+        touched = (was_at != now_at) | ((was_at | now_at) & (moved[new_at] | renamed))
+
+        # Old positions of attractions that were listed, new positions of those that can be now
+        lat = np.concatenate([new.lat[added & now], old.lat[removed & was],
+                              new.lat[new_at[touched & now_at]], old.lat[old_at[touched & was_at]]])
+        lng = np.concatenate([new.lng[added & now], old.lng[removed & was],
+                              new.lng[new_at[touched & now_at]], old.lng[old_at[touched & was_at]]])
+        self.moved = int(moved.sum())
+        self.stale = len(stale)
+        self.changed_attractions = int((added & now).sum() + (removed & was).sum() + touched.sum())
+        new.reach[new_at] = old.reach[old_at]
+
+        around = self.index.radius(lat, lng, self.radius_m)
+        redo = np.union1d(new.ids[moved], new.ids[stale])
+        if not around:
+            return redo
+        rows = np.concatenate([found.rows for found in around])
+        meters = np.concatenate([found.meters for found in around])
+        # The new snapshot holds the old reach by now; NaN (never computed) never compares
+        # greater, so those listings are recomputed too
+        reached = ~(meters > new.reach[self._at[rows]])
+        return np.union1d(redo, self.index.ids[rows[reached]])
+
+    def compute(self, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(index positions, (positions, top_n) attraction positions padded with -1) for ids (default all)
+
+        Also stores the reach of every listing computed in the snapshot.
+        """
+        positions = np.arange(len(self.index)) if ids is None else np.flatnonzero(np.isin(self.index.ids, ids))
+        found = self.index.knn(self.index.lat[positions], self.index.lng[positions], self.top_n + 1,
+                               category=ATTRACTION_CATEGORIES, min_rating=self.min_rating,
+                               max_radius_m=self.radius_m)
+        # Drop each listing from its own list, keeping the order of the rest
+        keep = (found.rows >= 0) & (found.rows != positions[:, None])
+        order = np.argsort(~keep, axis=1, kind="stable")[:, :self.top_n]
+        kept = np.take_along_axis(keep, order, axis=1)
+        rows = np.where(kept, np.take_along_axis(found.rows, order, axis=1), -1)
+        last = np.where(kept, np.take_along_axis(found.meters, order, axis=1), -np.inf).max(axis=1, initial=-np.inf)
+        full = kept.all(axis=1) if self.top_n else np.ones(len(positions), dtype=bool)
+        at = np.searchsorted(self.snapshot.ids, self.index.ids[positions])
+        self.snapshot.reach[at] = np.where(full & np.isfinite(last), last, self.radius_m)
+        self.recomputed = len(positions)
+        return positions, rows
+
+    def patches(self, previous: Optional[AttractionSnapshot] = None) -> Iterator[Tuple[int, Dict]]:
+        """(listing id, {"nearby_attractions": names}) for every listing whose stored list is out of date"""
+        dirty = self.dirty_ids(previous)
+        positions, attractions = self.compute(dirty)
+        counts = (attractions >= 0).sum(axis=1).tolist()
+        found = self.names[np.maximum(attractions, 0)].tolist()
+        hashes = np.zeros(len(positions), dtype=np.int64)
+        changed = []
+        for i, (listing_id, row) in enumerate(zip(self.index.ids[positions].tolist(), self._row[positions].tolist())):
+            names = found[i][:counts[i]]
+            hashes[i] = _list_hash(names)
+            if list(self.rows[row].get("nearby_attractions") or []) != names:
+                changed.append((listing_id, {"nearby_attractions": names}))
+        self.snapshot.list_hash[self._at[positions]] = hashes
+        self.changed = len(changed)
+        yield from changed
+
+    def summary(self) -> List[str]:
+        lines = [self.index.summary()]
+        if self.full:
+            lines.append(f"Full run: {self.recomputed} listings recomputed")
+        else:
+            lines.append(f"Incremental: {self.moved} listings new or moved, {self.stale} lists overwritten, "
+                         f"{self.changed_attractions} attractions changed -> {self.recomputed} listings recomputed")
+        lines.append(f"{self.changed} listings with a different nearby_attractions list "
+                     f"(top {self.top_n} rated {self.min_rating}+ within {self.radius_m / 1000:.1f}km)")
+        return lines
@@ -0,0 +1,182 @@
+"""
+partner_api.py
+
+Concurrent TripAdvisor Partner API access for the sync scripts.
+
+- PartnerApiClient: thread-safe GET with a token-bucket rate limit per API
+  key (keys are used round-robin) and retries with jittered exponential
+  backoff on 429, 5xx and connection errors (Retry-After is honoured)
+- run_ordered: run a function over many inputs on a bounded thread pool and
+  yield the results in input order, so progress output reads like the old
+  sequential loop while requests run in parallel
+
+Several keys can be given as a comma separated TRIPADVISOR value.
+"""
+
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+PARTNER_API_BASE = "https://api.tripadvisor.com/api/partner/2.0"
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_PER_KEY = 5.0      # requests per second per key
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5              # seconds
+BACKOFF_MAX = 20.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_END = object()
+
+
+def parse_api_keys(value: Optional[str]) -> List[str]:
+    return [k.strip() for k in (value or "").split(",") if k.strip()]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, up to burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After if given"""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class PartnerApiClient:
+    """Rate-limited, retrying Partner API client safe to share between threads"""
+
+    def __init__(self, api_keys: List[str], rate_per_key: float = DEFAULT_RATE_PER_KEY,
+                 max_retries: int = MAX_RETRIES, timeout: float = 10.0):
+        if not api_keys:
+            raise ValueError("At least one TripAdvisor API key is required")
+        self.buckets = {key: TokenBucket(rate_per_key) for key in api_keys}
+        self.keys = cycle(api_keys)
+        self.keys_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.local = threading.local()
+
+        self.stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.status_counts: Dict[int, int] = {}
+
+    def _session(self) -> requests.Session:
+        # requests.Session is not thread-safe; keep one per worker thread
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def _next_key(self) -> str:
+        with self.keys_lock:
+            return next(self.keys)
+
+    def _count(self, status: Optional[int] = None, retry: bool = False, failure: bool = False):
+        with self.stats_lock:
+            self.calls += 1
+            if status is not None:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.retries += retry
+            self.failures += failure
+
+    def get(self, path: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """GET a Partner API path (e.g. "locations/search"); None after non-retryable errors or retries run out"""
+        url = f"{PARTNER_API_BASE}/{path.lstrip('/')}"
+
+        for attempt in range(self.max_retries + 1):
+            key = self._next_key()
+            self.buckets[key].acquire()
+            last = attempt == self.max_retries
+
+            try:
+                response = self._session().get(
+                    url,
+                    params=params,
+                    headers={"X-TripAdvisor-API-Key": key, "Accept": "application/json"},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                self._count(retry=not last, failure=last)
+                if last:
+                    print(f"  ❌ Partner API error for {path}: {e}", file=sys.stderr)
+                    return None
+                time.sleep(backoff_delay(attempt))
+                continue
+
+            if response.status_code == 200:
+                self._count(200)
+                return response.json()
+
+            retryable = response.status_code in RETRY_STATUS
+            self._count(response.status_code, retry=retryable and not last, failure=not retryable or last)
+            if not retryable or last:
+                print(f"  ⚠️  API returned {response.status_code} for {path} {params or ''}", file=sys.stderr)
+                return None
+            time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+
+        return None
+
+    def summary(self) -> str:
+        statuses = ", ".join(f"{code}: {n}" for code, n in sorted(self.status_counts.items()))
+        return f"{self.calls} calls ({self.retries} retries, {self.failures} failed; {statuses or 'no responses'})"
+
+
+def run_ordered(fn: Callable, items: Iterable, max_workers: int = DEFAULT_WORKERS) -> Iterator[Tuple[object, object, Optional[Exception]]]:
+    """Yield (item, result, error) in input order while fn runs on a bounded pool
+
+    At most 4 × max_workers calls are queued ahead of the one being
+    reported, so memory stays flat for long inputs.
+    """
+    items = iter(items)
+    window = max_workers * 4
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        queue = []
+        for item in items:
+            queue.append((item, pool.submit(fn, item)))
+            if len(queue) >= window:
+                break
+
+        while queue:
+            item, future = queue.pop(0)
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+            nxt = next(items, _END)
+            if nxt is not _END:
+                queue.append((nxt, pool.submit(fn, nxt)))
+
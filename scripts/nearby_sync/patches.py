@@ -0,0 +1,99 @@
+"""
+patches.py
+
+Batched partial-column updates for nearby_listings.
+
+PatchWriter collects {id: changed columns} patches and sends them in large
+batches to the nearby_listings_apply_patches RPC
+(supabase/migrations/0210_nearby_listings_apply_patches.sql), which applies
+a whole batch with one set-based UPDATE. Thousands of partial updates cost a
+handful of requests, and columns a patch does not mention are never touched.
+
+If the RPC is missing or a batch fails, that batch falls back to one
+.update().eq("id") per row (still partial, never an upsert).
+"""
+
+import sys
+from typing import Callable, Dict, Optional
+
+DEFAULT_BATCH_SIZE = 500
+RPC_NAME = "nearby_listings_apply_patches"
+
+
+class PatchWriter:
+    """Buffer partial updates by id and flush them through one RPC per batch"""
+
+    def __init__(self, supabase, batch_size: int = DEFAULT_BATCH_SIZE, table: str = "nearby_listings",
+                 on_flush: Optional[Callable[[int], None]] = None):
+        self.supabase = supabase
+        self.batch_size = batch_size
+        self.table = table
+        self.on_flush = on_flush
+        self.pending: Dict = {}
+        self.requests = 0
+        self.patches = 0
+        self.updated = 0
+        self.failed = 0
+        self.rpc_available = True
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, listing_id, changes: Dict):
+        """Queue changes for a row; later changes to the same id win per column"""
+        changes = {k: v for k, v in changes.items() if k != "id"}
+        if not changes:
+            return
+        self.pending.setdefault(listing_id, {}).update(changes)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Send all pending patches; returns rows updated"""
+        if not self.pending:
+            return 0
+
+        batch = [{"id": listing_id, "changes": changes} for listing_id, changes in self.pending.items()]
+        self.pending = {}
+        self.patches += len(batch)
+
+        updated = None
+        if self.rpc_available and self.table == "nearby_listings":
+            try:
+                self.requests += 1
+                result = self.supabase.rpc(RPC_NAME, {"p_patches": batch}).execute().data or {}
+                updated = int(result.get("updated", 0))
+            except Exception as e:
+                print(f"  ⚠️  {RPC_NAME} failed ({e}), falling back to per-row updates", file=sys.stderr)
+                if "Could not find the function" in str(e) or "PGRST202" in str(e):
+                    self.rpc_available = False
+
+        if updated is None:
+            updated = self._flush_rows(batch)
+
+        self.updated += updated
+        if self.on_flush:
+            self.on_flush(updated)
+        return updated
+
+    def _flush_rows(self, batch) -> int:
+        updated = 0
+        for patch in batch:
+            try:
+                self.requests += 1
+                self.supabase.table(self.table).update(patch["changes"]).eq("id", patch["id"]).execute()
+                updated += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"    ❌ Update error for {patch['id']}: {e}", file=sys.stderr)
+        return updated
+
+    def summary(self) -> str:
+        return (f"{self.updated}/{self.patches} rows patched in {self.requests} requests"
+                + (f", {self.failed} failed" if self.failed else ""))
@@ -0,0 +1,231 @@
+"""
+replica.py
+
+Local incremental replica of nearby_listings.
+
+The replica is a single SQLite file opened with memory-mapped I/O. It holds
+every row as JSON plus indexed lookup columns (id, tripadvisor_id, slug and
+normalized name + city). After the first full load, refresh() only pulls
+rows whose (updated_at, id) is past the stored watermark, so scripts start
+from a small delta instead of downloading the whole table.
+
+Deletes on the server are not visible to a watermark pull; run
+refresh(full=True) (or delete the file) after bulk deletes such as a dedup
+--apply or a refetch.
+
+Usage:
+    replica = ListingReplica()
+    replica.refresh(supabase)
+    row = replica.get_by_tripadvisor_id("311158")
+"""
+
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional
+
+from nearby_sync.matching import normalize_name
+
+DEFAULT_PATH = os.getenv("NEARBY_REPLICA_PATH") or "nearby_listings_replica.sqlite3"
+PAGE_SIZE = 1000
+MMAP_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    tripadvisor_id TEXT,
+    slug TEXT,
+    name_key TEXT,
+    city_key TEXT,
+    updated_at TEXT,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_tripadvisor_id ON listings(tripadvisor_id);
+CREATE INDEX IF NOT EXISTS idx_listings_slug ON listings(slug);
+CREATE INDEX IF NOT EXISTS idx_listings_name_city ON listings(name_key, city_key);
+CREATE INDEX IF NOT EXISTS idx_listings_updated_at ON listings(updated_at, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _mark_key(row: Dict):
+    """(updated_at, id) ordered the way Postgres orders them (numeric ids as numbers)"""
+    row_id = row.get("id")
+    if isinstance(row_id, int) or str(row_id).isdigit():
+        return str(row.get("updated_at")), 0, int(row_id), ""
+    return str(row.get("updated_at")), 1, 0, str(row_id)
+
+
+class ListingReplica:
+    """SQLite-backed local copy of nearby_listings"""
+
+    def __init__(self, path: str = DEFAULT_PATH, table: str = "nearby_listings"):
+        self.path = path
+        self.table = table
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    # Watermark -----------------------------------------------------------
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def watermark(self) -> Optional[Dict]:
+        """Last pulled (updated_at, id), or None before the first load"""
+        updated_at = self._meta("watermark_updated_at")
+        if updated_at is None:
+            return None
+        return {"updated_at": updated_at, "id": self._meta("watermark_id")}
+
+    # Writes --------------------------------------------------------------
+
+    def upsert_rows(self, rows: List[Dict]):
+        """Store rows (full nearby_listings rows as returned by PostgREST)"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO listings (id, tripadvisor_id, slug, name_key, city_key, updated_at, row) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    str(row.get("id")),
+                    str(row["tripadvisor_id"]) if row.get("tripadvisor_id") is not None else None,
+                    row.get("slug"),
+                    normalize_name(row.get("name") or ""),
+                    normalize_name(row.get("city") or ""),
+                    row.get("updated_at"),
+                    json.dumps(row, ensure_ascii=False, default=str),
+                )
+                for row in rows
+            ],
+        )
+
+    def delete_ids(self, ids: List):
+        """Drop rows that were deleted on the server"""
+        self.conn.executemany("DELETE FROM listings WHERE id = ?", [(str(i),) for i in ids])
+        self.conn.commit()
+
+    def refresh(self, supabase, full: bool = False, verbose: bool = True) -> int:
+        """Pull new/changed rows past the watermark; returns rows pulled"""
+        if full or self.watermark is None:
+            return self._full_load(supabase, verbose)
+        return self._delta_pull(supabase, verbose)
+
+    def _full_load(self, supabase, verbose: bool) -> int:
+        if verbose:
+            print("📥 Replica: full load of nearby_listings...")
+
+        self.conn.execute("DELETE FROM listings")
+        pulled = 0
+        page = 0
+        newest = None
+
+        while True:
+            response = supabase.table(self.table).select("*").order("id").range(
+                page * PAGE_SIZE, (page + 1) * PAGE_SIZE - 1
+            ).execute()
+            data = response.data or []
+            self.upsert_rows(data)
+            pulled += len(data)
+            for row in data:
+                if row.get("updated_at") and (newest is None or _mark_key(row) > _mark_key(newest)):
+                    newest = row
+
+            if len(data) < PAGE_SIZE:
+                break
+            page += 1
+
+        self._set_meta("watermark_updated_at", newest["updated_at"] if newest else "1970-01-01T00:00:00")
+        self._set_meta("watermark_id", str(newest["id"]) if newest else "0")
+        self.conn.commit()
+
+        if verbose:
+            print(f"  ✅ Replica loaded: {pulled} rows")
+        return pulled
+
+    def _delta_pull(self, supabase, verbose: bool) -> int:
+        mark = self.watermark
+        pulled = 0
+
+        # Keyset pagination on (updated_at, id) past the watermark
+        while True:
+            updated_at, last_id = mark["updated_at"], mark["id"]
+            response = supabase.table(self.table).select("*").or_(
+                f"updated_at.gt.{updated_at},and(updated_at.eq.{updated_at},id.gt.{last_id})"
+            ).order("updated_at").order("id").limit(PAGE_SIZE).execute()
+            data = response.data or []
+            if not data:
+                break
+
+            self.upsert_rows(data)
+            pulled += len(data)
+            last = data[-1]
+            mark = {"updated_at": last.get("updated_at"), "id": str(last.get("id"))}
+            self._set_meta("watermark_updated_at", mark["updated_at"])
+            self._set_meta("watermark_id", mark["id"])
+            self.conn.commit()
+
+            if len(data) < PAGE_SIZE:
+                break
+
+        if verbose:
+            print(f"📥 Replica: pulled {pulled} changed rows since {self.watermark['updated_at']} ({len(self)} total)")
+        return pulled
+
+    # Reads ---------------------------------------------------------------
+
+    def _one(self, column: str, value) -> Optional[Dict]:
+        row = self.conn.execute(f"SELECT row FROM listings WHERE {column} = ? LIMIT 1", (value,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_by_id(self, listing_id) -> Optional[Dict]:
+        return self._one("id", str(listing_id))
+
+    def get_by_tripadvisor_id(self, tripadvisor_id) -> Optional[Dict]:
+        return self._one("tripadvisor_id", str(tripadvisor_id))
+
+    def get_by_slug(self, slug: str) -> Optional[Dict]:
+        return self._one("slug", slug)
+
+    def find_by_name_city(self, name: str, city: Optional[str]) -> List[Dict]:
+        """Rows whose normalized name and city equal the given ones"""
+        rows = self.conn.execute(
+            "SELECT row FROM listings WHERE name_key = ? AND city_key = ?",
+            (normalize_name(name or ""), normalize_name(city or "")),
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def iter_rows(self, columns: Optional[List[str]] = None) -> Iterator[Dict]:
+        """All rows in id order, optionally trimmed to the given columns
+
+        Numeric ids sort as numbers ("9" before "10"), like Postgres orders the
+        BIGINT column, so a run resumed by row count sees the same order here
+        and on the server; other ids follow as text.
+        """
+        order = "id GLOB '*[^0-9]*' OR id = '', CAST(id AS INTEGER), id"
+        for (raw,) in self.conn.execute(f"SELECT row FROM listings ORDER BY {order}"):
+            row = json.loads(raw)
+            yield {c: row.get(c) for c in columns} if columns else row
+
+    def all_rows(self, limit: int = 0) -> List[Dict]:
+        rows = []
+        for row in self.iter_rows():
+            rows.append(row)
+            if limit and len(rows) >= limit:
+                break
+        return rows
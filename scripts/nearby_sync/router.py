@@ -0,0 +1,263 @@
+"""
+router.py
+
+Cost-aware routing of field fetches across data sources.
+
+Each sync script used to hard-wire one source. FetchRouter takes a listing
+and the fields it needs (collector names, as in freshness.FRESHNESS_DAYS)
+and asks the registered sources for them, cheapest first, until every field
+is filled or nothing else can help:
+
+1. the local details cache (free; only entries young enough for the
+   freshness policy of every field asked for)
+2. the Partner API (details + photos; listings with a real location id)
+3. a ScrapingBee page scrape (registered by the scraping script)
+4. Grok, only as a last resort for what no other source could fill
+
+A source's expected cost is its USD price per call (the backfill planner's
+estimates) plus the observed mean latency valued at LATENCY_USD_PER_SECOND,
+divided by its observed success rate, per field it can still fill. Prices
+come from the estimates, latency and success rates from this run.
+
+A source stops being used when its quota of calls for the run is spent,
+when it raises QuotaExhausted, or after MAX_CONSECUTIVE_FAILURES failed calls
+in a row (quota errors from the provider usually look like that); the
+router then falls back to the next source automatically.
+"""
+
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from nearby_sync.backfill import LLM_ROW_COST, LISTING_URL_RE, SOURCES_BY_NAME, is_empty
+from nearby_sync.details import DetailsCache, DetailsFetcher, is_location_id
+from nearby_sync.freshness import FRESHNESS_DAYS
+from nearby_sync.grok import GrokEnricher
+
+LATENCY_USD_PER_SECOND = 0.0001     # what a second of waiting is worth against credits
+MAX_CONSECUTIVE_FAILURES = 5
+
+# Columns a field fills; the first one decides whether the field was found
+FIELD_COLUMNS = {
+    "photos": ("photo_urls", "image_url", "featured_image_url", "primary_image_url", "photo_count"),
+}
+# Passed through from any source that returns them
+IDENTITY_COLUMNS = ("tripadvisor_id", "web_url")
+
+PARTNER_API_FIELDS = frozenset({
+    "rating", "review_count", "phone_number", "website", "description",
+    "hours_of_operation", "amenities", "price_range", "photos",
+})
+LLM_FIELDS = frozenset({"hours_of_operation", "amenities", "price_range"})
+
+
+class QuotaExhausted(Exception):
+    """Raised by a source's fetch when its credits or quota are used up"""
+
+
+def field_columns(field: str) -> tuple:
+    return FIELD_COLUMNS.get(field, (field,))
+
+
+def found_fields(values: Dict, fields: Iterable[str]) -> Set[str]:
+    return {f for f in fields if not is_empty(values.get(field_columns(f)[0]), field_columns(f)[0])}
+
+
+class RouteSource:
+    """One way of getting fields for a listing, with its price and observed track record
+
+    fetch(listing, fields) returns a dict of columns ({} when the source
+    answered but had nothing) or None when the call failed.
+    """
+
+    def __init__(self, name: str, fields: Iterable[str], fetch: Callable[[Dict, Set[str]], Optional[Dict]],
+                 price: Callable[[Dict], float], requires: Optional[Callable[[Dict], bool]] = None,
+                 quota: Optional[int] = None, last_resort: bool = False, prior_latency: float = 1.0):
+        self.name = name
+        self.fields = frozenset(fields)
+        self.fetch = fetch
+        self.price = price
+        self.requires = requires
+        self.quota = quota
+        self.last_resort = last_resort
+        self.prior_latency = prior_latency
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.seconds = 0.0
+        self.spent = 0.0
+        self.fields_filled = 0
+        self.exhausted: Optional[str] = None
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace prior so a new source is neither trusted nor written off
+        return (self.successes + 1) / (self.calls + 2)
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.calls if self.calls else self.prior_latency
+
+    def available(self, listing: Dict) -> bool:
+        if self.exhausted:
+            return False
+        if self.quota is not None and self.calls >= self.quota:
+            self.exhausted = f"run quota of {self.quota} calls used"
+            return False
+        return self.requires is None or self.requires(listing)
+
+    def expected_cost(self, listing: Dict, useful_fields: int, latency_value: float) -> float:
+        per_call = self.price(listing) + latency_value * self.mean_latency
+        return per_call / self.success_rate / max(1, useful_fields)
+
+    def describe(self) -> str:
+        status = f", stopped: {self.exhausted}" if self.exhausted else ""
+        return (f"{self.name}: {self.calls} calls, {self.success_rate:.0%} success, "
+                f"{self.mean_latency * 1000:.0f}ms mean, {self.fields_filled} fields filled, "
+                f"${self.spent:.4f}{status}")
+
+
+class Routed(NamedTuple):
+    values: Dict                # columns of the filled fields (+ IDENTITY_COLUMNS)
+    filled: Dict[str, str]      # field -> source that filled it
+    missing: Set[str]
+
+
+class FetchRouter:
+    """Fill a listing's fields from the cheapest sources that can still deliver them"""
+
+    def __init__(self, sources: List[RouteSource], latency_value: float = LATENCY_USD_PER_SECOND,
+                 max_failures: int = MAX_CONSECUTIVE_FAILURES):
+        self.sources = sources
+        self.latency_value = latency_value
+        self.max_failures = max_failures
+        self.listings = 0
+        self.complete = 0
+        self.routes: Dict[str, int] = {}
+
+    def _next_source(self, listing: Dict, remaining: Set[str], tried: Set[str]) -> Optional[RouteSource]:
+        best, best_key = None, None
+        for source in self.sources:
+            useful = len(remaining & source.fields)
+            if source.name in tried or not useful or not source.available(listing):
+                continue
+            key = (source.last_resort, source.expected_cost(listing, useful, self.latency_value))
+            if best_key is None or key < best_key:
+                best, best_key = source, key
+        return best
+
+    def _call(self, source: RouteSource, listing: Dict, wanted: Set[str]) -> Optional[Dict]:
+        started = time.perf_counter()
+        try:
+            result = source.fetch(listing, wanted)
+        except QuotaExhausted as e:
+            source.exhausted = str(e) or "quota exhausted"
+            print(f"  🔀 {source.name} out of quota ({source.exhausted}), falling back")
+            return None
+        source.calls += 1
+        source.seconds += time.perf_counter() - started
+        source.spent += source.price(listing)
+
+        if result is None:
+            source.failures += 1
+            source.consecutive_failures += 1
+            if source.consecutive_failures >= self.max_failures:
+                source.exhausted = f"{source.consecutive_failures} failures in a row"
+                print(f"  🔀 {source.name} stopped after {source.exhausted}, falling back")
+            return None
+        source.consecutive_failures = 0
+        return result
+
+    def fetch(self, listing: Dict, fields: Iterable[str]) -> Routed:
+        remaining = set(fields)
+        values: Dict = {}
+        filled: Dict[str, str] = {}
+        tried: Set[str] = set()
+        self.listings += 1
+
+        while remaining:
+            source = self._next_source(listing, remaining, tried)
+            if source is None:
+                break
+            tried.add(source.name)
+            wanted = remaining & source.fields
+            result = self._call(source, listing, wanted)
+            if not result:
+                continue
+
+            got = found_fields(result, wanted)
+            if got:
+                source.successes += 1
+                source.fields_filled += len(got)
+            for field in got:
+                filled[field] = source.name
+                for column in field_columns(field):
+                    if column in result:
+                        values[column] = result[column]
+            for column in IDENTITY_COLUMNS:
+                if result.get(column) and not values.get(column):
+                    values[column] = result[column]
+            remaining -= got
+
+        if not remaining:
+            self.complete += 1
+        route = " + ".join(dict.fromkeys(filled.values())) or "nothing"
+        self.routes[route] = self.routes.get(route, 0) + 1
+        return Routed(values, filled, remaining)
+
+    def summary(self) -> List[str]:
+        lines = [f"{self.listings} listings routed, {self.complete} got every due field"]
+        lines += [source.describe() for source in self.sources]
+        lines += [f"route {route}: {n} listings" for route, n in sorted(self.routes.items(), key=lambda r: -r[1])]
+        lines.append(f"estimated spend: ${sum(source.spent for source in self.sources):.4f}")
+        return lines
+
+
+def cache_source(cache: DetailsCache) -> RouteSource:
+    """Cached Partner API details, used only when young enough for every field asked for"""
+    def fetch(listing: Dict, fields: Set[str]) -> Optional[Dict]:
+        ttl_days = min(FRESHNESS_DAYS.get(field, 0) for field in fields)
+        location_id = str(listing["tripadvisor_id"])
+        return cache.fresh([location_id], ttl_days * 86400).get(location_id, {})
+
+    return RouteSource("cache", PARTNER_API_FIELDS, fetch, price=lambda listing: 0.0,
+                       requires=lambda listing: is_location_id(listing.get("tripadvisor_id")),
+                       prior_latency=0.001)
+
+
+def partner_api_source(fetcher: DetailsFetcher, quota: Optional[int] = None) -> RouteSource:
+    """Partner API details + photos; build the fetcher with ttl_days=0, the cache source covers caching"""
+    def fetch(listing: Dict, fields: Set[str]) -> Optional[Dict]:
+        stub = {"tripadvisor_id": listing["tripadvisor_id"]}
+        fetcher.enrich([stub])
+        return stub if len(stub) > 1 else None
+
+    return RouteSource("partner_api", PARTNER_API_FIELDS, fetch,
+                       price=lambda listing: SOURCES_BY_NAME["partner_api"].cost(True),
+                       requires=lambda listing: is_location_id(listing.get("tripadvisor_id")),
+                       quota=quota, prior_latency=0.5)
+
+
+def scrape_source(scrape: Callable[[Dict, Set[str]], Optional[Dict]], fields: Iterable[str],
+                  quota: Optional[int] = None) -> RouteSource:
+    """A page scrape; pages of listings without a known URL cost the search pages too"""
+    def price(listing: Dict) -> float:
+        return SOURCES_BY_NAME["scrape"].cost(bool(LISTING_URL_RE.search(listing.get("web_url") or "")))
+
+    return RouteSource("scrape", fields, scrape, price, quota=quota, prior_latency=3.0)
+
+
+def llm_source(enricher: GrokEnricher, quota: Optional[int] = None) -> RouteSource:
+    """Grok answers for fields no listing page or API had; always tried last"""
+    def fetch(listing: Dict, fields: Set[str]) -> Optional[Dict]:
+        copy = {k: listing.get(k) for k in ("tripadvisor_id", "name", "city", "category", "location_type")}
+        enricher.enrich([copy], force=True)
+        result = {field: copy[field] for field in ("hours_of_operation", "amenities") if copy.get(field)}
+        level = copy.get("price_level")
+        if isinstance(level, int) and 1 <= level <= 4:
+            result["price_range"] = "$" * level
+        return result or None
+
+    return RouteSource("llm", LLM_FIELDS, fetch, price=lambda listing: LLM_ROW_COST,
+                       quota=quota, last_resort=True, prior_latency=2.0)
@@ -0,0 +1,189 @@
+"""
+search_stats.py
+
+Adaptive ordering of TripAdvisor search strategies.
+
+search_tripadvisor can phrase its query several ways (full name + city,
+keywords only, category + city, ...) and used to try them in a fixed order.
+Which phrasing finds the listing depends a lot on the city and category:
+long resort names often only match on their keywords, for example.
+
+SearchStats keeps, per (city, category) and strategy, how often a search
+was tried, how often it produced the match, and the credits it cost, in
+SQLite across runs. Before a search it orders the strategies by
+cost / success probability, which minimises the expected calls until the
+first match for independent attempts. It drops strategies that have
+failed often enough to be not worth a call.
+
+Rates are smoothed towards the same strategy's rate for the category in all
+cities, and that towards its rate overall, so a city seen for the first time
+still benefits from what other cities taught. Strategies nobody has tried
+keep the fixed order's position (PRIOR_RATE, stable sort).
+"""
+
+import os
+import random
+import sqlite3
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_PATH = os.getenv("TRIPADVISOR_SEARCH_STATS") or "tripadvisor_search_stats.sqlite3"
+
+# The fixed order search_tripadvisor always used
+STRATEGIES = ("name_city_country", "name_city", "keywords_city_country", "keywords_city", "category_city_country")
+
+PRIOR_RATE = 0.3
+PRIOR_WEIGHT = 5.0          # pseudo-attempts of the parent level's rate
+MIN_RATE = 0.03             # below this a strategy is pruned ...
+MIN_ATTEMPTS = 20           # ... once it was tried this often for the (city, category)
+EXPLORE = 0.05              # share of searches that still try pruned strategies
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS strategy_stats (
+    city TEXT NOT NULL,
+    category TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    credits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (city, category, strategy)
+);
+"""
+
+
+def build_queries(name: str, city: str, category: Optional[str], keywords: List[str]) -> Dict[str, str]:
+    """Query per applicable strategy, in the fixed order"""
+    queries = {
+        "name_city_country": f"{name} {city} Philippines",
+        "name_city": f"{name} {city}",
+    }
+    if keywords:
+        queries["keywords_city_country"] = f"{' '.join(keywords)} {city} Philippines"
+        queries["keywords_city"] = f"{' '.join(keywords[:2])} {city}"
+    if category:
+        queries["category_city_country"] = f"{category} {city} Philippines"
+    return queries
+
+
+def expected_calls(steps: List[Tuple[float, float]]) -> Tuple[float, float, float]:
+    """(expected calls, P(match), expected calls given a match) for ordered (rate, cost) steps"""
+    total = 0.0
+    resolved = 0.0
+    spent = 0.0
+    miss_so_far = 1.0
+    for rate, cost in steps:
+        total += cost * miss_so_far
+        spent += cost
+        resolved += rate * miss_so_far * spent
+        miss_so_far *= 1.0 - rate
+    p_match = 1.0 - miss_so_far
+    return total, p_match, resolved / p_match if p_match > 0 else 0.0
+
+
+class SearchPlan(NamedTuple):
+    order: List[Tuple[str, str]]        # (strategy, query), first to try first
+    pruned: List[str]
+    expected: float                     # expected calls until a match (given a match)
+    fixed_expected: float               # the same for the fixed order
+
+
+class SearchStats:
+    """Persistent per (city, category) strategy hit rates and costs"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, adaptive: bool = True):
+        self.conn = sqlite3.connect(path or ":memory:")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.adaptive = adaptive
+
+        self.searches = 0
+        self.resolved = 0
+        self.expected_total = 0.0
+        self.fixed_expected_total = 0.0
+        self.observed_total = 0
+        self.calls_total = 0
+        self.pruned_skips = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def _counts(self, city: str, category: str) -> Dict[str, Dict[str, Tuple[int, int, int]]]:
+        """{level: {strategy: (attempts, hits, credits)}} for the city, all cities and overall"""
+        levels = {
+            "city": ("city = ? AND category = ?", (city, category)),
+            "category": ("category = ?", (category,)),
+            "all": ("1 = 1", ()),
+        }
+        counts = {}
+        for level, (where, params) in levels.items():
+            rows = self.conn.execute(
+                f"SELECT strategy, SUM(attempts), SUM(hits), SUM(credits) FROM strategy_stats "
+                f"WHERE {where} GROUP BY strategy", params,
+            )
+            counts[level] = {strategy: (a or 0, h or 0, c or 0) for strategy, a, h, c in rows}
+        return counts
+
+    def estimates(self, city: str, category: Optional[str]) -> Dict[str, Tuple[float, float, int]]:
+        """{strategy: (success rate, credits per call, attempts in this city/category)}"""
+        counts = self._counts(city, category or "")
+        estimates = {}
+        for strategy in STRATEGIES:
+            rate, cost = PRIOR_RATE, 1.0
+            for level in ("all", "category", "city"):
+                attempts, hits, credits = counts[level].get(strategy, (0, 0, 0))
+                rate = (hits + PRIOR_WEIGHT * rate) / (attempts + PRIOR_WEIGHT)
+                if attempts:
+                    cost = credits / attempts
+            estimates[strategy] = (rate, cost, counts["city"].get(strategy, (0, 0, 0))[0])
+        return estimates
+
+    def plan(self, city: str, category: Optional[str], queries: Dict[str, str]) -> SearchPlan:
+        estimates = self.estimates(city, category)
+        fixed = [(s, q) for s, q in queries.items()]
+        fixed_expected = expected_calls([estimates[s][:2] for s, _ in fixed])[2]
+        if not self.adaptive:
+            return SearchPlan(fixed, [], fixed_expected, fixed_expected)
+
+        # Lowest cost per unit of success probability first (stable, so ties keep the fixed order)
+        order = sorted(fixed, key=lambda item: estimates[item[0]][1] / max(estimates[item[0]][0], 1e-6))
+        pruned = []
+        if random.random() >= EXPLORE:
+            kept = [(s, q) for s, q in order
+                    if not (estimates[s][2] >= MIN_ATTEMPTS and estimates[s][0] < MIN_RATE)]
+            if kept:
+                pruned = [s for s, _ in order if (s, queries[s]) not in kept]
+                order = kept
+        expected = expected_calls([estimates[s][:2] for s, _ in order])[2]
+        return SearchPlan(order, pruned, expected, fixed_expected)
+
+    def record(self, city: str, category: Optional[str], strategy: str, hit: bool, credits: int = 1):
+        self.conn.execute(
+            "INSERT INTO strategy_stats (city, category, strategy, attempts, hits, credits) VALUES (?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT (city, category, strategy) DO UPDATE SET attempts = attempts + 1, "
+            "hits = hits + excluded.hits, credits = credits + excluded.credits",
+            (city, category or "", strategy, int(hit), credits),
+        )
+
+    def finish(self, plan: SearchPlan, calls: int, resolved: bool):
+        """Close one search: commit its records and compare its calls with the plan's expectation"""
+        self.conn.commit()
+        self.searches += 1
+        self.calls_total += calls
+        self.pruned_skips += len(plan.pruned)
+        if resolved:
+            self.resolved += 1
+            self.observed_total += calls
+            self.expected_total += plan.expected
+            self.fixed_expected_total += plan.fixed_expected
+
+    def summary(self) -> List[str]:
+        mode = "adaptive order" if self.adaptive else "fixed order"
+        lines = [f"{self.searches} searches ({mode}), {self.resolved} resolved, {self.calls_total} search calls, "
+                 f"{self.pruned_skips} strategy attempts pruned"]
+        if self.resolved:
+            lines.append(
+                f"calls per resolved listing: expected {self.expected_total / self.resolved:.2f}, "
+                f"observed {self.observed_total / self.resolved:.2f} "
+                f"(fixed order expected {self.fixed_expected_total / self.resolved:.2f})"
+            )
+        return lines
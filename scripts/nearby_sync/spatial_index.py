@@ -0,0 +1,324 @@
+"""
+spatial_index.py
+
+"What's near this point" over a snapshot of nearby_listings.
+
+SpatialIndex buckets the listings that have precise coordinates (not the
+country-centroid fallback) into a fixed grid of cell_deg-degree cells and
+keeps every column sorted by cell, CSR style: cell_keys holds the occupied
+cell ids in order and cell_offsets the position of each cell's first point,
+so the points of any set of cells are a few array slices.
+
+Queries are batched. They are grouped by the cell they fall in; each group
+gathers the candidates of the surrounding cells once, drops those failing
+the category / minimum rating filter, and computes one (queries x
+candidates) matrix of squared chord lengths between unit vectors. Chords
+order points exactly like great-circle distance at a fraction of the cost
+of haversine; only the results are converted to meters:
+
+- radius(): every listing within radius_m of each query, nearest first
+- knn(): the k nearest per query; the searched square of cells grows ring by
+  ring until the k-th distance lies inside what the square is known to cover
+
+save() writes one .npy file per column plus meta.json into a directory;
+load() memory-maps them (mmap_mode="r"), so opening a 1M-point index costs
+nothing until queries touch its pages.
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from nearby_sync.geo import EARTH_RADIUS_M, precise_coords
+
+DEFAULT_CELL_DEG = 0.05         # ~5.5km cells
+DEFAULT_PATH = os.getenv("NEARBY_SPATIAL_INDEX") or "nearby_spatial_index"
+MAX_PAIRS = 4_000_000           # distance matrix entries computed at once
+M_PER_DEG = 111_320.0
+
+COLUMNS = ("ids", "lat", "lng", "rating", "category_codes", "cells", "cell_keys", "cell_offsets")
+SELECT_COLUMNS = "id,latitude,longitude,rating,location_type,category"
+
+Categories = Union[None, str, Iterable[str]]
+
+
+def category_key(value: Optional[str]) -> str:
+    return (value or "").strip().casefold()
+
+
+def row_category(row: Dict) -> str:
+    """The listing kind queries filter on: location_type ("Attraction"), else category"""
+    return category_key(row.get("location_type") or row.get("category"))
+
+
+def _unit_vectors(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    lat, lng = np.radians(lat), np.radians(lng)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def _chord2(meters: float) -> float:
+    """Squared chord length (unit sphere) of a great-circle distance"""
+    return (2.0 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2.0)) ** 2
+
+
+def _meters(chord2: np.ndarray) -> np.ndarray:
+    """Great-circle meters of squared chord lengths (inf stays inf)"""
+    with np.errstate(invalid="ignore"):
+        meters = 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(chord2, 4.0)) / 2.0)
+    return np.where(np.isfinite(chord2), meters, np.inf)
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class Neighbors(NamedTuple):
+    rows: np.ndarray        # index positions (-1 = none); index.ids[rows] are listing ids
+    meters: np.ndarray      # distances (inf where rows is -1)
+
+
+class SpatialIndex:
+    """Grid-bucketed listing coordinates with batched, filtered radius and k-NN queries"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Tuple[str, ...], cell_deg: float,
+                 built_at: Optional[str] = None):
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+        self.categories = tuple(categories)
+        self.cell_deg = float(cell_deg)
+        self.n_cols = int(math.ceil(360.0 / self.cell_deg))
+        self.built_at = built_at or datetime.now().isoformat()
+        self._category_index = {category: i for i, category in enumerate(self.categories)}
+
+        if len(self.cell_keys):
+            rows, cols = np.divmod(np.asarray(self.cell_keys), self.n_cols)
+            self._row_range = (int(rows.min()), int(rows.max()))
+            self._col_range = (int(cols.min()), int(cols.max()))
+
+    @classmethod
+    def build(cls, ids, lat, lng, categories: Iterable[str], rating=None,
+              cell_deg: float = DEFAULT_CELL_DEG) -> "SpatialIndex":
+        """Index from column arrays; points without precise coordinates are left out"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        keep = precise_coords(lat, lng) if len(lat) else np.zeros(0, dtype=bool)
+        rating = np.full(len(lat), np.nan, dtype=np.float32) if rating is None else np.asarray(rating, np.float32)
+        labels = np.array([category_key(c) for c in categories], dtype=object)
+
+        categories_seen, codes = np.unique(labels[keep].astype(str), return_inverse=True) \
+            if keep.any() else (np.array([], dtype=str), np.zeros(0, dtype=np.int64))
+        lat, lng = lat[keep], lng[keep]
+        n_cols = int(math.ceil(360.0 / cell_deg))
+        cells = (np.floor((lat + 90.0) / cell_deg).astype(np.int64) * n_cols
+                 + np.floor((lng + 180.0) / cell_deg).astype(np.int64))
+        order = np.argsort(cells, kind="stable")
+        cells = cells[order]
+        cell_keys, starts = np.unique(cells, return_index=True)
+
+        columns = {
+            "ids": np.asarray(ids, dtype=np.int64)[keep][order],
+            "lat": lat[order],
+            "lng": lng[order],
+            "rating": rating[keep][order],
+            "category_codes": codes.astype(np.int16)[order],
+            "cells": cells,
+            "cell_keys": cell_keys,
+            "cell_offsets": np.append(starts, len(cells)).astype(np.int64),
+        }
+        return cls(columns, tuple(str(c) for c in categories_seen), cell_deg)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], cell_deg: float = DEFAULT_CELL_DEG) -> "SpatialIndex":
+        """Index over nearby_listings rows (SELECT_COLUMNS)"""
+        return cls.build(
+            [int(r["id"]) for r in rows],
+            [_to_float(r.get("latitude", r.get("lat"))) for r in rows],
+            [_to_float(r.get("longitude", r.get("lng"))) for r in rows],
+            [row_category(r) for r in rows],
+            [_to_float(r.get("rating")) for r in rows],
+            cell_deg=cell_deg,
+        )
+
+    def save(self, path: str = DEFAULT_PATH):
+        os.makedirs(path, exist_ok=True)
+        for name in COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"cell_deg": self.cell_deg, "categories": list(self.categories),
+                       "points": len(self), "built_at": self.built_at}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH, mmap: bool = True) -> "SpatialIndex":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                   for name in COLUMNS}
+        return cls(columns, tuple(meta["categories"]), meta["cell_deg"], meta.get("built_at"))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # -- query helpers ------------------------------------------------------
+
+    def _query_cells(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (np.floor((lat + 90.0) / self.cell_deg).astype(np.int64),
+                np.floor((lng + 180.0) / self.cell_deg).astype(np.int64))
+
+    def _gather(self, row: int, col: int, row_span: int, col_span: int) -> np.ndarray:
+        """Positions of the points in the cells within row_span / col_span of (row, col)"""
+        r0, r1 = max(row - row_span, self._row_range[0]), min(row + row_span, self._row_range[1])
+        c0, c1 = max(col - col_span, self._col_range[0]), min(col + col_span, self._col_range[1])
+        if r0 > r1 or c0 > c1:
+            return np.zeros(0, dtype=np.int64)
+        # Each grid row of the square is one contiguous run of cell ids
+        lo = np.arange(r0, r1 + 1, dtype=np.int64) * self.n_cols
+        first = np.searchsorted(self.cell_keys, lo + c0, side="left")
+        last = np.searchsorted(self.cell_keys, lo + c1, side="right")
+        starts = self.cell_offsets[first]
+        lengths = self.cell_offsets[last] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+    def _filter(self, positions: np.ndarray, codes: Optional[np.ndarray], min_rating: Optional[float]) -> np.ndarray:
+        keep = np.ones(len(positions), dtype=bool)
+        if codes is not None:
+            keep &= np.isin(self.category_codes[positions], codes)
+        if min_rating is not None:
+            keep &= self.rating[positions] >= min_rating     # NaN ratings never pass
+        return positions[keep]
+
+    def _category_codes(self, category: Categories) -> Optional[np.ndarray]:
+        if category is None:
+            return None
+        wanted = [category] if isinstance(category, str) else list(category)
+        return np.array([self._category_index[c] for c in map(category_key, wanted) if c in self._category_index],
+                        dtype=np.int16)
+
+    def _groups(self, lat: np.ndarray, lng: np.ndarray):
+        """(query indexes, grid row, grid col) per occupied query cell, valid coordinates only"""
+        ok = np.flatnonzero(np.isfinite(lat) & np.isfinite(lng))
+        if not len(ok) or not len(self):
+            return
+        rows, cols = self._query_cells(lat[ok], lng[ok])
+        keys = rows * self.n_cols + cols
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for group in np.split(np.arange(len(keys)), bounds):
+            first = order[group[0]]
+            yield ok[order[group]], int(rows[first]), int(cols[first])
+
+    def _spans(self, lat_abs_max: float, meters: float) -> Tuple[int, int]:
+        """Cells to search around a query cell so that meters in every direction is covered"""
+        dlat = meters / M_PER_DEG
+        cos = math.cos(math.radians(min(89.0, lat_abs_max + dlat)))
+        return int(math.ceil(dlat / self.cell_deg)), int(math.ceil(dlat / max(cos, 1e-6) / self.cell_deg))
+
+    def _distances(self, lat: np.ndarray, lng: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """(queries x positions) squared chord lengths"""
+        q = _unit_vectors(lat, lng)
+        p = _unit_vectors(self.lat[positions], self.lng[positions])
+        chord2 = np.square(q[:, 0, None] - p[None, :, 0])
+        chord2 += np.square(q[:, 1, None] - p[None, :, 1])
+        chord2 += np.square(q[:, 2, None] - p[None, :, 2])
+        return chord2
+
+    def _nearest(self, lat: np.ndarray, lng: np.ndarray, queries: np.ndarray, candidates: np.ndarray, take: int,
+                 max_radius_m: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """The take nearest candidates per query, nearest first, -1 / inf beyond max_radius_m"""
+        rows = np.full((len(queries), take), -1, dtype=np.int64)
+        meters = np.full((len(queries), take), np.inf)
+        if not take:
+            return rows, meters
+        step = max(1, MAX_PAIRS // len(candidates))
+        for start in range(0, len(queries), step):
+            chunk = slice(start, start + step)
+            distances = self._distances(lat[queries[chunk]], lng[queries[chunk]], candidates)
+            if max_radius_m is not None:
+                distances[distances > _chord2(max_radius_m)] = np.inf
+            nearest = np.argpartition(distances, take - 1, axis=1)[:, :take] if take < len(candidates) else \
+                np.broadcast_to(np.arange(take), (len(distances), take))
+            near_m = np.take_along_axis(distances, nearest, axis=1)
+            order = np.argsort(near_m, axis=1, kind="stable")
+            near_m = np.take_along_axis(near_m, order, axis=1)
+            found = np.isfinite(near_m)
+            rows[chunk] = np.where(found, candidates[np.take_along_axis(nearest, order, axis=1)], -1)
+            meters[chunk] = _meters(near_m)
+        return rows, meters
+
+    # -- queries ------------------------------------------------------------
+
+    def radius(self, lat, lng, radius_m: float, category: Categories = None, min_rating: Optional[float] = None,
+               limit: Optional[int] = None) -> List[Neighbors]:
+        """Listings within radius_m of each query point, nearest first (at most limit)"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        empty = Neighbors(np.zeros(0, dtype=np.int64), np.zeros(0))
+        results = [empty] * len(lat)
+        codes = self._category_codes(category)
+
+        for queries, row, col in self._groups(lat, lng):
+            row_span, col_span = self._spans(float(np.abs(lat[queries]).max()), radius_m)
+            candidates = self._filter(self._gather(row, col, row_span, col_span), codes, min_rating)
+            if not len(candidates):
+                continue
+            step = max(1, MAX_PAIRS // len(candidates))
+            for start in range(0, len(queries), step):
+                chunk = queries[start:start + step]
+                distances = self._distances(lat[chunk], lng[chunk], candidates)
+                for q, d in zip(chunk, distances):
+                    within = np.flatnonzero(d <= _chord2(radius_m))
+                    order = within[np.argsort(d[within], kind="stable")][:limit]
+                    results[q] = Neighbors(candidates[order], _meters(d[order]))
+        return results
+
+    def knn(self, lat, lng, k: int, category: Categories = None, min_rating: Optional[float] = None,
+            max_radius_m: Optional[float] = None) -> Neighbors:
+        """The k nearest listings per query point as (queries, k) arrays, padded with -1 / inf"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        out_rows = np.full((len(lat), k), -1, dtype=np.int64)
+        out_m = np.full((len(lat), k), np.inf)
+        codes = self._category_codes(category)
+        if k <= 0:
+            return Neighbors(out_rows, out_m)
+
+        for queries, row, col in self._groups(lat, lng):
+            lat_abs = float(np.abs(lat[queries]).max())
+            # Whole index covered once the square spans every occupied row and column
+            full_ring = max(row - self._row_range[0], self._row_range[1] - row,
+                            col - self._col_range[0], self._col_range[1] - col)
+            ring = 1
+            pending = queries
+            while len(pending):
+                covered = ring * self.cell_deg * M_PER_DEG * math.cos(
+                    math.radians(min(89.0, lat_abs + (ring + 1) * self.cell_deg)))
+                last = ring >= full_ring or (max_radius_m is not None and covered >= max_radius_m)
+                candidates = self._filter(self._gather(row, col, ring, ring), codes, min_rating)
+                if len(candidates) >= k or last:
+                    take = min(k, len(candidates))
+                    rows, meters = self._nearest(lat, lng, pending, candidates, take, max_radius_m)
+                    # Settled when the k-th neighbour is closer than anything outside the square can be
+                    settled = np.ones(len(pending), dtype=bool) if last else (meters[:, -1] <= covered)
+                    out_rows[pending[settled], :take] = rows[settled]
+                    out_m[pending[settled], :take] = meters[settled]
+                    pending = pending[~settled]
+                ring *= 2
+        return Neighbors(out_rows, out_m)
+
+    def summary(self) -> str:
+        occupied = len(self.cell_keys)
+        per_cell = len(self) / occupied if occupied else 0.0
+        return (f"{len(self)} points in {occupied} cells of {self.cell_deg}° ({per_cell:.1f} per cell, "
+                f"max {int(np.diff(self.cell_offsets).max()) if occupied else 0}), "
+                f"{len(self.categories)} categories, built {self.built_at}")
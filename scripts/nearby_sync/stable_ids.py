@@ -0,0 +1,88 @@
+"""
+stable_ids.py
+
+Deterministic, content-derived ids and coordinate jitter for nearby_listings.
+
+Every value is a keyed BLAKE2b hash of the source identity (name, city,
+address, URL...), so re-running a sync produces the same ids and the same
+coordinates and upserts become no-ops. Python's hash() is salted per
+process and uuid4()/random are different on every run, so neither may be
+used for stored values.
+
+The key comes from NEARBY_ID_KEY. Changing it changes every derived id, so
+only do that together with a full refetch.
+"""
+
+import hashlib
+import os
+from typing import Optional, Tuple
+
+from nearby_sync.matching import normalize_name
+
+DEFAULT_KEY = "nearby_listings/v1"
+ID_KEY = (os.getenv("NEARBY_ID_KEY") or DEFAULT_KEY).encode("utf-8")[:64]
+
+# Prefix of synthetic tripadvisor_ids (rows without a real TripAdvisor location id)
+SYNTHETIC_ID_PREFIX = "php_"
+
+# Default jitter radius in degrees (~55m), same spread the scrapers used before
+JITTER_DEGREES = 0.0005
+
+BASE32 = "0123456789abcdefghijklmnopqrstuv"
+
+
+def _identity(parts) -> bytes:
+    """Canonical byte string for identity parts (None and case/accents ignored)"""
+    normalized = []
+    for part in parts:
+        if part is None:
+            normalized.append("")
+        elif isinstance(part, float):
+            normalized.append(f"{part:.6f}")
+        elif isinstance(part, str):
+            normalized.append(normalize_name(part) or part.strip().lower())
+        else:
+            normalized.append(str(part))
+    return "\x1f".join(normalized).encode("utf-8")
+
+
+def stable_digest(namespace: str, *parts, size: int = 16) -> bytes:
+    """Keyed BLAKE2b digest of a namespace plus identity parts"""
+    h = hashlib.blake2b(key=ID_KEY, digest_size=size, person=namespace.encode("utf-8")[:16])
+    h.update(_identity(parts))
+    return h.digest()
+
+
+def stable_int(namespace: str, *parts, modulo: Optional[int] = None) -> int:
+    """Deterministic non-negative integer, optionally reduced modulo"""
+    value = int.from_bytes(stable_digest(namespace, *parts, size=8), "big") >> 1
+    return value % modulo if modulo else value
+
+
+
+def stable_listing_id(name: str, city: Optional[str] = None, *extra) -> str:
+    """Synthetic tripadvisor_id (php_xxxxxxxx) for a listing without a location id
+
+    extra can carry anything else that identifies the place (address,
+    coordinates, source URL) to keep same-named places apart.
+    """
+    value = int.from_bytes(stable_digest("listing", name, city, *extra, size=5), "big")
+    chars = []
+    for _ in range(8):
+        chars.append(BASE32[value & 31])
+        value >>= 5
+    return SYNTHETIC_ID_PREFIX + "".join(chars)
+
+
+def jitter_offsets(*parts, radius: float = JITTER_DEGREES) -> Tuple[float, float]:
+    """Deterministic (dlat, dlng) offsets in [-radius, radius]"""
+    digest = stable_digest("jitter", *parts, size=8)
+    u_lat = int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+    u_lng = int.from_bytes(digest[4:], "big") / 0xFFFFFFFF
+    return (2.0 * u_lat - 1.0) * radius, (2.0 * u_lng - 1.0) * radius
+
+
+def jitter_coords(lat: float, lng: float, *parts, radius: float = JITTER_DEGREES) -> Tuple[float, float]:
+    """Spread listings that share a fallback coordinate, identically on every run"""
+    dlat, dlng = jitter_offsets(*parts, radius=radius)
+    return round(lat + dlat, 7), round(lng + dlng, 7)
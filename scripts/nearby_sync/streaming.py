@@ -0,0 +1,128 @@
+"""
+streaming.py
+
+Streaming dedup and write-as-you-go batching for discovery sweeps.
+
+Sweeps used to keep every result of every query in memory and dedup and
+write only at the end. Instead:
+
+- SeenIds drops repeated ids the moment they arrive. It is an exact set by
+  default; given an expected size it switches to a Bloom filter whose memory
+  is fixed up front (~1.2 bytes per id at a 0.1% false positive rate). A
+  false positive makes the sweep skip a listing it has not seen, so only use
+  it for sweeps too large for a set.
+- BatchWriter buffers unique rows and hands them to a flush function in
+  batches during the sweep, so a crash loses at most one batch.
+"""
+
+import hashlib
+import math
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys (NumPy bit array, double hashing)"""
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return np.array([(h1 + i * h2) % self.size for i in range(self.hashes)], dtype=np.int64)
+
+    def add(self, key: str) -> bool:
+        """Insert key; True if it was (probably) not present before"""
+        pos = self._positions(key)
+        byte, mask = pos >> 3, (1 << (pos & 7)).astype(np.uint8)
+        present = bool(np.all(self.bits[byte] & mask))
+        np.bitwise_or.at(self.bits, byte, mask)
+        return not present
+
+    def __contains__(self, key: str) -> bool:
+        pos = self._positions(key)
+        return bool(np.all(self.bits[pos >> 3] & (1 << (pos & 7)).astype(np.uint8)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+
+class SeenIds:
+    """Ids already emitted by a sweep: exact set, or a Bloom filter when expected is given"""
+
+    def __init__(self, expected: Optional[int] = None, error_rate: float = DEFAULT_ERROR_RATE):
+        self.bloom = BloomFilter(expected, error_rate) if expected else None
+        self.exact = set() if not expected else None
+        self.added = 0
+        self.repeats = 0
+
+    def add(self, key) -> bool:
+        """Record key; True the first time it is seen"""
+        key = str(key)
+        if self.bloom is not None:
+            new = self.bloom.add(key)
+        else:
+            new = key not in self.exact
+            if new:
+                self.exact.add(key)
+        if new:
+            self.added += 1
+        else:
+            self.repeats += 1
+        return new
+
+    def __contains__(self, key) -> bool:
+        key = str(key)
+        return key in self.bloom if self.bloom is not None else key in self.exact
+
+    def __len__(self) -> int:
+        return self.added
+
+    def describe(self) -> str:
+        if self.bloom is not None:
+            return f"Bloom filter ({self.bloom.nbytes / 1024:.0f} KiB, {self.bloom.hashes} hashes)"
+        return "exact set"
+
+
+class BatchWriter:
+    """Buffer rows and pass them to flush_fn in batches; flush_fn returns rows written"""
+
+    def __init__(self, flush_fn: Callable[[List[Dict]], int], batch_size: int = DEFAULT_BATCH_SIZE):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.buffer: List[Dict] = []
+        self.written = 0
+        self.batches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, row: Dict):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows: List[Dict]):
+        for row in rows:
+            self.add(row)
+
+    def flush(self) -> int:
+        if not self.buffer:
+            return 0
+        batch, self.buffer = self.buffer, []
+        written = self.flush_fn(batch) or 0
+        self.written += written
+        self.batches += 1
+        return written
@@ -0,0 +1,234 @@
+"""
+tiles.py
+
+Geo-tiled discovery over the Philippines with adaptive quadtree subdivision.
+
+The bounding box is cut into root tiles small enough that one nearby search
+(centre + radius) covers a whole tile. A sweep starts from seed points
+(coordinates of listings we already know), queries each tile once and:
+
+- splits a tile into 4 children when its results hit the page cap, so
+  dense areas are searched at finer resolution;
+- enqueues the 8 neighbouring root tiles of every root tile that returned
+  anything, so coverage grows across populated land between known cities
+  and stops at empty sea.
+
+Tiles run concurrently; outcomes are recorded in a JSON tile-state store so
+an interrupted sweep resumes by replaying recorded tiles without API calls.
+"""
+
+import json
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# lat_min, lng_min, lat_max, lng_max
+PH_BBOX = (4.5, 116.9, 21.2, 126.7)
+
+ROOT_TILE_DEG = 0.3             # ~33km; half-diagonal stays under MAX_RADIUS_KM
+MAX_RADIUS_KM = 25.0            # largest radius the nearby search accepts
+MAX_DEPTH = 6                   # 0.3° / 2^6 ≈ 500m
+KM_PER_DEG = 111.32
+
+
+class Tile(NamedTuple):
+    key: str
+    lat_min: float
+    lng_min: float
+    lat_max: float
+    lng_max: float
+    depth: int = 0
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return (self.lat_min + self.lat_max) / 2.0, (self.lng_min + self.lng_max) / 2.0
+
+    @property
+    def radius_km(self) -> float:
+        """Distance from the centre to a corner, capped at MAX_RADIUS_KM"""
+        lat, _ = self.center
+        dlat = (self.lat_max - self.lat_min) / 2.0 * KM_PER_DEG
+        dlng = (self.lng_max - self.lng_min) / 2.0 * KM_PER_DEG * math.cos(math.radians(lat))
+        return min(MAX_RADIUS_KM, math.hypot(dlat, dlng))
+
+    def children(self) -> List["Tile"]:
+        lat_mid, lng_mid = self.center
+        return [
+            Tile(self.key + "0", self.lat_min, self.lng_min, lat_mid, lng_mid, self.depth + 1),
+            Tile(self.key + "1", self.lat_min, lng_mid, lat_mid, self.lng_max, self.depth + 1),
+            Tile(self.key + "2", lat_mid, self.lng_min, self.lat_max, lng_mid, self.depth + 1),
+            Tile(self.key + "3", lat_mid, lng_mid, self.lat_max, self.lng_max, self.depth + 1),
+        ]
+
+
+class TileGrid:
+    """Root tiles of a bounding box, addressed by (row, col)"""
+
+    def __init__(self, bbox: Tuple[float, float, float, float] = PH_BBOX, size: float = ROOT_TILE_DEG):
+        self.lat_min, self.lng_min, self.lat_max, self.lng_max = bbox
+        self.size = size
+        self.rows = int(math.ceil((self.lat_max - self.lat_min) / size))
+        self.cols = int(math.ceil((self.lng_max - self.lng_min) / size))
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def cell(self, lat: float, lng: float) -> Optional[Tuple[int, int]]:
+        row = int((lat - self.lat_min) // self.size)
+        col = int((lng - self.lng_min) // self.size)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def root(self, row: int, col: int) -> Tile:
+        lat = self.lat_min + row * self.size
+        lng = self.lng_min + col * self.size
+        return Tile(f"r{row}c{col}:", lat, lng, lat + self.size, lng + self.size, 0)
+
+    def neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
+        return [
+            (row + dr, col + dc)
+            for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+            if (dr or dc) and 0 <= row + dr < self.rows and 0 <= col + dc < self.cols
+        ]
+
+    def all_cells(self) -> List[Tuple[int, int]]:
+        return [(r, c) for r in range(self.rows) for c in range(self.cols)]
+
+    @staticmethod
+    def parse_root(key: str) -> Tuple[int, int]:
+        row, col = key.split(":", 1)[0][1:].split("c")
+        return int(row), int(col)
+
+
+class TileStateStore:
+    """JSON file of tile outcomes: {key: {"count": n, "split": bool}}"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.states: Dict[str, Dict] = {}
+        if self.path and self.path.exists():
+            self.states = json.loads(self.path.read_text(encoding="utf-8")).get("tiles", {})
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.states.get(key)
+
+    def record(self, key: str, count: int, split: bool):
+        self.states[key] = {"count": count, "split": split}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"tiles": self.states}))
+        os.replace(tmp, self.path)
+
+
+class TileSweep:
+    """Concurrent adaptive sweep; search_fn(tile) returns that tile's raw results"""
+
+    def __init__(self, search_fn: Callable[[Tile], List[Dict]], page_cap: int,
+                 grid: Optional[TileGrid] = None, store: Optional[TileStateStore] = None,
+                 max_depth: int = MAX_DEPTH, workers: int = 8, expand: bool = True,
+                 save_every: int = 25, before_save: Optional[Callable[[], None]] = None):
+        self.search_fn = search_fn
+        self.page_cap = page_cap
+        self.grid = grid or TileGrid()
+        self.store = store or TileStateStore(None)
+        self.max_depth = max_depth
+        self.workers = workers
+        self.expand = expand
+        self.save_every = save_every
+        # Called before tile outcomes are saved: flush whatever buffers the
+        # tiles' results, or --resume skips tiles whose listings were never written
+        self.before_save = before_save
+
+        self.calls = 0
+        self.replayed = 0
+        self.splits = 0
+        self.failed = 0
+
+    def seed_cells(self, points: Iterable[Tuple[float, float]]) -> List[Tuple[int, int]]:
+        cells = []
+        seen = set()
+        for lat, lng in points:
+            cell = self.grid.cell(lat, lng)
+            if cell and cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+        return cells
+
+    def run(self, seeds: Iterable[Tuple[int, int]],
+            on_results: Callable[[Tile, List[Dict]], None],
+            on_progress: Optional[Callable[[Tile, int, bool], None]] = None):
+        """Sweep from seed root cells; on_results gets each tile's results in the calling thread"""
+        queued_roots = set()
+        pending: List[Tile] = []
+
+        def enqueue_root(cell):
+            if cell not in queued_roots:
+                queued_roots.add(cell)
+                pending.append(self.grid.root(*cell))
+
+        for cell in seeds:
+            enqueue_root(cell)
+
+        def outcome(tile: Tile, count: int, split: bool):
+            if split:
+                self.splits += 1
+                pending.extend(tile.children())
+            if self.expand and tile.depth == 0 and count > 0:
+                for cell in self.grid.neighbors(*TileGrid.parse_root(tile.key)):
+                    enqueue_root(cell)
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while pending or running:
+                # Replay tiles the store already has, submit the rest
+                while pending and len(running) < self.workers * 2:
+                    tile = pending.pop()
+                    state = self.store.get(tile.key)
+                    if state is not None:
+                        self.replayed += 1
+                        outcome(tile, state["count"], state["split"])
+                        continue
+                    running[pool.submit(self.search_fn, tile)] = tile
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tile = running.pop(future)
+                    self.calls += 1
+                    try:
+                        results = future.result() or []
+                    except Exception:
+                        # Not recorded, so a resumed sweep retries it
+                        self.failed += 1
+                        continue
+
+                    split = len(results) >= self.page_cap and tile.depth < self.max_depth
+                    on_results(tile, results)
+                    self.store.record(tile.key, len(results), split)
+                    outcome(tile, len(results), split)
+                    if on_progress:
+                        on_progress(tile, len(results), split)
+
+                    completed += 1
+                    if completed % self.save_every == 0:
+                        self._save()
+
+        self._save()
+
+    def _save(self):
+        if self.before_save:
+            self.before_save()
+        self.store.save()
+
+    def summary(self) -> str:
+        return (f"{self.calls} tile searches, {self.replayed} replayed from state, "
+                f"{self.splits} splits, {self.failed} failed")
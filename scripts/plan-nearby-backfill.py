@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+plan-nearby-backfill.py
+
+Gap-targeted backfill for nearby_listings:
+1. Load the columns the planner needs (Supabase, local replica or a JSON backup)
+2. Build the missing-field matrix and group rows by their exact missing set
+3. Route each group to the cheapest source that can fill it (Partner API
+   details, one detail-page scrape, or Grok) and print a heatmap, the
+   largest groups and the estimated cost per source -- nothing is spent yet
+4. With --apply, fill the Partner API and Grok groups directly and write the
+   scrape group as a plan for sync-tripadvisor-real-data.py --plan
+
+Run with:
+    python scripts/plan-nearby-backfill.py                        # plan + heatmap only
+    python scripts/plan-nearby-backfill.py --replica               # local replica, pull only changes
+    python scripts/plan-nearby-backfill.py --apply --max-cost 5    # spend, refusing plans above $5
+    python scripts/sync-tripadvisor-real-data.py --plan nearby_backfill_scrape.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Dict
+from datetime import datetime
+from pathlib import Path
+
+from supabase import create_client, Client
+
+from nearby_sync.backfill import SELECT_COLUMNS, SOURCES, SOURCES_BY_NAME, BackfillPlan
+from nearby_sync.details import DEFAULT_CACHE_PATH as DETAILS_CACHE_PATH, DetailsCache, DetailsFetcher
+from nearby_sync.grok import PROMPT_VERSION, GrokEnricher
+from nearby_sync.llm_cache import LLMCache
+from nearby_sync.partner_api import PartnerApiClient, parse_api_keys
+from nearby_sync.patches import PatchWriter
+from nearby_sync.replica import DEFAULT_PATH as REPLICA_FILE, ListingReplica
+
+PLAN_FILE = "nearby_backfill_plan.json"
+SCRAPE_PLAN_FILE = "nearby_backfill_scrape.json"
+CHUNK_SIZE = 200
+
+# Filling photo_urls also sets the image columns derived from it
+RELATED_COLUMNS = {"photo_urls": ["image_url", "featured_image_url", "primary_image_url", "photo_count"]}
+
+
+def fetch_all_rows(supabase: Client) -> List[Dict]:
+    """Page through nearby_listings selecting only the columns the planner needs"""
+    rows = []
+    page = 0
+    page_size = 1000
+
+    while True:
+        response = supabase.table("nearby_listings").select(SELECT_COLUMNS).range(
+            page * page_size, (page + 1) * page_size - 1
+        ).execute()
+        data = response.data or []
+        rows.extend(data)
+
+        if len(data) < page_size:
+            break
+        page += 1
+
+    return rows
+
+
+def planned_patch(filled: Dict, fields: List[str]) -> Dict:
+    """Only the planned fields (and columns derived from them) that were actually filled"""
+    patch = {}
+    for field in fields:
+        for column in [field] + RELATED_COLUMNS.get(field, []):
+            if filled.get(column) not in (None, "", [], {}):
+                patch[column] = filled[column]
+    return patch
+
+
+def apply_partner_api(plan: BackfillPlan, writer: PatchWriter, args) -> int:
+    keys = parse_api_keys(os.getenv("VITE_TRIPADVISOR") or os.getenv("TRIPADVISOR"))
+    if not keys:
+        print("  ⚠️  No TripAdvisor API key, skipping the Partner API group", file=sys.stderr)
+        return 0
+
+    assignments = plan.assignments("partner_api")
+    patched = 0
+    client = PartnerApiClient(keys)
+    with DetailsFetcher(client, DetailsCache(args.details_cache), workers=args.workers) as details:
+        for i in range(0, len(assignments), CHUNK_SIZE):
+            chunk = assignments[i:i + CHUNK_SIZE]
+            stubs = [{"tripadvisor_id": row["tripadvisor_id"]} for row, _ in chunk]
+            details.enrich(stubs)
+            for (row, fields), filled in zip(chunk, stubs):
+                patch = planned_patch(filled, fields)
+                if patch:
+                    writer.add(row["id"], patch)
+                    patched += 1
+            print(f"  ✓ Partner API: {min(i + CHUNK_SIZE, len(assignments))}/{len(assignments)} rows")
+        for line in details.summary():
+            print(f"    {line}")
+    return patched
+
+
+def apply_llm(plan: BackfillPlan, writer: PatchWriter, args) -> int:
+    grok_key = os.getenv("X_API_KEY")
+    if not grok_key:
+        print("  ⚠️  No X_API_KEY, skipping the Grok group", file=sys.stderr)
+        return 0
+
+    assignments = plan.assignments("llm")
+    patched = 0
+    grok = GrokEnricher(grok_key, cache=LLMCache(version=PROMPT_VERSION))
+    for i in range(0, len(assignments), CHUNK_SIZE):
+        chunk = assignments[i:i + CHUNK_SIZE]
+        copies = [{k: row.get(k) for k in ("tripadvisor_id", "name", "city", "category", "location_type")}
+                  for row, _ in chunk]
+        grok.enrich(copies, force=True)
+        for (row, fields), filled in zip(chunk, copies):
+            patch = planned_patch(filled, fields)
+            if patch:
+                writer.add(row["id"], patch)
+                patched += 1
+        print(f"  ✓ Grok: {min(i + CHUNK_SIZE, len(assignments))}/{len(assignments)} rows")
+    for line in grok.summary():
+        print(f"    {line}")
+    return patched
+
+
+def write_scrape_plan(plan: BackfillPlan, path: str) -> int:
+    entries = [{"id": row["id"], "fields": fields} for row, fields in plan.assignments("scrape")]
+    Path(path).write_text(json.dumps({"generated_at": datetime.now().isoformat(), "rows": entries}, indent=2))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan and run a gap-targeted nearby_listings backfill")
+    parser.add_argument("--input", type=str, help="Read rows from a JSON backup instead of Supabase")
+    parser.add_argument("--replica", nargs="?", const=REPLICA_FILE, default=None,
+                        help="Read rows from a local replica, pulling only changed rows")
+    parser.add_argument("--output", type=str, default=PLAN_FILE, help="Where to write the plan")
+    parser.add_argument("--top", type=int, default=15, help="Largest groups to print")
+    parser.add_argument("--apply", action="store_true",
+                        help="Fill the Partner API and Grok groups and write the scrape plan")
+    parser.add_argument("--max-cost", type=float, default=None,
+                        help="With --apply, refuse to run plans estimated above this many USD")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent Partner API requests")
+    parser.add_argument("--details-cache", type=str, default=DETAILS_CACHE_PATH, help="Partner API details cache file")
+    parser.add_argument("--batch-size", type=int, default=500, help="Listing updates sent per bulk patch request")
+    args = parser.parse_args()
+
+    supabase = None
+    if args.apply or not args.input:
+        supabase_url = os.getenv("VITE_PROJECT_URL") or os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not supabase_key:
+            print("❌ Missing Supabase environment variables", file=sys.stderr)
+            sys.exit(1)
+        supabase = create_client(supabase_url, supabase_key)
+
+    print("=" * 100)
+    print("NEARBY_LISTINGS BACKFILL PLAN")
+    print("=" * 100)
+
+    if args.input:
+        rows = json.loads(Path(args.input).read_text(encoding="utf-8"))
+        print(f"\n📥 Loaded {len(rows)} rows from {args.input}")
+    elif args.replica:
+        replica = ListingReplica(args.replica)
+        replica.refresh(supabase)
+        rows = list(replica.iter_rows(SELECT_COLUMNS.split(",")))
+        print(f"  ✅ {len(rows)} rows from {args.replica}")
+    else:
+        print("\n📥 Fetching nearby_listings from Supabase...")
+        rows = fetch_all_rows(supabase)
+        print(f"  ✅ {len(rows)} rows")
+
+    started = time.perf_counter()
+    plan = BackfillPlan(rows)
+    planned = time.perf_counter() - started
+
+    print(f"\n🌡️  MISSING FIELDS (% of rows; {len(rows)} rows, planned in {planned * 1000:.0f}ms)\n")
+    for line in plan.heatmap():
+        print(f"  {line}")
+
+    print(f"\n🧩 {len(plan.groups)} distinct missing-field sets, largest first:\n")
+    for group in plan.groups[:args.top]:
+        route = " + ".join(f"{name}({len(fields)})" for name, fields in group.route.steps) or "nothing can fill"
+        flags = ("id" if group.has_location_id else "--") + "/" + ("url" if group.has_listing_url else "---")
+        print(f"  {len(group.row_indexes):>7} rows [{flags}] ${group.cost:>8.2f}  {route:<40} "
+              f"missing: {', '.join(group.missing)}")
+        if group.route.unfillable:
+            print(f"  {'':>7}      unfillable: {', '.join(group.route.unfillable)}")
+
+    totals = plan.source_totals()
+    total_cost = sum(t["cost"] for t in totals.values())
+    print("\n💰 ESTIMATED SPEND:\n")
+    for source in SOURCES:
+        t = totals[source.name]
+        print(f"  {source.label:<30} {t['rows']:>7} rows, {t['fields']:>8} field fills, ${t['cost']:.2f}")
+    print(f"  {'Total':<30} {'':>7}       {'':>8}              ${total_cost:.2f}")
+
+    Path(args.output).write_text(json.dumps({
+        "generated_at": datetime.now().isoformat(),
+        "rows": len(rows),
+        "groups": [
+            {"rows": len(g.row_indexes), "missing": g.missing, "route": g.route.steps,
+             "unfillable": g.route.unfillable, "cost": round(g.cost, 4)}
+            for g in plan.groups
+        ],
+        "totals": totals,
+    }, indent=2))
+    print(f"\n📝 Plan written: {args.output}")
+
+    if not args.apply:
+        print("\nℹ️  Plan only. Re-run with --apply to fill the gaps.")
+        return
+
+    if args.max_cost is not None and total_cost > args.max_cost:
+        print(f"\n❌ Estimated ${total_cost:.2f} exceeds --max-cost ${args.max_cost:.2f}; nothing spent", file=sys.stderr)
+        sys.exit(1)
+
+    writer = PatchWriter(supabase, batch_size=args.batch_size)
+    print("\n🚀 Applying plan...")
+    filled_api = apply_partner_api(plan, writer, args) if totals["partner_api"]["rows"] else 0
+    filled_llm = apply_llm(plan, writer, args) if totals["llm"]["rows"] else 0
+    writer.flush()
+    scrape_rows = write_scrape_plan(plan, SCRAPE_PLAN_FILE) if totals["scrape"]["rows"] else 0
+
+    print(f"""
+📊 SUMMARY:
+  Rows patched from {SOURCES_BY_NAME['partner_api'].label}: {filled_api}
+  Rows patched from {SOURCES_BY_NAME['llm'].label}: {filled_llm}
+  Database writes: {writer.summary()}
+  Rows left for page scrapes: {scrape_rows}
+""")
+    if scrape_rows:
+        print(f"  Next: python scripts/sync-tripadvisor-real-data.py --plan {SCRAPE_PLAN_FILE}")
+
+
+if __name__ == "__main__":
+    main()
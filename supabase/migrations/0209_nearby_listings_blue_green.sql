@@ -0,0 +1,370 @@
+-- ============================================================================
+-- MIGRATION: Blue/green generations for nearby_listings
+-- ============================================================================
+-- Purpose: Let a full refetch build into a shadow table while the live table
+-- keeps serving, then swap the two atomically.
+--
+--   nearby_listings           live generation (what the app reads)
+--   nearby_listings_shadow    generation being built by a refetch
+--   nearby_listings_previous  last live generation, kept for rollback
+--
+-- Flow (called over RPC by scripts/refetch-all-tripadvisor-ph.py --shadow):
+--   SELECT nearby_listings_prepare_shadow();         -- empty shadow, same schema/access/triggers
+--   ... load rows into nearby_listings_shadow ...
+--   SELECT nearby_listings_swap(0.9, 0.9);           -- validate, then rename swap
+--   SELECT nearby_listings_rollback();               -- previous becomes live again
+--
+-- The swap runs in one transaction: foreign keys that reference the live
+-- table (listing_votes) and views/materialized views built on it
+-- (top_rated_listings, listings_by_city) are captured, dropped and recreated
+-- against the new live table, so readers never see a missing or half-loaded
+-- table. Rows referencing a listing the new generation no longer has are
+-- handled before the rename the way deleting that listing would: ON DELETE
+-- CASCADE references (listing_votes) are deleted and counted in the result as
+-- orphaned_references, any other reference aborts the swap. The foreign keys
+-- are then recreated validated.
+-- ============================================================================
+
+-- Row counts of each generation that exists
+CREATE OR REPLACE FUNCTION nearby_listings_generations()
+RETURNS JSONB AS $$
+DECLARE
+  v_result JSONB := '{}'::JSONB;
+  v_table TEXT;
+  v_count BIGINT;
+BEGIN
+  FOREACH v_table IN ARRAY ARRAY['nearby_listings', 'nearby_listings_shadow', 'nearby_listings_previous']
+  LOOP
+    IF to_regclass('public.' || v_table) IS NOT NULL THEN
+      EXECUTE format('SELECT COUNT(*) FROM public.%I', v_table) INTO v_count;
+      v_result := v_result || jsonb_build_object(v_table, v_count);
+    END IF;
+  END LOOP;
+  RETURN v_result;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- Create an empty shadow table with the live table's columns, indexes,
+-- defaults, grants, row level security policies, triggers and publication
+-- membership. LIKE ... INCLUDING ALL copies none of the last two, and losing
+-- update_nearby_listings_timestamp would freeze updated_at, which the
+-- replica's (updated_at, id) watermark depends on.
+CREATE OR REPLACE FUNCTION nearby_listings_prepare_shadow()
+RETURNS TEXT AS $$
+DECLARE
+  v_seq TEXT;
+  v_grant RECORD;
+  v_policy RECORD;
+  v_trigger RECORD;
+  v_publication RECORD;
+BEGIN
+  DROP TABLE IF EXISTS public.nearby_listings_shadow;
+  CREATE TABLE public.nearby_listings_shadow (LIKE public.nearby_listings INCLUDING ALL);
+
+  -- Both generations share the id sequence; no generation may own it, or
+  -- dropping an old generation would drop the sequence with it
+  v_seq := pg_get_serial_sequence('public.nearby_listings', 'id');
+  IF v_seq IS NOT NULL THEN
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', v_seq);
+  END IF;
+
+  FOR v_grant IN
+    SELECT grantee, privilege_type
+    FROM information_schema.role_table_grants
+    WHERE table_schema = 'public' AND table_name = 'nearby_listings'
+  LOOP
+    EXECUTE format('GRANT %s ON public.nearby_listings_shadow TO %I', v_grant.privilege_type, v_grant.grantee);
+  END LOOP;
+
+  IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'public.nearby_listings'::regclass) THEN
+    ALTER TABLE public.nearby_listings_shadow ENABLE ROW LEVEL SECURITY;
+  END IF;
+
+  FOR v_policy IN
+    SELECT policyname, permissive, cmd, roles, qual, with_check
+    FROM pg_policies
+    WHERE schemaname = 'public' AND tablename = 'nearby_listings'
+  LOOP
+    EXECUTE format(
+      'CREATE POLICY %I ON public.nearby_listings_shadow AS %s FOR %s TO %s%s%s',
+      v_policy.policyname,
+      v_policy.permissive,
+      v_policy.cmd,
+      (SELECT string_agg(CASE WHEN r = 'public' THEN 'PUBLIC' ELSE quote_ident(r) END, ', ') FROM unnest(v_policy.roles) AS r),
+      COALESCE(' USING (' || v_policy.qual || ')', ''),
+      COALESCE(' WITH CHECK (' || v_policy.with_check || ')', '')
+    );
+  END LOOP;
+
+  -- pg_get_triggerdef names the live table (schema-qualified or not); point
+  -- the first ON clause at the shadow, trigger names are per table
+  FOR v_trigger IN
+    SELECT pg_get_triggerdef(t.oid) AS definition
+    FROM pg_trigger t
+    WHERE t.tgrelid = 'public.nearby_listings'::regclass AND NOT t.tgisinternal
+  LOOP
+    EXECUTE regexp_replace(
+      v_trigger.definition,
+      ' ON (public\.)?nearby_listings ',
+      ' ON public.nearby_listings_shadow '
+    );
+  END LOOP;
+
+  -- Realtime and logical replication: FOR ALL TABLES publications pick the
+  -- shadow up on their own, explicit ones need it added
+  FOR v_publication IN
+    SELECT pt.pubname
+    FROM pg_publication_tables pt
+    JOIN pg_publication p ON p.pubname = pt.pubname
+    WHERE pt.schemaname = 'public' AND pt.tablename = 'nearby_listings' AND NOT p.puballtables
+  LOOP
+    EXECUTE format('ALTER PUBLICATION %I ADD TABLE public.nearby_listings_shadow', v_publication.pubname);
+  END LOOP;
+
+  IF (SELECT relreplident FROM pg_class WHERE oid = 'public.nearby_listings'::regclass) = 'f' THEN
+    ALTER TABLE public.nearby_listings_shadow REPLICA IDENTITY FULL;
+  END IF;
+
+  NOTIFY pgrst, 'reload schema';
+  RETURN 'nearby_listings_shadow';
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- Compare the shadow generation against the live one
+--   row_ratio:    shadow rows / live rows
+--   key_coverage: share of live rows with a real (numeric) TripAdvisor id
+--                 whose id is also in the shadow table
+CREATE OR REPLACE FUNCTION nearby_listings_validate_shadow(
+  p_min_row_ratio NUMERIC DEFAULT 0.9,
+  p_min_key_coverage NUMERIC DEFAULT 0.9
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_live_rows BIGINT;
+  v_shadow_rows BIGINT;
+  v_live_keys BIGINT;
+  v_covered_keys BIGINT;
+  v_missing_names BIGINT;
+  v_row_ratio NUMERIC;
+  v_key_coverage NUMERIC;
+BEGIN
+  IF to_regclass('public.nearby_listings_shadow') IS NULL THEN
+    RAISE EXCEPTION 'nearby_listings_shadow does not exist';
+  END IF;
+
+  SELECT COUNT(*) INTO v_live_rows FROM public.nearby_listings;
+  SELECT COUNT(*) INTO v_shadow_rows FROM public.nearby_listings_shadow;
+  SELECT COUNT(*) INTO v_missing_names FROM public.nearby_listings_shadow WHERE COALESCE(TRIM(name), '') = '';
+
+  SELECT COUNT(DISTINCT l.tripadvisor_id), COUNT(DISTINCT s.tripadvisor_id)
+  INTO v_live_keys, v_covered_keys
+  FROM public.nearby_listings l
+  LEFT JOIN public.nearby_listings_shadow s ON s.tripadvisor_id = l.tripadvisor_id
+  WHERE l.tripadvisor_id ~ '^[0-9]+$';
+
+  v_row_ratio := CASE WHEN v_live_rows > 0 THEN v_shadow_rows::NUMERIC / v_live_rows ELSE 1 END;
+  v_key_coverage := CASE WHEN v_live_keys > 0 THEN v_covered_keys::NUMERIC / v_live_keys ELSE 1 END;
+
+  RETURN jsonb_build_object(
+    'live_rows', v_live_rows,
+    'shadow_rows', v_shadow_rows,
+    'row_ratio', ROUND(v_row_ratio, 4),
+    'live_keys', v_live_keys,
+    'covered_keys', v_covered_keys,
+    'key_coverage', ROUND(v_key_coverage, 4),
+    'missing_names', v_missing_names,
+    'ok', v_shadow_rows > 0
+          AND v_missing_names = 0
+          AND v_row_ratio >= p_min_row_ratio
+          AND v_key_coverage >= p_min_key_coverage
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- Make p_incoming the live table and move the live table to p_outgoing,
+-- carrying dependent foreign keys and views over to the new live table.
+-- Returns the rows removed per foreign key ("table.constraint": count)
+-- because they referenced listings p_incoming does not have.
+DROP FUNCTION IF EXISTS _nearby_listings_rotate(TEXT, TEXT);
+CREATE OR REPLACE FUNCTION _nearby_listings_rotate(p_incoming TEXT, p_outgoing TEXT)
+RETURNS JSONB AS $$
+DECLARE
+  v_dep RECORD;
+  v_fk RECORD;
+  v_orphans JSONB := '{}'::JSONB;
+  v_count BIGINT;
+BEGIN
+  EXECUTE format('LOCK TABLE public.nearby_listings, public.%I IN ACCESS EXCLUSIVE MODE', p_incoming);
+
+  -- References to live rows missing from p_incoming: cascade like a delete
+  -- would, refuse the rotation for RESTRICT / NO ACTION / SET NULL / SET DEFAULT
+  FOR v_fk IN
+    SELECT
+      con.conrelid::regclass::TEXT AS target,
+      con.conname,
+      con.confdeltype,
+      (SELECT string_agg(format('r.%I IS NOT NULL', a.attname), ' AND ')
+       FROM unnest(con.conkey) AS k(attnum)
+       JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum) AS referenced,
+      (SELECT string_agg(format('n.%I = r.%I', fa.attname, a.attname), ' AND ')
+       FROM unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+       JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+       JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum) AS matches
+    FROM pg_constraint con
+    WHERE con.contype = 'f'
+      AND con.confrelid = 'public.nearby_listings'::regclass
+  LOOP
+    IF v_fk.confdeltype = 'c' THEN
+      EXECUTE format('DELETE FROM %s r WHERE %s AND NOT EXISTS (SELECT 1 FROM public.%I n WHERE %s)',
+                     v_fk.target, v_fk.referenced, p_incoming, v_fk.matches);
+      GET DIAGNOSTICS v_count = ROW_COUNT;
+    ELSE
+      EXECUTE format('SELECT COUNT(*) FROM %s r WHERE %s AND NOT EXISTS (SELECT 1 FROM public.%I n WHERE %s)',
+                     v_fk.target, v_fk.referenced, p_incoming, v_fk.matches)
+      INTO v_count;
+      IF v_count > 0 THEN
+        RAISE EXCEPTION '% rows of % (%) reference nearby_listings rows missing from %',
+          v_count, v_fk.target, v_fk.conname, p_incoming;
+      END IF;
+    END IF;
+    v_orphans := v_orphans || jsonb_build_object(v_fk.target || '.' || v_fk.conname, v_count);
+  END LOOP;
+
+  CREATE TEMP TABLE _nearby_listings_deps (
+    ord SERIAL,
+    kind TEXT,
+    target TEXT,
+    name TEXT,
+    definition TEXT
+  ) ON COMMIT DROP;
+
+  -- Views and materialized views reading the live table (with their indexes and grants)
+  INSERT INTO _nearby_listings_deps (kind, target, name, definition)
+  SELECT DISTINCT
+    CASE c.relkind WHEN 'm' THEN 'matview' ELSE 'view' END,
+    NULL,
+    c.relname,
+    pg_get_viewdef(c.oid)
+  FROM pg_depend d
+  JOIN pg_rewrite r ON r.oid = d.objid
+  JOIN pg_class c ON c.oid = r.ev_class
+  WHERE d.refobjid = 'public.nearby_listings'::regclass
+    AND c.oid <> 'public.nearby_listings'::regclass;
+
+  INSERT INTO _nearby_listings_deps (kind, target, name, definition)
+  SELECT 'index', i.tablename, i.indexname, i.indexdef
+  FROM pg_indexes i
+  WHERE i.schemaname = 'public'
+    AND i.tablename IN (SELECT name FROM _nearby_listings_deps WHERE kind = 'matview');
+
+  INSERT INTO _nearby_listings_deps (kind, target, name, definition)
+  SELECT 'grant', g.table_name, g.grantee, g.privilege_type
+  FROM information_schema.role_table_grants g
+  WHERE g.table_schema = 'public'
+    AND g.table_name IN (SELECT name FROM _nearby_listings_deps WHERE kind IN ('view', 'matview'));
+
+  -- Foreign keys referencing the live table
+  INSERT INTO _nearby_listings_deps (kind, target, name, definition)
+  SELECT 'fk', con.conrelid::regclass::TEXT, con.conname, pg_get_constraintdef(con.oid)
+  FROM pg_constraint con
+  WHERE con.contype = 'f'
+    AND con.confrelid = 'public.nearby_listings'::regclass;
+
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind = 'fk' LOOP
+    EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', v_dep.target, v_dep.name);
+  END LOOP;
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind IN ('view', 'matview') ORDER BY ord DESC LOOP
+    IF v_dep.kind = 'matview' THEN
+      EXECUTE format('DROP MATERIALIZED VIEW public.%I', v_dep.name);
+    ELSE
+      EXECUTE format('DROP VIEW public.%I', v_dep.name);
+    END IF;
+  END LOOP;
+
+  EXECUTE format('DROP TABLE IF EXISTS public.%I', p_outgoing);
+  EXECUTE format('ALTER TABLE public.nearby_listings RENAME TO %I', p_outgoing);
+  EXECUTE format('ALTER TABLE public.%I RENAME TO nearby_listings', p_incoming);
+
+  -- Definitions were captured before the rename, so they name nearby_listings
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind IN ('view', 'matview') ORDER BY ord LOOP
+    IF v_dep.kind = 'matview' THEN
+      EXECUTE format('CREATE MATERIALIZED VIEW public.%I AS %s', v_dep.name, v_dep.definition);
+    ELSE
+      EXECUTE format('CREATE VIEW public.%I AS %s', v_dep.name, v_dep.definition);
+    END IF;
+  END LOOP;
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind = 'index' LOOP
+    EXECUTE v_dep.definition;
+  END LOOP;
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind = 'grant' LOOP
+    EXECUTE format('GRANT %s ON public.%I TO %I', v_dep.definition, v_dep.target, v_dep.name);
+  END LOOP;
+  FOR v_dep IN SELECT * FROM _nearby_listings_deps WHERE kind = 'fk' LOOP
+    EXECUTE format('ALTER TABLE %s ADD CONSTRAINT %I %s', v_dep.target, v_dep.name, v_dep.definition);
+  END LOOP;
+
+  DROP TABLE _nearby_listings_deps;
+  NOTIFY pgrst, 'reload schema';
+  RETURN v_orphans;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- Validate the shadow generation and, if it passes (or p_force), make it live.
+-- The old live table becomes nearby_listings_previous.
+CREATE OR REPLACE FUNCTION nearby_listings_swap(
+  p_min_row_ratio NUMERIC DEFAULT 0.9,
+  p_min_key_coverage NUMERIC DEFAULT 0.9,
+  p_force BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_report JSONB;
+  v_orphans JSONB;
+BEGIN
+  v_report := nearby_listings_validate_shadow(p_min_row_ratio, p_min_key_coverage);
+
+  IF NOT (v_report->>'ok')::BOOLEAN AND NOT p_force THEN
+    RETURN v_report || jsonb_build_object('swapped', FALSE);
+  END IF;
+
+  v_orphans := _nearby_listings_rotate('nearby_listings_shadow', 'nearby_listings_previous');
+  RETURN v_report || jsonb_build_object('swapped', TRUE, 'swapped_at', NOW(), 'orphaned_references', v_orphans);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- Put the previous generation back live; the rolled-back generation is kept
+-- as nearby_listings_shadow for inspection
+CREATE OR REPLACE FUNCTION nearby_listings_rollback()
+RETURNS JSONB AS $$
+DECLARE
+  v_orphans JSONB;
+BEGIN
+  IF to_regclass('public.nearby_listings_previous') IS NULL THEN
+    RAISE EXCEPTION 'No previous nearby_listings generation to roll back to';
+  END IF;
+
+  v_orphans := _nearby_listings_rotate('nearby_listings_previous', 'nearby_listings_shadow');
+  RETURN nearby_listings_generations()
+         || jsonb_build_object('rolled_back_at', NOW(), 'orphaned_references', v_orphans);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+
+-- DDL helpers are for the sync scripts (service role) only
+REVOKE ALL ON FUNCTION nearby_listings_generations() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION nearby_listings_prepare_shadow() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION nearby_listings_validate_shadow(NUMERIC, NUMERIC) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION _nearby_listings_rotate(TEXT, TEXT) FROM PUBLIC, anon, authenticated, service_role;
+REVOKE ALL ON FUNCTION nearby_listings_swap(NUMERIC, NUMERIC, BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION nearby_listings_rollback() FROM PUBLIC, anon, authenticated;
+
+GRANT EXECUTE ON FUNCTION nearby_listings_generations() TO service_role;
+GRANT EXECUTE ON FUNCTION nearby_listings_prepare_shadow() TO service_role;
+GRANT EXECUTE ON FUNCTION nearby_listings_validate_shadow(NUMERIC, NUMERIC) TO service_role;
+GRANT EXECUTE ON FUNCTION nearby_listings_swap(NUMERIC, NUMERIC, BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION nearby_listings_rollback() TO service_role;
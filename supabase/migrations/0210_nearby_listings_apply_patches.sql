@@ -0,0 +1,74 @@
+-- ============================================================================
+-- MIGRATION: Bulk partial-column updates for nearby_listings
+-- ============================================================================
+-- Purpose: Apply many partial updates in one round trip and one statement.
+--
+-- Takes a JSON array of patches:
+--   [{"id": 123, "changes": {"rating": 4.5, "review_count": 210}}, ...]
+-- and applies them with a single set-based UPDATE. Only the keys present in
+-- "changes" are written; every other column keeps its current value (unlike
+-- an upsert, nothing is inserted and no column is reset to NULL/default).
+--
+-- Each id should appear once per call (the Python PatchWriter merges
+-- patches for the same id before sending). Unknown ids are ignored.
+--
+-- Example:
+--   SELECT nearby_listings_apply_patches('[{"id": 1, "changes": {"rating": 4.5}}]'::jsonb);
+--   -> {"requested": 1, "updated": 1}
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION nearby_listings_apply_patches(p_patches JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_columns TEXT;
+  v_values TEXT;
+  v_id_type TEXT;
+  v_updated INTEGER;
+BEGIN
+  IF p_patches IS NULL OR jsonb_typeof(p_patches) <> 'array' THEN
+    RAISE EXCEPTION 'p_patches must be a JSON array';
+  END IF;
+
+  -- Every writable column except the key
+  SELECT
+    string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position),
+    string_agg('r.' || quote_ident(column_name), ', ' ORDER BY ordinal_position)
+  INTO v_columns, v_values
+  FROM information_schema.columns
+  WHERE table_schema = 'public'
+    AND table_name = 'nearby_listings'
+    AND column_name <> 'id'
+    AND is_generated = 'NEVER'
+    AND COALESCE(identity_generation, '') <> 'ALWAYS';
+
+  -- Cast patch ids to the key's type so the join uses the primary key index
+  SELECT format_type(a.atttypid, a.atttypmod) INTO v_id_type
+  FROM pg_attribute a
+  WHERE a.attrelid = 'public.nearby_listings'::regclass AND a.attname = 'id';
+
+  -- jsonb_populate_record(nl, changes) is the current row with the patched
+  -- keys overlaid, so unpatched columns are written back unchanged
+  EXECUTE format(
+    'UPDATE public.nearby_listings nl
+        SET (%s) = (SELECT %s FROM jsonb_populate_record(nl, p.changes) r)
+       FROM (
+         SELECT DISTINCT ON (elem->>''id'') (elem->>''id'')::%s AS id, elem->''changes'' AS changes
+         FROM jsonb_array_elements($1) WITH ORDINALITY AS e(elem, ord)
+         WHERE jsonb_typeof(elem->''changes'') = ''object''
+         ORDER BY elem->>''id'', ord DESC
+       ) p
+      WHERE nl.id = p.id',
+    v_columns, v_values, v_id_type
+  ) USING p_patches;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+
+  RETURN jsonb_build_object(
+    'requested', jsonb_array_length(p_patches),
+    'updated', v_updated
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION nearby_listings_apply_patches(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION nearby_listings_apply_patches(JSONB) TO service_role;
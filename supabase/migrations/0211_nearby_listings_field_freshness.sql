@@ -0,0 +1,18 @@
+-- ============================================================================
+-- MIGRATION: Per-field refresh times for nearby_listings
+-- ============================================================================
+-- Purpose: Let the TripAdvisor sync refetch only the fields that are due.
+--
+-- field_refreshed_at maps each scraped field to the time it was last
+-- fetched, e.g.
+--   {"rating": "2026-10-12T03:10:00", "photos": "2026-08-01T11:42:00"}
+-- Freshness policies (how old each field may get) live in
+-- scripts/nearby_sync/freshness.py. Rows without an entry for a field fall
+-- back to last_verified_at.
+-- ============================================================================
+
+ALTER TABLE public.nearby_listings
+  ADD COLUMN IF NOT EXISTS field_refreshed_at JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+COMMENT ON COLUMN public.nearby_listings.field_refreshed_at IS
+  'Last fetch time per scraped field ({field: ISO timestamp}); see scripts/nearby_sync/freshness.py';